@@ -3,7 +3,10 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Usuario, Producto, Oferta, ProductoOferta, Pedido, DetallePedido, Sucursal
+from django.db import transaction
+from django.db.models.functions import Coalesce, Now
+from .models import Usuario, Producto, Oferta, ProductoOferta, Pedido, DetallePedido, Sucursal, ReservaStock, Trabajo, Difusion, AlertaStockPendiente, VentaDiaria, ResumenDiario
+from .rollups import registrar_transiciones
 
 
 # ============================================================================
@@ -380,18 +383,33 @@ class PedidoAdmin(admin.ModelAdmin):
     items_count.short_description = 'Items'
     
     # Acciones masivas
+    def _cambiar_estado(self, queryset, estado):
+        """
+        UPDATE masivo (no dispara signals): el acumulado VentaDiaria se
+        actualiza aquí con las transiciones de cada pedido.
+        """
+        with transaction.atomic():
+            anteriores = list(queryset.exclude(estado=estado).values_list('id', 'estado'))
+            campos = {'estado': estado}
+            if estado in Pedido.ESTADOS_FINALES:
+                # Igual que Pedido.save(): se conserva la primera fecha de cierre
+                campos['fecha_completado'] = Coalesce('fecha_completado', Now())
+            updated = queryset.update(**campos)
+            registrar_transiciones([(pid, anterior, estado) for pid, anterior in anteriores])
+        return updated
+    
     def marcar_en_preparacion(self, request, queryset):
-        updated = queryset.update(estado='en_preparacion')
+        updated = self._cambiar_estado(queryset, 'en_preparacion')
         self.message_user(request, f'{updated} pedido(s) marcado(s) como "En Preparación"')
     marcar_en_preparacion.short_description = 'Marcar como "En Preparación"'
     
     def marcar_listo(self, request, queryset):
-        updated = queryset.update(estado='listo')
+        updated = self._cambiar_estado(queryset, 'listo')
         self.message_user(request, f'{updated} pedido(s) marcado(s) como "Listo"')
     marcar_listo.short_description = 'Marcar como "Listo"'
     
     def marcar_entregado(self, request, queryset):
-        updated = queryset.update(estado='entregado')
+        updated = self._cambiar_estado(queryset, 'entregado')
         self.message_user(request, f'{updated} pedido(s) marcado(s) como "Entregado"')
     marcar_entregado.short_description = 'Marcar como "Entregado"'
 
@@ -449,6 +467,69 @@ class ProductoOfertaAdmin(admin.ModelAdmin):
     oferta_estado.short_description = 'Estado Oferta'
 
 
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'producto', 'usuario', 'cantidad', 'estado', 'expira_en', 'pedido')
+    list_filter = ('estado', 'producto__sucursal')
+    search_fields = ('producto__nombre', 'usuario__username')
+    ordering = ('-fecha_creacion',)
+    raw_id_fields = ('producto', 'usuario', 'pedido')
+
+
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'max_intentos', 'ejecutar_despues', 'finalizado_en')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('tipo', 'ultimo_error')
+    ordering = ('-fecha_creacion',)
+    readonly_fields = ('fecha_creacion', 'iniciado_en', 'finalizado_en', 'ultimo_error')
+    actions = ['reintentar_trabajos']
+    
+    def reintentar_trabajos(self, request, queryset):
+        """Vuelve a poner en cola los trabajos fallidos seleccionados"""
+        updated = queryset.filter(estado='fallido').update(
+            estado='pendiente',
+            intentos=0,
+            ejecutar_despues=timezone.now()
+        )
+        self.message_user(request, f'{updated} trabajo(s) reencolado(s).')
+    reintentar_trabajos.short_description = "Reintentar trabajos fallidos"
+
+
+@admin.register(Difusion)
+class DifusionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'asunto', 'estado', 'total_destinatarios', 'lotes_enviados', 'lotes_encolados', 'fecha_creacion')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('asunto',)
+    ordering = ('-fecha_creacion',)
+    exclude = ('html',)
+    readonly_fields = ('ultimo_usuario_id', 'total_destinatarios', 'lotes_encolados', 'lotes_enviados', 'fecha_completada')
+
+
+@admin.register(AlertaStockPendiente)
+class AlertaStockPendienteAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'sucursal', 'eventos', 'primer_evento', 'ultimo_evento')
+    list_filter = ('sucursal',)
+    ordering = ('sucursal', 'primer_evento')
+
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'sucursal', 'producto_nombre', 'unidades', 'ingresos')
+    list_filter = ('sucursal', 'fecha')
+    search_fields = ('producto_nombre',)
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', 'sucursal')
+
+
+@admin.register(ResumenDiario)
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'sucursal', 'pedidos', 'total')
+    list_filter = ('sucursal', 'fecha')
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', 'sucursal')
+
+
 # Personalización del sitio de administración
 admin.site.site_header = "🥐 Panadería Santa Clara - Administración"
 admin.site.site_title = "Panel Admin"
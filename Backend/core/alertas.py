@@ -0,0 +1,123 @@
+# Backend/core/alertas.py
+# ⭐⭐⭐ Alertas de stock bajo agrupadas por sucursal (resumen con ventana)
+#
+# Antes cada venta que dejaba un producto con 5 unidades o menos enviaba su
+# propio email. Ahora:
+# - STOCK BAJO: se registra una AlertaStockPendiente y se programa UN trabajo
+#   'alerta.resumen_stock' por sucursal dentro de ALERTA_STOCK_VENTANA_MINUTOS.
+#   Al ejecutarse envía un solo email con todos los productos afectados y su
+#   stock actual.
+# - SIN STOCK (0): se sigue enviando de inmediato ('alerta.sin_stock').
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import AlertaStockPendiente, Producto, Sucursal, Trabajo
+from .jobs import encolar
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def ventana_alertas():
+    return timedelta(minutes=getattr(settings, 'ALERTA_STOCK_VENTANA_MINUTOS', 15))
+
+
+def registrar_stock_bajo(producto_id):
+    """
+    Acumula un evento de stock bajo y asegura que haya un resumen programado
+    para la sucursal del producto.
+    """
+    sucursal_id = Producto.objects.filter(pk=producto_id).values_list('sucursal_id', flat=True).first()
+    if sucursal_id is None:
+        logger.warning(f"⚠️ Producto {producto_id} sin sucursal, no se registra alerta")
+        return
+
+    actualizadas = AlertaStockPendiente.objects.filter(producto_id=producto_id).update(
+        eventos=F('eventos') + 1,
+        ultimo_evento=timezone.now()
+    )
+    if not actualizadas:
+        AlertaStockPendiente.objects.get_or_create(
+            producto_id=producto_id,
+            defaults={'sucursal_id': sucursal_id}
+        )
+
+    resumen_programado = Trabajo.objects.filter(
+        tipo='alerta.resumen_stock',
+        estado='pendiente',
+        payload__sucursal_id=sucursal_id
+    ).exists()
+
+    if not resumen_programado:
+        encolar(
+            'alerta.resumen_stock',
+            ejecutar_despues=timezone.now() + ventana_alertas(),
+            sucursal_id=sucursal_id
+        )
+        print(f"⏳ Resumen de stock bajo programado para sucursal #{sucursal_id}")
+
+
+def enviar_resumen_sucursal(sucursal_id):
+    """
+    Envía el resumen de stock bajo de una sucursal y limpia sus pendientes.
+    Los pendientes se toman y eliminan en una transacción corta; el email se
+    envía después del commit (sin bloqueos abiertos durante la llamada a
+    SendGrid). Si el envío falla, los productos vuelven a quedar pendientes
+    para el reintento. Retorna False solo si el envío falló.
+    """
+    from .emails import enviar_resumen_stock_bajo
+    from .signals import UMBRAL_STOCK_BAJO
+
+    with transaction.atomic():
+        pendientes = dict(
+            AlertaStockPendiente.objects.select_for_update()
+            .filter(sucursal_id=sucursal_id)
+            .values_list('producto_id', 'eventos')
+        )
+        if not pendientes:
+            return True
+
+        AlertaStockPendiente.objects.filter(sucursal_id=sucursal_id, producto_id__in=pendientes).delete()
+
+        # Stock ACTUAL: los productos ya reabastecidos no se incluyen, y los
+        # agotados tampoco (ya recibieron la alerta de sin stock)
+        productos = list(
+            Producto.objects.filter(
+                pk__in=pendientes,
+                stock__gt=0,
+                stock__lte=UMBRAL_STOCK_BAJO
+            ).order_by('stock', 'nombre')
+        )
+        sucursal = Sucursal.objects.get(pk=sucursal_id) if productos else None
+
+    if not productos:
+        logger.info(f"✅ Sucursal #{sucursal_id}: sin productos con stock bajo, no se envía resumen")
+        return True
+
+    if not enviar_resumen_stock_bajo(sucursal, productos):
+        restaurar_pendientes(sucursal_id, {p.pk: pendientes[p.pk] for p in productos})
+        return False
+
+    print(f"📧 Resumen de stock bajo enviado: {sucursal.nombre} ({len(productos)} producto(s))")
+    return True
+
+
+def restaurar_pendientes(sucursal_id, eventos_por_producto):
+    """
+    Devuelve a pendientes los productos de un resumen que no se pudo enviar,
+    sumando los eventos a los que hayan llegado mientras tanto.
+    """
+    with transaction.atomic():
+        for producto_id, eventos in eventos_por_producto.items():
+            actualizadas = AlertaStockPendiente.objects.filter(producto_id=producto_id).update(
+                eventos=F('eventos') + eventos
+            )
+            if not actualizadas:
+                AlertaStockPendiente.objects.get_or_create(
+                    producto_id=producto_id,
+                    defaults={'sucursal_id': sucursal_id, 'eventos': eventos}
+                )
+    logger.warning(f"⚠️ Resumen de stock bajo de la sucursal #{sucursal_id} no enviado: se reintentará")
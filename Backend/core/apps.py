@@ -5,4 +5,6 @@ class CoreConfig(AppConfig):
     name = 'core'
     
     def ready(self):
-        import core.signals  # Esto activa los signals
\ No newline at end of file
+        import core.signals  # Esto activa los signals
+        import core.tareas  # Registra los tipos de trabajo de la cola
+        import core.metricas  # Medidor de consultas en cada conexión nueva
@@ -0,0 +1,314 @@
+# Backend/core/archivo.py
+# ⭐⭐⭐ Archivo frío de pedidos completados (antes de la purga)
+#
+# - delete_old_orders archiva cada lote ANTES de borrarlo (core/purga.py):
+#   los pedidos y sus líneas se conservan para reportes año contra año sin
+#   mantener la tabla Pedido grande
+# - Un segmento por mes (según la fecha local del pedido):
+#     ARCHIVO_PEDIDOS_DIR/pedidos-2025-11.ndjson.gz   ← solo se agrega al final
+#     ARCHIVO_PEDIDOS_DIR/pedidos-2025-11.idx.json    ← índice pequeño
+# - Cada lote agrega un "miembro" gzip al final del segmento (los lectores
+#   gzip leen miembros concatenados como un solo archivo). Nunca se reescribe
+#   lo ya archivado
+# - El índice guarda, por miembro: posición, tamaño, pedidos y rango de
+#   fechas. Las lecturas saltan los miembros fuera del rango pedido y
+#   descomprimen línea por línea: la memoria no depende del tamaño del mes
+#
+# Una línea por pedido:
+#   {"id": 15, "fecha": "2025-11-20T10:31:00-06:00", "estado": "entregado",
+#    "total": "3500.00", ..., "detalles": [{"producto_id": 3, "producto": "Pan",
+#    "sucursal_id": 1, "sucursal": "Centro", "cantidad": 2, "precio_unitario": "1750.00"}]}
+#
+# ⚠️ ARCHIVO_PEDIDOS_DIR debe ser un volumen PERSISTENTE, el mismo para el
+# proceso que purga (cron) y el servicio web que atiende /api/reportes/archivo/.
+# Sin configurarlo explícitamente la purga con archivo se niega a borrar: el
+# disco del contenedor se pierde en cada despliegue y con él el historial.
+#
+# - Un solo escritor a la vez por segmento: cada miembro se agrega (y el
+#   índice se actualiza) con un bloqueo exclusivo del archivo (fcntl.flock),
+#   así dos purgas simultáneas no intercalan miembros ni pierden entradas
+#   del índice
+# - Si la purga falla después de archivar, el lote se vuelve a archivar en
+#   la siguiente ejecución: las lecturas ignoran los pedidos repetidos por
+#   id. Un pedido repetido siempre cae en el mismo segmento (su mes), así que
+#   solo se recuerdan los ids del segmento en curso
+
+import gzip
+import io
+import json
+import os
+try:
+    import fcntl
+except ImportError:  # Windows (solo desarrollo): sin bloqueo entre procesos
+    fcntl = None
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import DetallePedido, Pedido
+import logging
+
+logger = logging.getLogger(__name__)
+
+AGRUPACIONES = ('dia', 'mes', 'anio', 'producto', 'sucursal')
+CENTAVOS = Decimal('0.01')
+
+
+class ArchivoNoConfigurado(ImproperlyConfigured):
+    """ARCHIVAR_PEDIDOS activo sin un ARCHIVO_PEDIDOS_DIR persistente"""
+
+
+def archivo_configurado():
+    return bool(getattr(settings, 'ARCHIVO_PEDIDOS_DIR', ''))
+
+
+def directorio_archivo():
+    if not archivo_configurado():
+        raise ArchivoNoConfigurado(
+            'ARCHIVO_PEDIDOS_DIR no está configurado: debe apuntar a un volumen persistente '
+            'compartido por la purga y el servicio web'
+        )
+    return Path(settings.ARCHIVO_PEDIDOS_DIR)
+
+
+def _ruta_segmento(mes):
+    return directorio_archivo() / f'pedidos-{mes}.ndjson.gz'
+
+
+def _ruta_indice(mes):
+    return directorio_archivo() / f'pedidos-{mes}.idx.json'
+
+
+def leer_indice(mes):
+    """Índice del segmento `mes` ('YYYY-MM') o None si no existe"""
+    try:
+        with open(_ruta_indice(mes), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def _guardar_indice(mes, indice):
+    # Escritura atómica: nunca queda un índice a medias
+    ruta = _ruta_indice(mes)
+    temporal = ruta.with_suffix('.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(indice, archivo, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+
+
+def meses_archivados():
+    """Meses con segmento, ordenados: ['2024-11', '2024-12', ...]"""
+    if not archivo_configurado():
+        return []
+    directorio = directorio_archivo()
+    if not directorio.exists():
+        return []
+    return sorted(ruta.name[len('pedidos-'):-len('.idx.json')] for ruta in directorio.glob('pedidos-*.idx.json'))
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+def registros_de_pedidos(ids):
+    """Pedidos `ids` con sus líneas como dicts listos para JSON (dos consultas)"""
+    pedidos = {
+        fila['id']: {
+            'id': fila['id'],
+            'fecha': timezone.localtime(fila['fecha']).isoformat(),
+            'fecha_completado': (
+                timezone.localtime(fila['fecha_completado']).isoformat() if fila['fecha_completado'] else None
+            ),
+            'estado': fila['estado'],
+            'tipo_entrega': fila['tipo_entrega'],
+            'usuario_id': fila['usuario_id'],
+            'total': str(fila['total']),
+            'detalles': [],
+        }
+        for fila in Pedido.objects.filter(id__in=ids).order_by('id').values(
+            'id', 'fecha', 'fecha_completado', 'estado', 'tipo_entrega', 'usuario_id', 'total'
+        )
+    }
+
+    lineas = (
+        DetallePedido.objects.filter(pedido_id__in=ids)
+        .annotate(precio=Coalesce('precio_unitario', 'producto__precio'))
+        .order_by('pedido_id', 'id')
+        .values_list(
+            'pedido_id', 'producto_id', 'producto__nombre',
+            'producto__sucursal_id', 'producto__sucursal__nombre', 'cantidad', 'precio'
+        )
+    )
+    for pedido_id, producto_id, producto, sucursal_id, sucursal, cantidad, precio in lineas:
+        pedidos[pedido_id]['detalles'].append({
+            'producto_id': producto_id,
+            'producto': producto,
+            'sucursal_id': sucursal_id,
+            'sucursal': sucursal,
+            'cantidad': cantidad,
+            'precio_unitario': str(precio) if precio is not None else None,
+        })
+
+    return list(pedidos.values())
+
+
+def archivar_pedidos(ids):
+    """
+    Agrega los pedidos `ids` al final de sus segmentos mensuales.
+    Retorna el número de pedidos archivados.
+    """
+    por_mes = defaultdict(list)
+    for registro in registros_de_pedidos(ids):
+        por_mes[registro['fecha'][:7]].append(registro)
+
+    directorio = directorio_archivo()
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    for mes, registros in sorted(por_mes.items()):
+        _agregar_miembro(mes, registros)
+
+    return sum(len(registros) for registros in por_mes.values())
+
+
+def _agregar_miembro(mes, registros):
+    contenido = ''.join(
+        json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n' for registro in registros
+    ).encode('utf-8')
+    fechas = [registro['fecha'][:10] for registro in registros]
+
+    with open(_ruta_segmento(mes), 'ab') as archivo:
+        # ⭐ Bloqueo exclusivo hasta cerrar: miembro e índice de un escritor a la vez
+        if fcntl:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        # Otro escritor pudo agregar un miembro mientras se esperaba el bloqueo
+        posicion = archivo.seek(0, os.SEEK_END)
+        with gzip.GzipFile(fileobj=archivo, mode='wb') as comprimido:
+            comprimido.write(contenido)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+        tamano = archivo.tell() - posicion
+
+        indice = leer_indice(mes) or {'mes': mes, 'pedidos': 0, 'lineas': 0, 'desde': None, 'hasta': None, 'miembros': []}
+        indice['miembros'].append({
+            'posicion': posicion,
+            'bytes': tamano,
+            'pedidos': len(registros),
+            'desde': min(fechas),
+            'hasta': max(fechas),
+        })
+        indice['pedidos'] += len(registros)
+        indice['lineas'] += sum(len(registro['detalles']) for registro in registros)
+        indice['desde'] = min(filter(None, [indice['desde'], min(fechas)]))
+        indice['hasta'] = max(filter(None, [indice['hasta'], max(fechas)]))
+        _guardar_indice(mes, indice)
+
+    logger.info(f"🗄️ Archivados {len(registros)} pedidos en pedidos-{mes} ({tamano} bytes)")
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+def pedidos_archivados(desde=None, hasta=None):
+    """
+    Genera los pedidos archivados con fecha local entre `desde` y `hasta`
+    (inclusive). Solo descomprime los miembros cuyo rango se cruza con el
+    pedido y lo hace línea por línea. La memoria depende de los pedidos de
+    un mes (ids para ignorar repetidos), no del rango.
+    """
+    desde_txt = desde.isoformat() if desde else None
+    hasta_txt = hasta.isoformat() if hasta else None
+
+    for mes in meses_archivados():
+        if (desde_txt and mes < desde_txt[:7]) or (hasta_txt and mes > hasta_txt[:7]):
+            continue
+        indice = leer_indice(mes)
+        vistos = set()  # Un pedido repetido solo puede estar en su propio segmento
+        with open(_ruta_segmento(mes), 'rb') as archivo:
+            for miembro in indice['miembros']:
+                if (desde_txt and miembro['hasta'] < desde_txt) or (hasta_txt and miembro['desde'] > hasta_txt):
+                    continue
+                archivo.seek(miembro['posicion'])
+                comprimido = io.BytesIO(archivo.read(miembro['bytes']))
+                with gzip.GzipFile(fileobj=comprimido) as lector:
+                    for linea in lector:
+                        registro = json.loads(linea)
+                        dia = registro['fecha'][:10]
+                        if (desde_txt and dia < desde_txt) or (hasta_txt and dia > hasta_txt):
+                            continue
+                        if registro['id'] in vistos:
+                            continue  # Lote archivado dos veces (purga interrumpida)
+                        vistos.add(registro['id'])
+                        yield registro
+
+
+def _clave_grupo(agrupar, registro, detalle):
+    if agrupar == 'dia':
+        return registro['fecha'][:10]
+    if agrupar == 'mes':
+        return registro['fecha'][:7]
+    if agrupar == 'anio':
+        return registro['fecha'][:4]
+    if agrupar == 'producto':
+        return f"{detalle['producto_id']}:{detalle['producto']}"
+    return f"{detalle['sucursal_id']}:{detalle['sucursal']}"
+
+
+def ventas_archivadas(desde=None, hasta=None, sucursal_id=None, agrupar='mes'):
+    """
+    Ventas de pedidos ENTREGADOS del archivo agrupadas por `agrupar`
+    ('dia', 'mes', 'anio', 'producto' o 'sucursal').
+    Retorna [{'grupo', 'pedidos', 'unidades', 'ingresos'}] ordenado por grupo.
+    Con sucursal_id solo cuentan las líneas de esa sucursal.
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f'Agrupación inválida: {agrupar}')
+
+    sucursal_id = int(sucursal_id) if sucursal_id else None
+    grupos = defaultdict(lambda: {'pedidos': 0, 'unidades': 0, 'ingresos': Decimal('0')})
+
+    # pedidos_archivados() ya no repite pedidos: cada uno suma 1 a cada grupo
+    # que toca (sin guardar ids por grupo)
+    for registro in pedidos_archivados(desde, hasta):
+        if registro['estado'] != 'entregado':
+            continue
+        claves = set()
+        for detalle in registro['detalles']:
+            if sucursal_id and detalle['sucursal_id'] != sucursal_id:
+                continue
+            clave = _clave_grupo(agrupar, registro, detalle)
+            grupo = grupos[clave]
+            if clave not in claves:
+                claves.add(clave)
+                grupo['pedidos'] += 1
+            grupo['unidades'] += detalle['cantidad']
+            grupo['ingresos'] += Decimal(detalle['precio_unitario'] or 0) * detalle['cantidad']
+
+    return [
+        {
+            'grupo': clave,
+            'pedidos': datos['pedidos'],
+            'unidades': datos['unidades'],
+            'ingresos': str(datos['ingresos'].quantize(CENTAVOS)),
+        }
+        for clave, datos in sorted(grupos.items())
+    ]
+
+
+def resumen_archivo():
+    """Meses archivados con sus totales (solo lee los índices)"""
+    meses = []
+    for mes in meses_archivados():
+        indice = leer_indice(mes)
+        meses.append({
+            'mes': mes,
+            'pedidos': indice['pedidos'],
+            'lineas': indice['lineas'],
+            'miembros': len(indice['miembros']),
+            'bytes': sum(miembro['bytes'] for miembro in indice['miembros']),
+        })
+    return meses
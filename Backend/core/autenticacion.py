@@ -0,0 +1,95 @@
+# Backend/core/autenticacion.py
+# ⭐⭐⭐ Autenticación JWT con el usuario en el cache compartido
+#
+# - JWTAuthentication de simplejwt consulta Usuario en CADA petición y luego
+#   las vistas leen user.sucursal (otra consulta)
+# - JWTAutenticacionCacheada guarda usuario + sucursal en el espacio
+#   'usuarios' de core/cache.py, con la versión propia de cada usuario:
+#     usuarios:jwt:<user_id>:<user_id>:v<versión>
+#   → una petición autenticada con el cache caliente no consulta la base de datos
+# - Se guardan los campos del usuario SIN la contraseña: el usuario se
+#   reconstruye con 'password' diferido (si algo la necesita se carga aparte
+#   y un save() sin update_fields no la sobrescribe)
+# - La versión del usuario sube al guardar/eliminar el usuario (rol,
+#   sucursal, is_active...) y al cambiar o eliminar su sucursal (signals.py)
+# - Duración corta: USUARIOS_CACHE_SEGUNDOS (default 300)
+
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .cache import EspacioCache, SinGuardar
+from .models import Sucursal, Usuario
+
+usuarios = EspacioCache('usuarios', 'USUARIOS_CACHE_SEGUNDOS', 300)
+
+CAMPOS_OMITIDOS = ('password',)
+
+
+def invalidar_usuarios(usuario_ids):
+    """Nueva versión de los usuarios indicados (al confirmar la transacción)"""
+    usuarios.invalidar(usuario_ids)
+
+
+def _valores(instancia, omitir=()):
+    return {
+        campo.attname: getattr(instancia, campo.attname)
+        for campo in instancia._meta.concrete_fields
+        if campo.attname not in omitir
+    }
+
+
+def _desde_valores(modelo, valores):
+    return modelo.from_db(router.db_for_read(modelo), list(valores), list(valores.values()))
+
+
+def _consultar_usuario(user_id):
+    """Usuario + sucursal en UNA consulta, como valores para el cache"""
+    usuario = (
+        Usuario.objects.select_related('sucursal')
+        .defer(*CAMPOS_OMITIDOS)
+        .filter(**{api_settings.USER_ID_FIELD: user_id})
+        .first()
+    )
+    if usuario is None:
+        return SinGuardar(None)
+    return {
+        'usuario': _valores(usuario, omitir=CAMPOS_OMITIDOS),
+        'sucursal': _valores(usuario.sucursal) if usuario.sucursal_id else None,
+    }
+
+
+def usuario_autenticado(user_id):
+    """Usuario (con su sucursal ya cargada) desde el cache, o None si no existe"""
+    clave = usuarios.clave('jwt', user_id, alcance=user_id)
+    datos = usuarios.obtener(clave, lambda: _consultar_usuario(user_id))
+    if datos is None:
+        return None
+
+    usuario = _desde_valores(Usuario, datos['usuario'])
+    usuario.sucursal = _desde_valores(Sucursal, datos['sucursal']) if datos['sucursal'] else None
+    return usuario
+
+
+class JWTAutenticacionCacheada(JWTAuthentication):
+    """JWTAuthentication que resuelve el usuario desde el cache compartido"""
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Necesita el hash de la contraseña, que no se guarda en el cache
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        usuario = usuario_autenticado(user_id)
+        if usuario is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return usuario
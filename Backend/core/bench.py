@@ -0,0 +1,412 @@
+# Backend/core/bench.py
+# ⭐⭐⭐ Benchmark de carga en proceso (python manage.py bench)
+#
+# - Las peticiones pasan por el URLconf y los middlewares reales con el
+#   cliente de pruebas de Django (sin servidor HTTP ni red)
+# - Cada escenario se ejecuta con N hilos concurrentes; cada hilo tiene su
+#   propio cliente y su propia conexión a la base de datos
+# - Los escenarios ASGI (asgi=True) usan N clientes async concurrentes en un
+#   event loop, como un worker de uvicorn (AsyncClient → ASGIHandler)
+# - Por escenario se mide: peticiones/segundo, latencia p50/p95/p99 y
+#   consultas SQL por petición (mismo contador que core/metricas.py)
+# - Los datos se crean en una base de datos de prueba desechable
+#
+# Escenarios:
+#   catalogo        GET /api/productos/?sucursal=<id> anónimo (WSGI, hilos)
+#   catalogo_frio   lo mismo con el cache vacío en cada petición
+#   catalogo_asgi   lo mismo bajo ASGI (vista sync de DRF en el pool de hilos)
+#   catalogo_async  GET /api/async/productos/?sucursal=<id> bajo ASGI (core/views_async.py)
+#   checkout        POST /api/pedidos/ de varios clientes sobre los mismos
+#                   productos con poco stock (compiten por el bloqueo)
+#   cambiar_estado  PATCH /api/pedidos/<id>/cambiar_estado/ (administrador general),
+#                   rotando los estados para medir también la entrada y salida
+#                   de 'entregado' (acumulado de ventas y reportes)
+#   reportes        GET /api/reportes/estadisticas/?sucursal=<id> (administrador general)
+#   reportes_frio   lo mismo con el cache vacío en cada petición
+#
+# Los escenarios *_frio suben la versión del espacio de cache antes de cada
+# petición: miden el recálculo completo en lugar de un acierto del cache.
+
+import asyncio
+import inspect
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from .cache_catalogo import catalogo
+from .cache_reportes import reportes
+from .metricas import Medicion, percentil
+from .models import DetallePedido, Oferta, Pedido, Producto, ProductoOferta, Sucursal, Usuario
+from .rastreo import skip_signals
+
+ESCENARIOS = {}
+
+
+def escenario(nombre):
+    """Registra una clase de escenario en ESCENARIOS (debe implementar peticion())"""
+    def registrar(clase):
+        if inspect.isabstract(clase):
+            raise TypeError(f"El escenario '{nombre}' no implementa peticion()")
+        clase.nombre = nombre
+        ESCENARIOS[nombre] = clase
+        return clase
+    return registrar
+
+
+# ============================================================================
+# DATOS
+# ============================================================================
+
+class Datos:
+    """Sucursales, productos, ofertas, usuarios y pedidos para los escenarios"""
+
+    def __init__(self, sucursales=3, productos=60, clientes=20, pedidos=300, productos_stock_bajo=3):
+        hoy = timezone.localdate()
+
+        with skip_signals():
+            self.sucursales = [
+                Sucursal.objects.create(nombre=f'Sucursal bench {n}', direccion='Centro', telefono='2222-2222')
+                for n in range(sucursales)
+            ]
+            self.productos = Producto.objects.bulk_create([
+                Producto(nombre=f'Pan {s.id}-{n}', precio=500 + n, stock=10_000, sucursal=s)
+                for s in self.sucursales
+                for n in range(productos)
+            ])
+            ofertas = Oferta.objects.bulk_create([
+                Oferta(
+                    titulo=f'Oferta {s.id}', descripcion='2x1', precio_oferta=900, sucursal=s,
+                    fecha_inicio=hoy - timedelta(days=1), fecha_fin=hoy + timedelta(days=7),
+                )
+                for s in self.sucursales
+            ])
+            ProductoOferta.objects.bulk_create([
+                ProductoOferta(oferta=oferta, producto=producto)
+                for oferta in ofertas
+                for producto in self.productos[::5]
+                if producto.sucursal_id == oferta.sucursal_id
+            ])
+
+            # Productos compartidos con poco stock: el stock se fija en cada
+            # corrida de checkout
+            self.stock_bajo = Producto.objects.bulk_create([
+                Producto(nombre=f'Pan escaso {n}', precio=800, stock=0, sucursal=self.sucursales[0])
+                for n in range(productos_stock_bajo)
+            ])
+
+            self.clientes = [
+                Usuario.objects.create_user(f'bench{n}', f'bench{n}@example.com', 'bench')
+                for n in range(clientes)
+            ]
+            self.general = Usuario.objects.create_user(
+                'bench_general', 'bench_general@example.com', 'bench', rol='administrador_general'
+            )
+
+            estados = [estado for estado, _ in Pedido.ESTADOS]
+            self.pedidos = Pedido.objects.bulk_create([
+                Pedido(usuario=self.clientes[n % clientes], estado=estados[n % len(estados)], total=1500)
+                for n in range(pedidos)
+            ])
+            DetallePedido.objects.bulk_create([
+                DetallePedido(
+                    pedido=pedido,
+                    producto=self.productos[(n * 3 + k) % len(self.productos)],
+                    cantidad=1 + k,
+                    precio_unitario=self.productos[(n * 3 + k) % len(self.productos)].precio,
+                )
+                for n, pedido in enumerate(self.pedidos)
+                for k in range(3)
+            ])
+
+        # Con signals omitidos el acumulado se reconstruye aparte (los
+        # pedidos recién creados son de hoy)
+        from .rollups import reconstruir
+        hoy = timezone.localdate()
+        reconstruir(hoy, hoy)
+
+        self.tokens = {usuario.pk: str(RefreshToken.for_user(usuario).access_token)
+                       for usuario in [*self.clientes, self.general]}
+
+    def autorizacion(self, usuario):
+        return {'Authorization': f'Bearer {self.tokens[usuario.pk]}'}
+
+
+# ============================================================================
+# ESCENARIOS
+# ============================================================================
+
+class Escenario(ABC):
+    """
+    peticion(i) (obligatorio) retorna (método, url, datos, headers) de la petición número i.
+    preparar() corre antes de cada medición; resumen() agrega datos propios
+    del escenario al resultado. asgi=True lo ejecuta con clientes async.
+    """
+    nombre = None
+    asgi = False
+
+    def __init__(self, datos):
+        self.datos = datos
+
+    def preparar(self, peticiones):
+        pass
+
+    @abstractmethod
+    def peticion(self, i):
+        """(método, url, datos, headers) de la petición número i"""
+
+    def resumen(self):
+        return {}
+
+
+@escenario('catalogo')
+class Catalogo(Escenario):
+    frio = False
+
+    def peticion(self, i):
+        sucursal = self.datos.sucursales[i % len(self.datos.sucursales)]
+        if self.frio:
+            catalogo.subir_versiones([sucursal.id])
+        return 'get', f'/api/productos/?sucursal={sucursal.id}', None, {}
+
+
+@escenario('catalogo_frio')
+class CatalogoFrio(Catalogo):
+    frio = True
+
+
+@escenario('catalogo_asgi')
+class CatalogoASGI(Catalogo):
+    asgi = True
+
+
+@escenario('catalogo_async')
+class CatalogoAsync(Escenario):
+    asgi = True
+
+    def peticion(self, i):
+        sucursal = self.datos.sucursales[i % len(self.datos.sucursales)]
+        return 'get', f'/api/async/productos/?sucursal={sucursal.id}', None, {}
+
+
+@escenario('checkout')
+class Checkout(Escenario):
+    """
+    Todos los clientes compran 1 unidad de los mismos productos escasos.
+    Hay stock para la mitad de las peticiones: el resto debe recibir 400 y
+    el stock nunca debe quedar negativo.
+    """
+
+    def preparar(self, peticiones):
+        self.stock_inicial = max(peticiones // 2 // len(self.datos.stock_bajo), 1)
+        Producto.objects.filter(pk__in=[p.pk for p in self.datos.stock_bajo]).update(
+            stock=self.stock_inicial, disponible=True
+        )
+        self.pedidos_antes = Pedido.objects.count()
+
+    def peticion(self, i):
+        cliente = self.datos.clientes[i % len(self.datos.clientes)]
+        producto = self.datos.stock_bajo[i % len(self.datos.stock_bajo)]
+        datos = {'items': [{'producto': producto.id, 'cantidad': 1}], 'tipo_entrega': 'recoger'}
+        return 'post', '/api/pedidos/', datos, self.datos.autorizacion(cliente)
+
+    def resumen(self):
+        stock_final = dict(
+            Producto.objects.filter(pk__in=[p.pk for p in self.datos.stock_bajo]).values_list('id', 'stock')
+        )
+        vendidas = sum(self.stock_inicial - stock for stock in stock_final.values())
+        return {
+            'stock_inicial_por_producto': self.stock_inicial,
+            'unidades_vendidas': vendidas,
+            'pedidos_creados': Pedido.objects.count() - self.pedidos_antes,
+            'sobreventa': any(stock < 0 for stock in stock_final.values()),
+        }
+
+
+@escenario('cambiar_estado')
+class CambiarEstado(Escenario):
+    """
+    Cada petición mueve un pedido distinto a un estado del ciclo. El estado
+    rota por pedido (y avanza uno en cada vuelta sobre los pedidos): aunque
+    haya menos peticiones que pedidos, una de cada cuatro entra a
+    'entregado' y los pedidos que ya estaban entregados salen de él.
+    """
+    CICLO = ('en_preparacion', 'listo', 'entregado', 'recibido')
+
+    def peticion(self, i):
+        pedidos = self.datos.pedidos
+        pedido = pedidos[i % len(pedidos)]
+        estado = self.CICLO[(i % len(pedidos) + i // len(pedidos)) % len(self.CICLO)]
+        return (
+            'patch', f'/api/pedidos/{pedido.id}/cambiar_estado/', {'estado': estado},
+            self.datos.autorizacion(self.datos.general),
+        )
+
+
+@escenario('reportes')
+class Reportes(Escenario):
+    frio = False
+
+    def peticion(self, i):
+        opciones = [None, *self.datos.sucursales]
+        sucursal = opciones[i % len(opciones)]
+        if self.frio:
+            reportes.subir_versiones([sucursal.id] if sucursal else [])
+        url = '/api/reportes/estadisticas/'
+        if sucursal:
+            url += f'?sucursal={sucursal.id}'
+        return 'get', url, None, self.datos.autorizacion(self.datos.general)
+
+
+@escenario('reportes_frio')
+class ReportesFrio(Reportes):
+    frio = True
+
+
+# ============================================================================
+# EJECUCIÓN
+# ============================================================================
+
+def _enviar(cliente, metodo, url, datos, headers):
+    if datos is None:
+        return getattr(cliente, metodo)(url, headers=headers)
+    return getattr(cliente, metodo)(url, data=json.dumps(datos), content_type='application/json', headers=headers)
+
+
+async def _aenviar(cliente, metodo, url, datos, headers):
+    if datos is None:
+        return await getattr(cliente, metodo)(url, headers=headers)
+    return await getattr(cliente, metodo)(
+        url, data=json.dumps(datos), content_type='application/json', headers=headers
+    )
+
+
+def _estadisticas(valores):
+    valores = sorted(valores)
+    if not valores:
+        return None
+    return {
+        'media': round(sum(valores) / len(valores), 2),
+        'p50': round(percentil(valores, 50), 2),
+        'p95': round(percentil(valores, 95), 2),
+        'p99': round(percentil(valores, 99), 2),
+        'max': round(valores[-1], 2),
+    }
+
+
+def _resultado(escenario, muestras, duracion, concurrencia):
+    estados = Counter(str(status) for _, _, status in muestras)
+    errores = sum(n for status, n in estados.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        'peticiones': len(muestras),
+        'concurrencia': concurrencia,
+        'servidor': 'asgi' if escenario.asgi else 'wsgi',
+        'duracion_s': round(duracion, 3),
+        'peticiones_por_segundo': round(len(muestras) / duracion, 2) if duracion else None,
+        'latencia_ms': _estadisticas([ms for ms, _, _ in muestras]),
+        'consultas': _estadisticas([consultas for _, consultas, _ in muestras if consultas is not None]),
+        'estados': dict(sorted(estados.items())),
+        'errores': errores,
+        **escenario.resumen(),
+    }
+
+
+def ejecutar_escenario(escenario, peticiones, concurrencia, calentamiento=0):
+    """
+    Ejecuta `peticiones` peticiones del escenario repartidas entre
+    `concurrencia` hilos (o clientes async si escenario.asgi) y retorna el
+    resultado como dict.
+    """
+    if escenario.asgi:
+        return ejecutar_escenario_asgi(escenario, peticiones, concurrencia, calentamiento)
+
+    # El calentamiento carga caches, imports y conexiones; no se mide
+    cliente = Client(raise_request_exception=False)
+    for i in range(calentamiento):
+        _enviar(cliente, *escenario.peticion(i))
+
+    escenario.preparar(peticiones)
+
+    siguiente = iter(range(peticiones))
+    candado = threading.Lock()
+    muestras = []
+
+    def trabajador():
+        cliente = Client(raise_request_exception=False)
+        propias = []
+        try:
+            while True:
+                with candado:
+                    i = next(siguiente, None)
+                if i is None:
+                    break
+                metodo, url, datos, headers = escenario.peticion(i)
+                medicion = Medicion()
+                inicio = time.perf_counter()
+                try:
+                    with connection.execute_wrapper(medicion):
+                        status = _enviar(cliente, metodo, url, datos, headers).status_code
+                except Exception:
+                    status = 'excepcion'
+                propias.append(((time.perf_counter() - inicio) * 1000, medicion.consultas, status))
+        finally:
+            connections.close_all()
+            with candado:
+                muestras.extend(propias)
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(max(concurrencia, 1))]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    return _resultado(escenario, muestras, duracion, concurrencia)
+
+
+# Como en panaderia/asgi.py: sin WhiteNoise (solo sync) en la cadena ASGI
+MIDDLEWARE_ASGI = [m for m in settings.MIDDLEWARE if m != 'whitenoise.middleware.WhiteNoiseMiddleware']
+
+
+def ejecutar_escenario_asgi(escenario, peticiones, concurrencia, calentamiento=0):
+    """
+    Como ejecutar_escenario() pero con `concurrencia` clientes async en un
+    solo event loop. Las consultas SQL no se cuentan: corren en los hilos
+    del ORM async y de las vistas sync.
+    """
+    async def correr():
+        cliente = AsyncClient(raise_request_exception=False)
+        for i in range(calentamiento):
+            await _aenviar(cliente, *escenario.peticion(i))
+
+        await sync_to_async(escenario.preparar)(peticiones)
+        siguiente = iter(range(peticiones))
+        muestras = []
+
+        async def trabajador():
+            cliente = AsyncClient(raise_request_exception=False)
+            for i in siguiente:  # Un solo hilo: next() no necesita candado
+                metodo, url, datos, headers = escenario.peticion(i)
+                inicio = time.perf_counter()
+                try:
+                    status = (await _aenviar(cliente, metodo, url, datos, headers)).status_code
+                except Exception:
+                    status = 'excepcion'
+                muestras.append(((time.perf_counter() - inicio) * 1000, None, status))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(max(concurrencia, 1))))
+        return muestras, time.perf_counter() - inicio
+
+    with override_settings(MIDDLEWARE=MIDDLEWARE_ASGI):
+        muestras, duracion = asyncio.run(correr())
+    return _resultado(escenario, muestras, duracion, concurrencia)
@@ -0,0 +1,244 @@
+# Backend/core/cache.py
+# ⭐⭐⭐ Capa de cache compartida entre workers (Redis / archivos)
+#
+# - settings.CACHES apunta a Redis (REDIS_URL) en producción y a un cache en
+#   archivos en desarrollo y pruebas: todos los workers de uvicorn ven las
+#   mismas entradas y las mismas invalidaciones
+# - Cada módulo usa un EspacioCache con nombre propio ('reportes',
+#   'catalogo', 'destinatarios'...):
+#     * claves con espacio + partes + alcance + versión del alcance
+#     * invalidar(alcances) sube la versión de esos alcances y la de 'todas'
+#       al confirmar la transacción; las entradas viejas expiran solas
+#     * obtener(clave, calcular): si la clave falta, solo UN proceso la
+#       recalcula (candado con cache.add); los demás esperan el resultado
+#       en lugar de repetir la misma consulta pesada (stampede)
+#     * contadores compartidos de aciertos, fallos y esperas
+#     * aversion/aclave/aobtener/acontar: lo mismo para vistas async
+#       (core/views_async.py), con las mismas claves que la versión sync
+#
+# ⚠️ Con el cache en archivos incr()/add() no son atómicos entre procesos:
+# basta para desarrollo y pruebas; en producción usar Redis.
+
+import asyncio
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALCANCE_TODAS = 'todas'
+ESPERA_MAXIMA_SEGUNDOS = 5
+INTERVALO_ESPERA_SEGUNDOS = 0.05
+
+_FALTA = object()
+
+ESPACIOS = {}
+
+
+class SinGuardar:
+    """Resultado de calcular() que se retorna pero no se guarda (p. ej. una respuesta de error)"""
+
+    def __init__(self, valor):
+        self.valor = valor
+
+
+class EspacioCache:
+    """
+    Grupo de claves con versión por alcance.
+
+    Uso:
+        reportes = EspacioCache('reportes', 'REPORTES_CACHE_SEGUNDOS', 3600)
+        clave = reportes.clave('estadisticas', '2025-11-20', alcance=sucursal_id)
+        datos = reportes.obtener(clave, lambda: calcular_estadisticas(sucursal_id))
+        reportes.invalidar([sucursal_id])
+    """
+
+    EVENTOS = ('aciertos', 'fallos', 'esperas', 'esperas_agotadas')
+
+    def __init__(self, nombre, ajuste_duracion, duracion_por_defecto):
+        self.nombre = nombre
+        self.ajuste_duracion = ajuste_duracion
+        self.duracion_por_defecto = duracion_por_defecto
+        ESPACIOS[nombre] = self
+
+    def duracion(self):
+        return getattr(settings, self.ajuste_duracion, self.duracion_por_defecto)
+
+    # ------------------------------------------------------------------------
+    # VERSIONES
+    # ------------------------------------------------------------------------
+
+    def _clave_version(self, alcance):
+        return f'{self.nombre}:version:{alcance or ALCANCE_TODAS}'
+
+    def version(self, alcance=None):
+        """
+        Versión actual del alcance. Empieza en una marca de tiempo (no en 1)
+        para que, si el cache pierde la clave, nunca se reutilice una versión
+        anterior.
+        """
+        clave = self._clave_version(alcance)
+        actual = cache.get(clave)
+        if actual is None:
+            cache.add(clave, int(time.time() * 1000), timeout=None)
+            actual = cache.get(clave)
+        return actual
+
+    def subir_versiones(self, alcances):
+        """Sube YA la versión de los alcances indicados y la de 'todas'"""
+        alcances = {ALCANCE_TODAS} | {str(a) for a in alcances if a}
+        for alcance in alcances:
+            clave = self._clave_version(alcance)
+            try:
+                cache.incr(clave)
+            except ValueError:
+                # La clave no existía: se crea con una versión nueva
+                cache.set(clave, int(time.time() * 1000), timeout=None)
+        logger.info(f"🗑️ Cache '{self.nombre}' invalidado: {', '.join(sorted(alcances))}")
+
+    def invalidar(self, alcances=()):
+        """
+        Invalida los alcances indicados y 'todas' al confirmar la transacción
+        actual, para que nadie guarde en la versión nueva datos calculados
+        antes del commit.
+        """
+        alcances = list(alcances)
+        transaction.on_commit(lambda: self.subir_versiones(alcances))
+
+    def clave(self, *partes, alcance=None):
+        """'<espacio>:<partes...>:<alcance>:v<versión>'"""
+        etiqueta = str(alcance) if alcance else ALCANCE_TODAS
+        return ':'.join([self.nombre, *map(str, partes), etiqueta, f'v{self.version(alcance)}'])
+
+    # ------------------------------------------------------------------------
+    # LECTURA CON RECÁLCULO ÚNICO
+    # ------------------------------------------------------------------------
+
+    def obtener(self, clave, calcular, duracion=None):
+        """
+        Valor de `clave` o el resultado de `calcular()`, guardado con la
+        duración del espacio. Si otro proceso ya está calculando la misma
+        clave, se espera su resultado (hasta ESPERA_MAXIMA_SEGUNDOS).
+        """
+        valor = cache.get(clave, _FALTA)
+        if valor is not _FALTA:
+            self.contar('aciertos')
+            return valor
+
+        candado = f'{clave}:calculando'
+        if not cache.add(candado, 1, timeout=ESPERA_MAXIMA_SEGUNDOS):
+            valor = self._esperar(clave)
+            if valor is not _FALTA:
+                self.contar('esperas')
+                return valor
+            # Quien calculaba tardó demasiado o falló: se calcula aquí
+            self.contar('esperas_agotadas')
+            return self._calcular_y_guardar(clave, calcular, duracion)
+
+        try:
+            self.contar('fallos')
+            return self._calcular_y_guardar(clave, calcular, duracion)
+        finally:
+            cache.delete(candado)
+
+    def _esperar(self, clave):
+        limite = time.monotonic() + ESPERA_MAXIMA_SEGUNDOS
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA_SEGUNDOS)
+            valor = cache.get(clave, _FALTA)
+            if valor is not _FALTA:
+                return valor
+        return _FALTA
+
+    def _calcular_y_guardar(self, clave, calcular, duracion):
+        valor = calcular()
+        if isinstance(valor, SinGuardar):
+            return valor.valor
+        cache.set(clave, valor, timeout=duracion or self.duracion())
+        return valor
+
+    # ------------------------------------------------------------------------
+    # VERSIÓN ASYNC (mismas claves y candados que la versión sync)
+    # ------------------------------------------------------------------------
+
+    async def aversion(self, alcance=None):
+        clave = self._clave_version(alcance)
+        actual = await cache.aget(clave)
+        if actual is None:
+            await cache.aadd(clave, int(time.time() * 1000), timeout=None)
+            actual = await cache.aget(clave)
+        return actual
+
+    async def aclave(self, *partes, alcance=None):
+        etiqueta = str(alcance) if alcance else ALCANCE_TODAS
+        return ':'.join([self.nombre, *map(str, partes), etiqueta, f'v{await self.aversion(alcance)}'])
+
+    async def aobtener(self, clave, calcular, duracion=None):
+        """Como obtener(), pero `calcular` es una corrutina y la espera no bloquea el event loop"""
+        valor = await cache.aget(clave, _FALTA)
+        if valor is not _FALTA:
+            await self.acontar('aciertos')
+            return valor
+
+        candado = f'{clave}:calculando'
+        if not await cache.aadd(candado, 1, timeout=ESPERA_MAXIMA_SEGUNDOS):
+            limite = time.monotonic() + ESPERA_MAXIMA_SEGUNDOS
+            while time.monotonic() < limite:
+                await asyncio.sleep(INTERVALO_ESPERA_SEGUNDOS)
+                valor = await cache.aget(clave, _FALTA)
+                if valor is not _FALTA:
+                    await self.acontar('esperas')
+                    return valor
+            await self.acontar('esperas_agotadas')
+            return await self._acalcular_y_guardar(clave, calcular, duracion)
+
+        try:
+            await self.acontar('fallos')
+            return await self._acalcular_y_guardar(clave, calcular, duracion)
+        finally:
+            await cache.adelete(candado)
+
+    async def _acalcular_y_guardar(self, clave, calcular, duracion):
+        valor = await calcular()
+        if isinstance(valor, SinGuardar):
+            return valor.valor
+        await cache.aset(clave, valor, timeout=duracion or self.duracion())
+        return valor
+
+    async def acontar(self, evento):
+        clave = f'{self.nombre}:stats:{evento}'
+        try:
+            await cache.aincr(clave)
+        except ValueError:
+            await cache.aadd(clave, 0, timeout=None)
+            await cache.aincr(clave)
+
+    # ------------------------------------------------------------------------
+    # MÉTRICAS
+    # ------------------------------------------------------------------------
+
+    def contar(self, evento):
+        clave = f'{self.nombre}:stats:{evento}'
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.add(clave, 0, timeout=None)
+            cache.incr(clave)
+
+    def estadisticas(self, eventos=None):
+        """Contadores del espacio (compartidos por todos los workers)"""
+        eventos = eventos or self.EVENTOS
+        valores = cache.get_many([f'{self.nombre}:stats:{evento}' for evento in eventos])
+        datos = {evento: valores.get(f'{self.nombre}:stats:{evento}', 0) for evento in eventos}
+        total = sum(datos.values())
+        resueltas = total - datos.get('fallos', 0) - datos.get('esperas_agotadas', 0)
+        datos['tasa_aciertos'] = round(resueltas / total, 4) if total else None
+        datos['duracion_segundos'] = self.duracion()
+        return datos
+
+
+def backend_cache():
+    """Nombre del backend configurado ('RedisCache', 'FileBasedCache'...)"""
+    return type(cache).__name__
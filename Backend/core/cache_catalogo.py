@@ -0,0 +1,158 @@
+# Backend/core/cache_catalogo.py
+# ⭐⭐⭐ Cache versionado del catálogo (productos, ofertas y sucursales activas)
+#
+# - Espacio 'catalogo' de core/cache.py: cada alcance ('todas' y cada
+#   sucursal) tiene un número de versión y la clave de un listado incluye
+#   recurso + alcance + versión + día local + URL pedida
+# - El alcance sale del parámetro ?sucursal= o, sin él, del rol:
+#     anónimo/cliente → 'activas', administrador_general → 'todas',
+#     administrador → su sucursal
+# - Cambios de productos, ofertas o stock suben la versión de su sucursal y
+#   la de 'todas' (los listados sin ?sucursal= usan la versión de 'todas')
+# - El ETag sale de la clave: si el cliente ya tiene esa versión se responde
+#   304 Not Modified sin consultar la base de datos ni serializar nada
+#
+# - aresponder_con_cache(): lo mismo para las vistas async del catálogo
+#   (core/views_async.py), con las mismas claves
+#
+# Contadores de aciertos/fallos/304: GET /api/reportes/cache/
+
+import hashlib
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.encoding import iri_to_uri
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .cache import ALCANCE_TODAS, EspacioCache, SinGuardar
+
+catalogo = EspacioCache('catalogo', 'CATALOGO_CACHE_SEGUNDOS', 600)
+
+
+def duracion_cache():
+    return catalogo.duracion()
+
+
+def version(sucursal_id=None):
+    return catalogo.version(sucursal_id)
+
+
+def invalidar_catalogo(sucursal_ids=()):
+    """
+    Invalida los listados de las sucursales indicadas y los de 'todas'.
+    Se ejecuta al confirmar la transacción actual.
+    """
+    catalogo.invalidar(sucursal_ids)
+
+
+def invalidar_catalogo_de_productos(producto_ids):
+    """Como invalidar_catalogo() pero a partir de productos (cambios de stock con UPDATE)"""
+    from .models import Producto
+    producto_ids = list(producto_ids)
+
+    def subir():
+        sucursales = Producto.objects.filter(pk__in=producto_ids).values_list('sucursal_id', flat=True).distinct()
+        catalogo.subir_versiones(sucursales)
+
+    transaction.on_commit(subir)
+
+
+def invalidar_todo_el_catalogo():
+    from .models import Sucursal
+    invalidar_catalogo(Sucursal.objects.values_list('id', flat=True))
+
+
+# ============================================================================
+# LISTADOS
+# ============================================================================
+
+def alcance_de(request):
+    """
+    (alcance, sucursal_id) del listado pedido. sucursal_id decide qué versión
+    se usa; None usa la de 'todas'.
+    """
+    sucursal_id = request.query_params.get('sucursal')
+    if sucursal_id:
+        return f'sucursal-{sucursal_id}', sucursal_id
+
+    user = request.user
+    if not user.is_authenticated or user.rol == 'cliente':
+        return 'activas', None
+    if user.rol == 'administrador_general':
+        return ALCANCE_TODAS, None
+    if user.rol == 'administrador' and user.sucursal_id:
+        return f'sucursal-{user.sucursal_id}', user.sucursal_id
+    return 'ninguna', None
+
+
+def responder_con_cache(request, recurso, alcance, sucursal_id, calcular):
+    """
+    Retorna el listado `recurso` desde el cache, 304 si el cliente ya tiene
+    esta versión, o lo calcula con `calcular()` (que retorna un Response) y lo
+    guarda. Solo se guardan las respuestas 200.
+    """
+    clave = catalogo.clave(*_partes_clave(request, recurso, alcance), alcance=sucursal_id)
+    etag = _etag(clave)
+
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        catalogo.contar('no_modificado')
+        return _con_cabeceras(no_modificado, etag)
+
+    def calcular_datos():
+        response = calcular()
+        if response.status_code != status.HTTP_200_OK:
+            return SinGuardar(response)
+        return response.data
+
+    datos = catalogo.obtener(clave, calcular_datos)
+    if isinstance(datos, Response):
+        return datos
+    return _con_cabeceras(Response(datos), etag)
+
+
+async def aresponder_con_cache(request, recurso, alcance, sucursal_id, calcular, ruta_sync):
+    """
+    Como responder_con_cache() para vistas async (core/views_async.py):
+    `calcular` es una corrutina que retorna los DATOS del listado. La clave
+    se arma con `ruta_sync` (la URL del listado sync equivalente): ambas
+    versiones comparten entradas y ETags.
+    """
+    partes = _partes_clave(request, recurso, alcance, ruta_sync)
+    clave = await catalogo.aclave(*partes, alcance=sucursal_id)
+    etag = _etag(clave)
+
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        await catalogo.acontar('no_modificado')
+        return _con_cabeceras(no_modificado, etag)
+
+    datos = await catalogo.aobtener(clave, calcular)
+    return _con_cabeceras(HttpResponse(JSONRenderer().render(datos), content_type='application/json'), etag)
+
+
+def _partes_clave(request, recurso, alcance, ruta=None):
+    if ruta is not None:
+        consulta = request.META.get('QUERY_STRING', '')
+        ruta = f"{ruta}?{iri_to_uri(consulta)}" if consulta else ruta
+    url = hashlib.sha1(request.build_absolute_uri(ruta).encode()).hexdigest()[:16]
+    return recurso, alcance, timezone.localdate().isoformat(), url
+
+
+def _etag(clave):
+    return f'"{hashlib.sha1(clave.encode()).hexdigest()}"'
+
+
+def _con_cabeceras(response, etag):
+    # no-cache: el navegador guarda la respuesta pero la revalida con If-None-Match
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def estadisticas_cache():
+    """Contadores de aciertos/fallos/304 del cache de catálogo"""
+    return catalogo.estadisticas(eventos=(*catalogo.EVENTOS, 'no_modificado'))
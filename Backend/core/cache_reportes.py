@@ -0,0 +1,54 @@
+# Backend/core/cache_reportes.py
+# ⭐⭐⭐ Cache versionado de los reportes por sucursal (espacio 'reportes' de core/cache.py)
+#
+# - Cada alcance ('todas' y cada sucursal) tiene un número de versión en el cache
+# - La clave de un reporte incluye alcance + versión + día local, así que:
+#     * un pedido que entra/sale de 'entregado' o se elimina sube la versión
+#       de sus sucursales y de 'todas' → las claves viejas dejan de usarse
+#     * al cambiar el día la clave cambia sola (hoy/semana/mes se recalculan)
+# - No se borra nada: las entradas viejas expiran con REPORTES_CACHE_SEGUNDOS
+# - Las versiones se suben al CONFIRMAR la transacción para que nadie guarde
+#   en la versión nueva datos calculados antes del commit
+# - Si varios workers piden el mismo reporte vencido, solo uno lo recalcula
+#
+# Contadores de aciertos/fallos: GET /api/reportes/cache/
+
+from django.utils import timezone
+from .cache import EspacioCache
+
+reportes = EspacioCache('reportes', 'REPORTES_CACHE_SEGUNDOS', 3600)
+
+
+def duracion_cache():
+    return reportes.duracion()
+
+
+def version(sucursal_id=None):
+    return reportes.version(sucursal_id)
+
+
+def invalidar_reportes(sucursal_ids=()):
+    """
+    Invalida los reportes de las sucursales indicadas y el de 'todas'.
+    Se ejecuta al confirmar la transacción actual.
+    """
+    reportes.invalidar(sucursal_ids)
+
+
+def invalidar_todos_los_reportes():
+    from .models import Sucursal
+    invalidar_reportes(Sucursal.objects.values_list('id', flat=True))
+
+
+def obtener_reporte(nombre, sucursal_id, calcular):
+    """
+    Retorna el reporte `nombre` del alcance desde el cache o lo calcula con
+    `calcular()` y lo guarda.
+    """
+    clave = reportes.clave(nombre, timezone.localdate().isoformat(), alcance=sucursal_id)
+    return reportes.obtener(clave, calcular)
+
+
+def estadisticas_cache():
+    """Contadores de aciertos/fallos del cache de reportes"""
+    return reportes.estadisticas()
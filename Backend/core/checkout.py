@@ -0,0 +1,198 @@
+# Backend/core/checkout.py
+# ⭐⭐⭐ Motor de checkout: productos bloqueados en UNA consulta + stock con F()
+#
+# El número de consultas es constante sin importar el tamaño del carrito:
+#   1. SELECT ... FOR UPDATE de todos los productos del carrito
+#   2. UPDATE condicional del stock de todos los productos
+#   3. INSERT del pedido (con el total ya calculado)
+#   4. INSERT masivo (bulk_create) de los detalles
+#
+# Los items con 'reserva' confirman una ReservaStock (core/reservas.py) y no
+# vuelven a competir por el bloqueo de la fila del producto.
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, PositiveIntegerField, Q, Value, When
+from rest_framework import serializers
+from .models import Producto, Pedido, DetallePedido
+from .cache_catalogo import invalidar_catalogo_de_productos
+
+
+def agrupar_items(items):
+    """
+    Suma las cantidades de un mismo producto repetido en el carrito.
+    Retorna {producto_id: cantidad} respetando el orden de llegada.
+    """
+    cantidades = {}
+    for item in items:
+        producto_id = item['producto']
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + item['cantidad']
+    return cantidades
+
+
+def descontar_stock(cantidades):
+    """
+    Reduce el stock de varios productos con un solo UPDATE condicional.
+
+    Cada producto solo se actualiza si todavía tiene stock suficiente
+    (stock >= cantidad), por lo que dos checkouts concurrentes nunca pueden
+    dejar el stock en negativo. Retorna el número de filas actualizadas.
+    """
+    condicion = Q()
+    nuevo_stock = []
+    nueva_disponibilidad = []
+
+    for producto_id, cantidad in cantidades.items():
+        condicion |= Q(pk=producto_id, stock__gte=cantidad)
+        nuevo_stock.append(When(pk=producto_id, then=F('stock') - cantidad))
+        # Si se vende exactamente lo que queda, el producto se agota
+        nueva_disponibilidad.append(When(pk=producto_id, stock=cantidad, then=Value(False)))
+
+    actualizados = Producto.objects.filter(condicion).update(
+        stock=Case(*nuevo_stock, default=F('stock'), output_field=PositiveIntegerField()),
+        disponible=Case(
+            *nueva_disponibilidad,
+            default=F('disponible'),
+            output_field=BooleanField()
+        ),
+    )
+    if actualizados:
+        invalidar_catalogo_de_productos(cantidades)
+    return actualizados
+
+
+def reponer_stock(cantidades):
+    """
+    Devuelve unidades a varios productos con un solo UPDATE.
+    Los productos que estaban agotados (stock = 0) se reactivan y se
+    resetea su alerta de SIN STOCK, igual que al reabastecer manualmente.
+    """
+    if not cantidades:
+        return 0
+
+    nuevo_stock = [
+        When(pk=producto_id, then=F('stock') + cantidad)
+        for producto_id, cantidad in cantidades.items()
+    ]
+
+    actualizados = Producto.objects.filter(pk__in=list(cantidades)).update(
+        stock=Case(*nuevo_stock, default=F('stock'), output_field=PositiveIntegerField()),
+        disponible=Case(
+            When(stock=0, then=Value(True)),
+            default=F('disponible'),
+            output_field=BooleanField()
+        ),
+        alerta_stock_enviada=Case(
+            When(stock=0, then=Value(False)),
+            default=F('alerta_stock_enviada'),
+            output_field=BooleanField()
+        ),
+    )
+    invalidar_catalogo_de_productos(cantidades)
+    return actualizados
+
+
+def procesar_checkout(usuario, items, tipo_entrega='domicilio'):
+    """
+    Crea un pedido a partir de los items del carrito.
+
+    Args:
+        usuario: Usuario que realiza el pedido
+        items: Lista de {'producto': id, 'cantidad': n} ya validada. Un item
+            puede incluir 'reserva': id para confirmar una ReservaStock; en ese
+            caso el stock ya fue descontado al reservar y no se vuelve a tocar.
+        tipo_entrega: 'domicilio' o 'recoger'
+
+    Returns:
+        Pedido creado
+
+    Raises:
+        serializers.ValidationError si algún producto no existe, no está
+        disponible o no tiene stock suficiente, o si una reserva no es válida.
+        En ese caso no se modifica nada.
+    """
+    from .signals import clasificar_cambio_stock, despachar_alerta_stock
+    from .reservas import confirmar_reservas, marcar_confirmadas
+
+    cantidades = agrupar_items([item for item in items if not item.get('reserva')])
+    reservas_por_item = {
+        item['reserva']: (item['producto'], item['cantidad'])
+        for item in items if item.get('reserva')
+    }
+
+    with transaction.atomic():
+        # ⭐ Las reservas ya tienen el stock apartado: solo se validan
+        reservas = confirmar_reservas(usuario, reservas_por_item)
+
+        total = sum(r.producto.precio * r.cantidad for r in reservas)
+        lineas = [(r.producto_id, r.cantidad, r.producto.precio) for r in reservas]
+
+        productos = {}
+        if cantidades:
+            # ⭐ Una sola consulta bloqueando todas las filas (orden fijo = sin deadlocks)
+            productos = Producto.objects.select_for_update().order_by('pk').in_bulk(
+                list(cantidades)
+            )
+
+        alertas = []
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+
+            if producto is None:
+                raise serializers.ValidationError({
+                    'items': [f"El producto con ID {producto_id} no existe"]
+                })
+
+            if not producto.disponible:
+                raise serializers.ValidationError({
+                    'items': [f"El producto '{producto.nombre}' no está disponible"]
+                })
+
+            if producto.stock < cantidad:
+                raise serializers.ValidationError({
+                    'stock': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}, Solicitado: {cantidad}'
+                })
+
+            total += producto.precio * cantidad
+            lineas.append((producto_id, cantidad, producto.precio))
+            alerta = clasificar_cambio_stock(producto.stock, producto.stock - cantidad)
+            if alerta:
+                alertas.append((producto_id, alerta))
+
+            print(f"   📦 Stock reducido: {producto.nombre} ({producto.stock} → {producto.stock - cantidad})")
+
+        # ⭐ Guardia extra: si otro proceso tocó el stock (p. ej. motor sin
+        # SELECT FOR UPDATE como SQLite), el UPDATE condicional lo detecta
+        if cantidades and descontar_stock(cantidades) != len(cantidades):
+            raise serializers.ValidationError({
+                'stock': 'El stock cambió mientras se procesaba el pedido. Intenta de nuevo.'
+            })
+
+        # ⭐ CRÍTICO: Solo guardar dirección si es entrega a domicilio
+        direccion_entrega = usuario.domicilio if tipo_entrega == 'domicilio' else None
+
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            estado='recibido',
+            total=total,
+            tipo_entrega=tipo_entrega,
+            direccion_entrega=direccion_entrega
+        )
+
+        DetallePedido.objects.bulk_create([
+            DetallePedido(
+                pedido=pedido,
+                producto_id=producto_id,
+                cantidad=cantidad,
+                precio_unitario=precio  # ⭐ Precio al momento de la compra
+            )
+            for producto_id, cantidad, precio in lineas
+        ])
+
+        marcar_confirmadas(reservas, pedido)
+
+        # El UPDATE masivo no dispara signals: las alertas se encolan aquí,
+        # en la misma transacción (si el pedido falla, no se envían)
+        for producto_id, alerta in alertas:
+            despachar_alerta_stock(producto_id, alerta)
+
+    return pedido
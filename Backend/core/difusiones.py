@@ -0,0 +1,150 @@
+# Backend/core/difusiones.py
+# ⭐⭐⭐ Emails masivos a clientes por lotes (nuevo producto, nueva oferta)
+#
+# FLUJO:
+# 1. crear_difusion(): el email se renderiza UNA vez y se guarda en Difusion
+# 2. despachar_difusion(): recorre los clientes por id con un iterator()
+#    (solo id + email, nunca instancias de Usuario) y encola un Trabajo
+#    'difusion.lote' por cada DIFUSION_TAMANO_LOTE destinatarios
+# 3. enviar_lote_difusion(): cada lote se envía por separado; si falla, solo
+#    se reintenta ese lote
+#
+# La memoria usada es la de un lote, sin importar cuántos clientes haya.
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Difusion, Usuario
+from .jobs import encolar
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def tamano_lote():
+    """Destinatarios por lote (por defecto el límite de una llamada a SendGrid)"""
+    return max(getattr(settings, 'DIFUSION_TAMANO_LOTE', 1000), 1)
+
+
+def audiencia_clientes():
+    """Clientes activos con email, ordenados por id (orden estable para el cursor)"""
+    return (
+        Usuario.objects.filter(rol='cliente', is_active=True, email__isnull=False)
+        .exclude(email='')
+        .order_by('id')
+    )
+
+
+def crear_difusion(tipo, objeto_id, asunto, html, texto):
+    """
+    Registra la difusión de un producto/oferta y la despacha.
+    Si ya existía (reintento del trabajo), se retoma desde donde quedó
+    en lugar de volver a enviar a todos.
+    """
+    difusion, creada = Difusion.objects.get_or_create(
+        tipo=tipo,
+        objeto_id=objeto_id,
+        defaults={'asunto': asunto, 'html': html, 'texto': texto}
+    )
+    if not creada:
+        logger.info(f"🔁 Difusión #{difusion.id} ya existía, retomando despacho")
+
+    despachar_difusion(difusion.id)
+    return difusion
+
+
+def despachar_difusion(difusion_id):
+    """
+    Encola los lotes pendientes de una difusión.
+
+    Cada lote se encola en la misma transacción que avanza el cursor
+    ultimo_usuario_id, así que cortar el proceso a mitad nunca duplica ni
+    pierde destinatarios. Retorna el número de lotes encolados en esta llamada.
+    """
+    difusion = Difusion.objects.get(pk=difusion_id)
+    if difusion.estado != 'encolando':
+        return 0
+
+    tamano = tamano_lote()
+    encolados = 0
+    ids_lote = []
+
+    def encolar_lote(ids):
+        with transaction.atomic():
+            encolar('difusion.lote', difusion_id=difusion_id, desde_id=ids[0], hasta_id=ids[-1])
+            Difusion.objects.filter(pk=difusion_id).update(
+                ultimo_usuario_id=ids[-1],
+                total_destinatarios=F('total_destinatarios') + len(ids),
+                lotes_encolados=F('lotes_encolados') + 1,
+            )
+
+    destinatarios = (
+        audiencia_clientes()
+        .filter(id__gt=difusion.ultimo_usuario_id)
+        .values_list('id', flat=True)
+        .iterator(chunk_size=tamano)
+    )
+    for usuario_id in destinatarios:
+        ids_lote.append(usuario_id)
+        if len(ids_lote) == tamano:
+            encolar_lote(ids_lote)
+            encolados += 1
+            ids_lote = []
+
+    if ids_lote:
+        encolar_lote(ids_lote)
+        encolados += 1
+
+    Difusion.objects.filter(pk=difusion_id, estado='encolando').update(estado='enviando')
+    _marcar_si_completada(difusion_id)
+
+    difusion.refresh_from_db()
+    if difusion.total_destinatarios == 0:
+        logger.warning("⚠️ No hay clientes con correos válidos")
+    logger.info(
+        f"📣 Difusión #{difusion_id}: {difusion.total_destinatarios} destinatario(s) "
+        f"en {difusion.lotes_encolados} lote(s)"
+    )
+    return encolados
+
+
+def enviar_lote_difusion(difusion_id, desde_id, hasta_id):
+    """
+    Envía un lote de la difusión. Los destinatarios van en BCC: con SendGrid
+    cada uno recibe su propia personalization y con SMTP nadie ve a los demás.
+    Retorna True si el envío fue exitoso.
+    """
+    difusion = Difusion.objects.get(pk=difusion_id)
+    destinatarios = list(
+        audiencia_clientes()
+        .filter(id__gte=desde_id, id__lte=hasta_id)
+        .values_list('email', flat=True)
+    )
+
+    if destinatarios:
+        email = EmailMultiAlternatives(
+            subject=difusion.asunto,
+            body=difusion.texto,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            bcc=destinatarios,
+        )
+        email.attach_alternative(difusion.html, "text/html")
+
+        if not email.send(fail_silently=False):
+            return False
+
+    Difusion.objects.filter(pk=difusion_id).update(lotes_enviados=F('lotes_enviados') + 1)
+    _marcar_si_completada(difusion_id)
+
+    logger.info(f"✅ Difusión #{difusion_id}: lote {desde_id}-{hasta_id} enviado ({len(destinatarios)} destinatario(s))")
+    return True
+
+
+def _marcar_si_completada(difusion_id):
+    Difusion.objects.filter(
+        pk=difusion_id,
+        estado='enviando',
+        lotes_enviados__gte=F('lotes_encolados')
+    ).update(estado='completada', fecha_completada=timezone.now())
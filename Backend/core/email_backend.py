@@ -1,103 +1,187 @@
 # Backend/core/email_backend.py
+# ⭐⭐⭐ SendGrid por lotes: una personalization por destinatario y sesión HTTP reutilizada
+#
+# - Cada destinatario va en su propia personalization: nadie ve los correos
+#   de los demás aunque el mensaje tenga 500 direcciones en `to`
+# - Hasta SENDGRID_MAX_DESTINATARIOS (1000) destinatarios por llamada a la API
+# - Los lotes se envían en paralelo con un pool de SENDGRID_CONCURRENCIA hilos
+# - Una sola requests.Session por proceso (keep-alive + pool de conexiones)
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parseaddr
 from django.core.mail.backends.base import BaseEmailBackend
 from django.conf import settings
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Content, Email, To
+import requests
+from requests.adapters import HTTPAdapter
 import logging
 
 logger = logging.getLogger(__name__)
 
+SENDGRID_API_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+_sesion = None
+_sesion_lock = threading.Lock()
+
+
+def obtener_sesion():
+    """Sesión HTTP compartida por todos los envíos del proceso"""
+    global _sesion
+    if _sesion is None:
+        with _sesion_lock:
+            if _sesion is None:
+                tamano_pool = max(getattr(settings, 'SENDGRID_CONCURRENCIA', 4), 1)
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool)
+                sesion.mount('https://', adaptador)
+                sesion.mount('http://', adaptador)
+                _sesion = sesion
+    return _sesion
+
+
+class ResultadoLote:
+    """Resultado de una llamada a la API (un lote de destinatarios de un mensaje)"""
+
+    def __init__(self, mensaje, destinatarios, status=None, error=None):
+        self.mensaje = mensaje
+        self.destinatarios = destinatarios
+        self.status = status
+        self.error = error
+
+    @property
+    def exitoso(self):
+        return self.error is None and self.status in (200, 201, 202)
+
+    def __repr__(self):
+        estado = 'OK' if self.exitoso else f'ERROR {self.status or ""} {self.error or ""}'.strip()
+        return f"<ResultadoLote {len(self.destinatarios)} destinatario(s): {estado}>"
+
+
+class SendGridError(Exception):
+    def __init__(self, mensaje, resultados):
+        super().__init__(mensaje)
+        self.resultados = resultados
+
+
+def _direccion(valor):
+    nombre, email = parseaddr(valor)
+    direccion = {'email': email}
+    if nombre:
+        direccion['name'] = nombre
+    return direccion
+
+
+def construir_payload(message, destinatarios):
+    """JSON de /v3/mail/send con una personalization por destinatario"""
+    contenido = [{'type': 'text/plain', 'value': message.body or ' '}]
+    for alternativa, mimetype in getattr(message, 'alternatives', None) or []:
+        if mimetype == 'text/html':
+            contenido.append({'type': 'text/html', 'value': alternativa})
+            break
+
+    payload = {
+        'personalizations': [{'to': [_direccion(email)]} for email in destinatarios],
+        'from': _direccion(message.from_email),
+        'subject': message.subject,
+        'content': contenido,
+    }
+    if message.reply_to:
+        payload['reply_to'] = _direccion(message.reply_to[0])
+    return payload
+
 
 class SendGridBackend(BaseEmailBackend):
     """
     Backend personalizado para enviar emails usando SendGrid API.
     Funciona en Railway donde SMTP está bloqueado.
+
+    Después de send_messages(), self.resultados contiene un ResultadoLote
+    por cada llamada a la API.
     """
-    
+
     def __init__(self, fail_silently=False, **kwargs):
         super().__init__(fail_silently=fail_silently, **kwargs)
         self.api_key = getattr(settings, 'SENDGRID_API_KEY', None)
-        
+        self.api_url = getattr(settings, 'SENDGRID_API_URL', SENDGRID_API_URL)
+        self.max_destinatarios = max(getattr(settings, 'SENDGRID_MAX_DESTINATARIOS', 1000), 1)
+        self.concurrencia = max(getattr(settings, 'SENDGRID_CONCURRENCIA', 4), 1)
+        self.timeout = getattr(settings, 'EMAIL_TIMEOUT', None) or 10
+        self.resultados = []
+
         if not self.api_key:
             logger.warning("⚠️ SENDGRID_API_KEY no configurado")
-    
+
+    def armar_lotes(self, email_messages):
+        """Divide los destinatarios de cada mensaje en lotes de max_destinatarios"""
+        lotes = []
+        for message in email_messages:
+            destinatarios = list(dict.fromkeys(message.recipients()))
+            for inicio in range(0, len(destinatarios), self.max_destinatarios):
+                lotes.append((message, destinatarios[inicio:inicio + self.max_destinatarios]))
+        return lotes
+
+    def enviar_lote(self, message, destinatarios):
+        """Una llamada a la API. Nunca lanza excepción: el error queda en el resultado."""
+        try:
+            response = obtener_sesion().post(
+                self.api_url,
+                json=construir_payload(message, destinatarios),
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            return ResultadoLote(message, destinatarios, error=f"{type(e).__name__}: {e}")
+
+        resultado = ResultadoLote(message, destinatarios, status=response.status_code)
+        if not resultado.exitoso:
+            resultado.error = response.text[:500]
+        return resultado
+
     def send_messages(self, email_messages):
         """
         Envía una lista de mensajes de email usando SendGrid API.
-        Retorna el número de mensajes enviados exitosamente.
+        Retorna el número de mensajes enviados exitosamente (todos sus lotes OK).
         """
+        self.resultados = []
+
         if not self.api_key:
             logger.error("❌ No se puede enviar email: SENDGRID_API_KEY no configurado")
             if not self.fail_silently:
                 raise ValueError("SENDGRID_API_KEY no configurado")
             return 0
-        
-        num_sent = 0
-        sg = SendGridAPIClient(self.api_key)
-        
-        for message in email_messages:
-            try:
-                # Log del intento de envío
-                logger.info(f"📤 Preparando email via SendGrid: {message.subject}")
-                logger.info(f"   De: {message.from_email}")
-                logger.info(f"   Para: {', '.join(message.to)}")
-                
-                # Construir el mensaje para SendGrid
-                from_email = Email(message.from_email)
-                to_emails = [To(email) for email in message.to]
-                subject = message.subject
-                
-                # Priorizar HTML si existe, sino usar texto plano
-                html_content = None
-                plain_text = message.body
-                
-                # Buscar contenido HTML en alternatives
-                if message.alternatives:
-                    for content, mimetype in message.alternatives:
-                        if mimetype == 'text/html':
-                            html_content = content
-                            break
-                
-                # Crear el objeto Mail
-                if html_content:
-                    # Enviar HTML + texto plano como fallback
-                    mail = Mail(
-                        from_email=from_email,
-                        to_emails=to_emails,
-                        subject=subject,
-                        plain_text_content=plain_text,
-                        html_content=html_content
-                    )
-                else:
-                    # Solo texto plano
-                    mail = Mail(
-                        from_email=from_email,
-                        to_emails=to_emails,
-                        subject=subject,
-                        plain_text_content=plain_text
-                    )
-                
-                # Enviar el email
-                response = sg.send(mail)
-                
-                # Verificar respuesta
-                if response.status_code in [200, 201, 202]:
-                    num_sent += 1
-                    logger.info(f"✅ Email enviado exitosamente via SendGrid")
-                    logger.info(f"   Status Code: {response.status_code}")
-                else:
-                    logger.error(f"❌ SendGrid error: Status {response.status_code}")
-                    logger.error(f"   Body: {response.body}")
-                    if not self.fail_silently:
-                        raise Exception(f"SendGrid returned {response.status_code}: {response.body}")
-            
-            except Exception as e:
-                logger.error(f"❌ Error enviando email via SendGrid: {str(e)}")
-                logger.error(f"   Subject: {message.subject}")
-                logger.error(f"   To: {', '.join(message.to)}")
-                
-                if not self.fail_silently:
-                    raise
-        
+
+        lotes = self.armar_lotes(email_messages)
+        if not lotes:
+            return 0
+
+        logger.info(f"📤 SendGrid: {len(email_messages)} mensaje(s) en {len(lotes)} lote(s)")
+
+        if len(lotes) == 1:
+            self.resultados = [self.enviar_lote(*lotes[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrencia, len(lotes))) as pool:
+                self.resultados = list(pool.map(lambda lote: self.enviar_lote(*lote), lotes))
+
+        fallidos = set()
+        for resultado in self.resultados:
+            if resultado.exitoso:
+                logger.info(f"✅ Lote enviado: {resultado.mensaje.subject} ({len(resultado.destinatarios)} destinatario(s))")
+            else:
+                fallidos.add(id(resultado.mensaje))
+                logger.error(f"❌ Lote fallido: {resultado.mensaje.subject} ({len(resultado.destinatarios)} destinatario(s))")
+                logger.error(f"   Status: {resultado.status}, Error: {resultado.error}")
+
+        num_sent = sum(
+            1 for message in email_messages
+            if message.recipients() and id(message) not in fallidos
+        )
         logger.info(f"📊 Total emails enviados: {num_sent}/{len(email_messages)}")
-        return num_sent
\ No newline at end of file
+
+        if fallidos and not self.fail_silently:
+            errores = sum(1 for r in self.resultados if not r.exitoso)
+            raise SendGridError(
+                f"SendGrid: {errores} de {len(self.resultados)} lote(s) fallaron",
+                self.resultados
+            )
+
+        return num_sent
@@ -669,6 +669,62 @@ def template_alerta_stock_bajo(producto, url_admin_productos):
     return get_base_template(content)
 
 
+def template_resumen_stock_bajo(sucursal, productos, url_admin_productos):
+    """Template para el RESUMEN de stock bajo de una sucursal (varios productos en un email)"""
+    filas = ""
+    for producto in productos:
+        color = "#dc2626" if producto.stock == 0 else "#f59e0b"
+        etiqueta = "AGOTADO" if producto.stock == 0 else "BAJO"
+        filas += f"""
+            <tr>
+                <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; color: #111827; font-weight: 600;">{producto.nombre}</td>
+                <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: center; color: {color}; font-size: 20px; font-weight: 700;">{producto.stock}</td>
+                <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: center; color: {color}; font-size: 12px; font-weight: 600;">{etiqueta}</td>
+                <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; color: #6b7280;">₡{producto.precio:,.2f}</td>
+            </tr>
+        """
+    
+    content = f"""
+    <div class="header" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
+        <h1>Resumen: Stock Bajo</h1>
+        <p class="subtitle">{sucursal.nombre}</p>
+    </div>
+    <div class="content">
+        <p class="greeting">Hola Administrador,</p>
+        <p style="font-size: 16px; color: #6b7280; margin-bottom: 30px;">
+            Los siguientes <strong>{len(productos)} producto(s)</strong> tienen <strong>STOCK BAJO</strong>
+            y requieren reabastecimiento pronto:
+        </p>
+        
+        <table style="width: 100%; border-collapse: collapse; background-color: #fff7ed; border-radius: 8px; overflow: hidden;">
+            <thead>
+                <tr style="background-color: rgba(245, 158, 11, 0.15);">
+                    <th style="padding: 12px; text-align: left; color: #92400e;">Producto</th>
+                    <th style="padding: 12px; text-align: center; color: #92400e;">Stock Actual</th>
+                    <th style="padding: 12px; text-align: center; color: #92400e;">Estado</th>
+                    <th style="padding: 12px; text-align: right; color: #92400e;">Precio</th>
+                </tr>
+            </thead>
+            <tbody>
+                {filas}
+            </tbody>
+        </table>
+        
+        <div class="button-container">
+            <a href="{url_admin_productos}" class="button" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%); box-shadow: 0 4px 14px rgba(245, 158, 11, 0.4);">
+                Gestionar Inventario
+            </a>
+        </div>
+        
+        <p style="text-align: center; color: #6b7280; margin-top: 30px; font-size: 14px;">
+            Este resumen agrupa todas las alertas de stock bajo de la sucursal en los últimos minutos.
+        </p>
+    </div>
+    """
+    
+    return get_base_template(content)
+
+
 def template_notificacion_pedido_admin(pedido, url_admin_pedidos):
     """Template para notificación de nuevo pedido a administradores"""
     productos_html = ""
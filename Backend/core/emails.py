@@ -11,9 +11,12 @@ from .email_templates import (
     template_actualizacion_estado,
     template_alerta_stock_bajo,
     template_alerta_sin_stock,  # ⭐ NUEVO
+    template_resumen_stock_bajo,
     template_notificacion_pedido_admin,
     template_pedido_cancelado_admin
 )
+from .difusiones import crear_difusion
+from .cache import EspacioCache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,6 +30,10 @@ URL_ADMIN_PRODUCTOS = f"{FRONTEND_URL}/admin/productos"
 URL_ADMIN_OFERTAS = f"{FRONTEND_URL}/admin/ofertas"
 URL_ADMIN_PEDIDOS = f"{FRONTEND_URL}/admin/pedidos"
 
+# ⭐ Listas de destinatarios (admins por sucursal) en el cache compartido.
+# Se invalidan al guardar o eliminar cualquier usuario (ver signals.py)
+destinatarios = EspacioCache('destinatarios', 'DESTINATARIOS_CACHE_SEGUNDOS', 3600)
+
 
 def enviar_email_seguro(subject, html_content, text_content, recipients):
     """Wrapper para enviar emails con manejo robusto de errores"""
@@ -67,52 +74,35 @@ def enviar_email_seguro(subject, html_content, text_content, recipients):
 def obtener_admins_por_sucursal(sucursal):
     """
     Obtiene admins de una sucursal específica + admin_general
+    ⭐ Cacheado por sucursal (espacio 'destinatarios' de core/cache.py)
     """
-    from django.db.models import Q
+    clave = destinatarios.clave('admins', sucursal.id)
+    todos_emails = destinatarios.obtener(clave, lambda: _consultar_admins_por_sucursal(sucursal))
     
-    admins_sucursal = Usuario.objects.filter(
-        rol='administrador',
-        sucursal=sucursal,
-        is_active=True,
-        email__isnull=False
-    ).exclude(email='')
+    logger.info(f"📧 Admins para notificar en {sucursal.nombre}: {len(todos_emails)}")
     
-    admins_generales = Usuario.objects.filter(
-        rol='administrador_general',
+    return todos_emails
+
+
+def _consultar_admins_por_sucursal(sucursal):
+    """Emails de los admins activos de la sucursal y de los admins generales (una consulta)"""
+    from django.db.models import Q
+    
+    emails = Usuario.objects.filter(
+        Q(rol='administrador', sucursal=sucursal) | Q(rol='administrador_general'),
         is_active=True,
         email__isnull=False
-    ).exclude(email='')
-    
-    emails_sucursal = [admin.email for admin in admins_sucursal if admin.email]
-    emails_generales = [admin.email for admin in admins_generales if admin.email]
-    
-    todos_emails = list(set(emails_sucursal + emails_generales))
+    ).exclude(email='').values_list('email', flat=True)
     
-    logger.info(f"📧 Admins para notificar en {sucursal.nombre}:")
-    logger.info(f"   - Admins de sucursal: {len(emails_sucursal)}")
-    logger.info(f"   - Admins generales: {len(emails_generales)}")
-    logger.info(f"   - Total: {len(todos_emails)}")
-    
-    return todos_emails
+    return sorted(set(emails))
 
 
 def enviar_notificacion_nuevo_producto(producto_id):
-    """Envía correo a todos los clientes cuando se crea un nuevo producto"""
+    """Envía correo a todos los clientes cuando se crea un nuevo producto (difusión por lotes)"""
     try:
         producto = Producto.objects.get(id=producto_id)
         
-        clientes = Usuario.objects.filter(
-            rol='cliente',
-            is_active=True,
-            email__isnull=False
-        ).exclude(email='')
-        
-        destinatarios = [cliente.email for cliente in clientes if cliente.email]
-        
-        if not destinatarios:
-            logger.warning("⚠️ No hay clientes con correos válidos")
-            return False
-        
+        # ⭐ Se renderiza una sola vez; los clientes se recorren por lotes
         asunto = f"🥐 Nuevo Producto: {producto.nombre}"
         html_content = template_nuevo_producto(producto, URL_PRODUCTOS_CLIENTE)
         
@@ -131,7 +121,8 @@ def enviar_notificacion_nuevo_producto(producto_id):
         Alajuela, Costa Rica
         """
         
-        return enviar_email_seguro(asunto, html_content, text_content, destinatarios)
+        crear_difusion('nuevo_producto', producto.id, asunto, html_content, text_content)
+        return True
         
     except Producto.DoesNotExist:
         logger.error(f"❌ Producto {producto_id} no encontrado")
@@ -142,22 +133,11 @@ def enviar_notificacion_nuevo_producto(producto_id):
 
 
 def enviar_notificacion_oferta(oferta_id):
-    """Envía correo a todos los clientes cuando se crea una nueva oferta"""
+    """Envía correo a todos los clientes cuando se crea una nueva oferta (difusión por lotes)"""
     try:
         oferta = Oferta.objects.prefetch_related('productos').get(id=oferta_id)
         
-        clientes = Usuario.objects.filter(
-            rol='cliente',
-            is_active=True,
-            email__isnull=False
-        ).exclude(email='')
-        
-        destinatarios = [cliente.email for cliente in clientes if cliente.email]
-        
-        if not destinatarios:
-            logger.warning("⚠️ No hay clientes con correos válidos")
-            return False
-        
+        # ⭐ Se renderiza una sola vez; los clientes se recorren por lotes
         asunto = f"🎉 Nueva Oferta: {oferta.titulo}"
         html_content = template_nueva_oferta(oferta, URL_OFERTAS_CLIENTE)
         
@@ -182,7 +162,8 @@ def enviar_notificacion_oferta(oferta_id):
         Alajuela, Costa Rica
         """
         
-        return enviar_email_seguro(asunto, html_content, text_content, destinatarios)
+        crear_difusion('oferta', oferta.id, asunto, html_content, text_content)
+        return True
         
     except Oferta.DoesNotExist:
         logger.error(f"❌ Oferta {oferta_id} no encontrada")
@@ -488,6 +469,45 @@ def enviar_alerta_stock_bajo(producto_id):
         return False
 
 
+def enviar_resumen_stock_bajo(sucursal, productos):
+    """
+    Envía UN email con todos los productos de la sucursal que quedaron con
+    stock bajo durante la ventana de alertas (ver core/alertas.py)
+    """
+    try:
+        destinatarios = obtener_admins_por_sucursal(sucursal)
+        
+        if not destinatarios:
+            logger.warning(f"⚠️ No hay admins para notificar stock bajo en {sucursal.nombre}")
+            return True  # Nada que reintentar
+        
+        asunto = f"⚠️ ALERTA: {len(productos)} producto(s) con Stock Bajo ({sucursal.nombre})"
+        html_content = template_resumen_stock_bajo(sucursal, productos, URL_ADMIN_PRODUCTOS)
+        
+        lineas = "\n".join(
+            f"        - {producto.nombre}: {producto.stock} unidad(es)"
+            for producto in productos
+        )
+        text_content = f"""
+        ⚠️ RESUMEN DE INVENTARIO - {sucursal.nombre}
+        
+        Productos con stock bajo:
+{lineas}
+        
+        Gestionar inventario: {URL_ADMIN_PRODUCTOS}
+        
+        ---
+        Panadería Santa Clara
+        """
+        
+        logger.info(f"📧 Enviando resumen de STOCK BAJO para {sucursal.nombre} ({len(productos)} producto(s))")
+        return enviar_email_seguro(asunto, html_content, text_content, destinatarios)
+        
+    except Exception as e:
+        logger.error(f"❌ Error en enviar_resumen_stock_bajo: {str(e)}")
+        return False
+
+
 def enviar_actualizacion_estado(pedido_id):
     """Notifica al cliente cuando cambia el estado de su pedido"""
     try:
@@ -528,4 +548,90 @@ def enviar_actualizacion_estado(pedido_id):
         
     except Exception as e:
         logger.error(f"❌ Error en enviar_actualizacion_estado: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+# ============================================================================
+# CONTRASEÑAS (se envían desde la cola, ver views_password.py)
+# ============================================================================
+
+def enviar_recuperacion_password(email):
+    """
+    Envía el link de recuperación si existe un usuario con `email`.
+    Si no existe retorna True igual: no hay nada que reintentar.
+    """
+    from django.contrib.auth.tokens import default_token_generator
+    from django.core.mail import send_mail
+    from django.utils.encoding import force_bytes
+    from django.utils.http import urlsafe_base64_encode
+    
+    usuario = Usuario.objects.filter(email=email).first()
+    if usuario is None:
+        logger.info(f"⚠️ Recuperación para email no registrado: {email}")
+        return True
+    
+    token = default_token_generator.make_token(usuario)
+    uid = urlsafe_base64_encode(force_bytes(usuario.pk))
+    reset_url = f"{FRONTEND_URL}/recuperar-password/{uid}/{token}/"
+    
+    mensaje = f"""
+Hola {usuario.first_name or usuario.username},
+
+Recibimos una solicitud para restablecer tu contraseña.
+
+Para crear una nueva contraseña, haz clic en el siguiente enlace:
+{reset_url}
+
+Este enlace es válido por 24 horas.
+
+Si no solicitaste este cambio, puedes ignorar este correo.
+
+Saludos,
+Equipo de Panadería Santa Clara 🥐
+    """
+    
+    try:
+        send_mail(
+            subject='🔐 Recuperación de Contraseña - Panadería Santa Clara',
+            message=mensaje,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[usuario.email],
+            fail_silently=False,
+        )
+        logger.info(f"✅ Email de recuperación enviado a {usuario.email}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error enviando email de recuperación: {e}")
+        return False
+
+
+def enviar_password_actualizado(usuario_id):
+    """Confirma al usuario que su contraseña cambió"""
+    from django.core.mail import send_mail
+    
+    usuario = Usuario.objects.filter(pk=usuario_id).first()
+    if usuario is None or not usuario.email:
+        return True
+    
+    mensaje = f"""
+Hola {usuario.first_name or usuario.username},
+
+Tu contraseña ha sido actualizada exitosamente.
+
+Si no realizaste este cambio, contacta inmediatamente con soporte.
+
+Saludos,
+Equipo de Panadería Santa Clara 🥐
+    """
+    
+    try:
+        send_mail(
+            subject='🔐 Contraseña Actualizada - Panadería Santa Clara',
+            message=mensaje,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[usuario.email],
+            fail_silently=False,
+        )
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error enviando confirmación de contraseña: {e}")
+        return False
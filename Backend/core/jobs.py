@@ -0,0 +1,244 @@
+# Backend/core/jobs.py
+# ⭐⭐⭐ Cola de trabajos en segundo plano respaldada por la base de datos
+#
+# Reemplaza los threading.Thread(daemon=True) que se creaban por cada evento:
+# - encolar() inserta un Trabajo dentro de la transacción actual (si el pedido
+#   se revierte, el email tampoco se envía)
+# - El comando run_workers reclama trabajos con SELECT ... FOR UPDATE SKIP LOCKED
+#   y los ejecuta en un pool de hilos de tamaño fijo
+# - Los fallos se reintentan con backoff exponencial hasta max_intentos
+# - Cada tipo puede tener un límite de ejecuciones por minuto
+#
+# Las funciones de cada tipo se registran con @tarea en core/tareas.py
+
+import random
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Trabajo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reintentos: 30s, 1m, 2m, 4m ... (máximo 1 hora)
+BACKOFF_BASE_SEGUNDOS = 30
+BACKOFF_MAXIMO_SEGUNDOS = 3600
+
+# Un trabajo 'en_proceso' más viejo que esto se considera abandonado
+# (el worker murió) y vuelve a 'pendiente', o queda 'fallido' si ya gastó
+# todos sus intentos (un trabajo que tumba al worker no se repite sin fin)
+TIEMPO_MAXIMO_EJECUCION = timedelta(minutes=10)
+
+# Cada cuánto run_workers busca trabajos abandonados
+INTERVALO_RECUPERACION_SEGUNDOS = 60
+
+_TAREAS = {}
+
+
+class TipoTrabajo:
+    def __init__(self, tipo, funcion, max_intentos, por_minuto):
+        self.tipo = tipo
+        self.funcion = funcion
+        self.max_intentos = max_intentos
+        self.por_minuto = por_minuto
+
+
+def tarea(tipo, max_intentos=5, por_minuto=None):
+    """
+    Registra una función como tipo de trabajo.
+
+        @tarea('email.confirmacion_pedido', por_minuto=60)
+        def confirmacion_pedido(pedido_id):
+            ...
+
+    La función recibe el payload como kwargs. Si lanza una excepción el
+    trabajo se reintenta con backoff.
+    """
+    def decorador(funcion):
+        _TAREAS[tipo] = TipoTrabajo(tipo, funcion, max_intentos, por_minuto)
+        return funcion
+    return decorador
+
+
+def tipos_registrados():
+    return dict(_TAREAS)
+
+
+def encolar(tipo, ejecutar_despues=None, **payload):
+    """
+    Agrega un trabajo a la cola. Se guarda en la transacción actual.
+
+    Con TRABAJOS_SINCRONOS=True (desarrollo sin worker) el trabajo se ejecuta
+    en el mismo proceso al confirmar la transacción.
+    """
+    tipo_trabajo = _TAREAS.get(tipo)
+    if tipo_trabajo is None:
+        raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+
+    trabajo = Trabajo.objects.create(
+        tipo=tipo,
+        payload=payload,
+        max_intentos=tipo_trabajo.max_intentos,
+        ejecutar_despues=ejecutar_despues or timezone.now(),
+    )
+
+    if getattr(settings, 'TRABAJOS_SINCRONOS', False) and ejecutar_despues is None:
+        transaction.on_commit(lambda: ejecutar_pendientes(ids=[trabajo.id]))
+
+    return trabajo
+
+
+def calcular_backoff(intentos):
+    """Segundos de espera antes del siguiente intento (exponencial + jitter)"""
+    espera = min(BACKOFF_BASE_SEGUNDOS * (2 ** max(intentos - 1, 0)), BACKOFF_MAXIMO_SEGUNDOS)
+    return espera + random.uniform(0, espera * 0.1)
+
+
+def _tipos_saturados(ahora):
+    """Tipos con límite por minuto que ya lo alcanzaron"""
+    limitados = {t.tipo: t.por_minuto for t in _TAREAS.values() if t.por_minuto}
+    if not limitados:
+        return {}, set()
+
+    recientes = dict(
+        Trabajo.objects.filter(
+            tipo__in=list(limitados),
+            iniciado_en__gte=ahora - timedelta(minutes=1)
+        )
+        .values_list('tipo')
+        .annotate(total=Count('id'))
+    )
+    cupos = {tipo: limite - recientes.get(tipo, 0) for tipo, limite in limitados.items()}
+    return cupos, {tipo for tipo, cupo in cupos.items() if cupo <= 0}
+
+
+def recuperar_abandonados():
+    """
+    Trabajos de workers que murieron a mitad de ejecución: vuelven a
+    'pendiente' si les quedan intentos y si no quedan 'fallido'.
+    Retorna (recuperados, fallidos).
+    """
+    ahora = timezone.now()
+    abandonados = Trabajo.objects.filter(estado='en_proceso', iniciado_en__lt=ahora - TIEMPO_MAXIMO_EJECUCION)
+
+    fallidos = abandonados.filter(intentos__gte=F('max_intentos')).update(
+        estado='fallido',
+        ultimo_error='Trabajo abandonado por el worker en su último intento',
+        finalizado_en=ahora,
+    )
+    recuperados = abandonados.filter(intentos__lt=F('max_intentos')).update(
+        estado='pendiente',
+        ultimo_error='Trabajo abandonado por el worker',
+    )
+    if fallidos:
+        logger.error(f"❌ {fallidos} trabajo(s) abandonados sin intentos restantes marcados como fallidos")
+    return recuperados, fallidos
+
+
+def reclamar_trabajos(limite, ids=None):
+    """
+    Toma hasta `limite` trabajos listos y los marca 'en_proceso'.
+    Varios workers pueden llamar esto a la vez: SKIP LOCKED evita que dos
+    procesos tomen el mismo trabajo.
+    """
+    ahora = timezone.now()
+    cupos, saturados = _tipos_saturados(ahora)
+
+    with transaction.atomic():
+        candidatos = Trabajo.objects.filter(estado='pendiente', ejecutar_despues__lte=ahora)
+        if ids is not None:
+            candidatos = candidatos.filter(pk__in=ids)
+        if saturados:
+            candidatos = candidatos.exclude(tipo__in=saturados)
+
+        # Se piden algunos extra por si el cupo por tipo recorta la lista
+        candidatos = list(
+            candidatos.select_for_update(skip_locked=True)
+            .order_by('ejecutar_despues', 'id')
+            .values_list('id', 'tipo')[:limite * 2]
+        )
+
+        elegidos = []
+        for trabajo_id, tipo in candidatos:
+            if tipo in cupos:
+                if cupos[tipo] <= 0:
+                    continue
+                cupos[tipo] -= 1
+            elegidos.append(trabajo_id)
+            if len(elegidos) >= limite:
+                break
+
+        if not elegidos:
+            return []
+
+        Trabajo.objects.filter(pk__in=elegidos).update(
+            estado='en_proceso',
+            intentos=F('intentos') + 1,
+            iniciado_en=ahora,
+        )
+
+    return list(Trabajo.objects.filter(pk__in=elegidos).order_by('ejecutar_despues', 'id'))
+
+
+def ejecutar_trabajo(trabajo):
+    """Ejecuta un trabajo ya reclamado y registra el resultado. Retorna True si terminó bien."""
+    tipo_trabajo = _TAREAS.get(trabajo.tipo)
+
+    try:
+        if tipo_trabajo is None:
+            raise ValueError(f"Tipo de trabajo no registrado: {trabajo.tipo}")
+        tipo_trabajo.funcion(**trabajo.payload)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+
+        if trabajo.intentos >= trabajo.max_intentos:
+            Trabajo.objects.filter(pk=trabajo.pk).update(
+                estado='fallido',
+                ultimo_error=error,
+                finalizado_en=timezone.now(),
+            )
+            logger.error(f"❌ Trabajo #{trabajo.id} ({trabajo.tipo}) falló definitivamente: {e}")
+        else:
+            espera = calcular_backoff(trabajo.intentos)
+            Trabajo.objects.filter(pk=trabajo.pk).update(
+                estado='pendiente',
+                ultimo_error=error,
+                ejecutar_despues=timezone.now() + timedelta(seconds=espera),
+            )
+            logger.warning(
+                f"⚠️ Trabajo #{trabajo.id} ({trabajo.tipo}) falló "
+                f"(intento {trabajo.intentos}/{trabajo.max_intentos}), reintento en {espera:.0f}s: {e}"
+            )
+        return False
+
+    Trabajo.objects.filter(pk=trabajo.pk).update(
+        estado='completado',
+        ultimo_error='',
+        finalizado_en=timezone.now(),
+    )
+    logger.info(f"✅ Trabajo #{trabajo.id} ({trabajo.tipo}) completado")
+    return True
+
+
+def ejecutar_pendientes(limite=100, ids=None):
+    """
+    Ejecuta trabajos pendientes en el proceso actual (sin pool).
+    Útil en desarrollo, tests y con TRABAJOS_SINCRONOS=True.
+    Retorna el número de trabajos ejecutados.
+    """
+    trabajos = reclamar_trabajos(limite, ids=ids)
+    for trabajo in trabajos:
+        ejecutar_trabajo(trabajo)
+    return len(trabajos)
+
+
+def limpiar_completados(dias=7):
+    """Elimina trabajos completados con más de `dias` de antigüedad"""
+    eliminados, _ = Trabajo.objects.filter(
+        estado='completado',
+        finalizado_en__lt=timezone.now() - timedelta(days=dias)
+    ).delete()
+    return eliminados
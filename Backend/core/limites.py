@@ -0,0 +1,128 @@
+# Backend/core/limites.py
+# ⭐⭐⭐ Límites de intentos para login y recuperación de contraseña
+#
+# - Cada intento de login corre un hash PBKDF2 completo (cientos de ms de
+#   CPU): una ráfaga de logins malos puede ocupar todos los workers
+# - Los límites se revisan ANTES de autenticar, con dos llaves por endpoint:
+#     * por IP            → 'login_ip', 'recuperacion_ip'
+#     * por identificador → 'login_identificador', 'recuperacion_email'
+#       (usuario/email normalizado; un ataque distribuido a UNA cuenta
+#       también se frena)
+# - La IP sale de REMOTE_ADDR o, detrás de proxies, de X-Forwarded-For
+#   contando NUM_PROXIES desde la derecha (settings.REST_FRAMEWORK): las
+#   entradas que agrega el cliente no cambian la llave
+# - Los contadores viven en el cache compartido (core/cache.py): todos los
+#   workers ven los mismos intentos
+# - Bloqueo escalonado en ambas llaves: cada vez que una llave supera su
+#   límite queda bloqueada el doble que la vez anterior (1x, 2x, 4x... la
+#   ventana del límite). El historial se olvida tras
+#   MEMORIA_BLOQUEOS_SEGUNDOS sin bloqueos
+#     * IP: hasta BLOQUEO_MAXIMO_SEGUNDOS (1 hora)
+#     * identificador: hasta BLOQUEO_MAXIMO_IDENTIFICADOR_SEGUNDOS (15 min,
+#       o la ventana del límite si es mayor). Frena los intentos contra UNA
+#       cuenta desde IPs rotativas; el tope es menor porque cualquiera puede
+#       enviar intentos malos para una cuenta ajena y bloquearla
+#
+# Límites en settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+# Respuesta al superar el límite: 429 con cabecera Retry-After.
+
+import hashlib
+from rest_framework.throttling import SimpleRateThrottle
+
+BLOQUEO_MAXIMO_SEGUNDOS = 60 * 60
+BLOQUEO_MAXIMO_IDENTIFICADOR_SEGUNDOS = 15 * 60
+MEMORIA_BLOQUEOS_SEGUNDOS = 24 * 60 * 60
+
+
+class LimiteEscalonado(SimpleRateThrottle):
+    """SimpleRateThrottle (cache por defecto de Django) con bloqueo creciente para quien insiste"""
+
+    bloqueo_maximo = BLOQUEO_MAXIMO_SEGUNDOS
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.espera = None
+        bloqueado_hasta = self.cache.get(f'{self.key}:bloqueo')
+        if bloqueado_hasta and bloqueado_hasta > self.now:
+            self.espera = bloqueado_hasta - self.now
+            return False
+
+        if super().allow_request(request, view):
+            return True
+
+        self.espera = self._bloquear()
+        return False
+
+    def _bloquear(self):
+        clave_bloqueos = f'{self.key}:bloqueos'
+        try:
+            bloqueos = self.cache.incr(clave_bloqueos)
+        except ValueError:
+            self.cache.set(clave_bloqueos, 1, MEMORIA_BLOQUEOS_SEGUNDOS)
+            bloqueos = 1
+        else:
+            self.cache.touch(clave_bloqueos, MEMORIA_BLOQUEOS_SEGUNDOS)
+
+        # Nunca menos que la ventana: el bloqueo reemplaza lo que quedaba de ella
+        espera = min(self.duration * 2 ** (bloqueos - 1), max(self.bloqueo_maximo, self.duration))
+        self.cache.set(f'{self.key}:bloqueo', self.now + espera, espera)
+        self.cache.delete(self.key)  # Al terminar el bloqueo empieza una ventana nueva
+        return espera
+
+    def wait(self):
+        if self.espera is not None:
+            return self.espera
+        return super().wait()
+
+
+class LimitePorIP(LimiteEscalonado):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LimitePorIdentificador(LimiteEscalonado):
+    """Llave por el valor (normalizado) de uno de `campos` del body, con un tope de bloqueo menor"""
+
+    campos = ()
+    bloqueo_maximo = BLOQUEO_MAXIMO_IDENTIFICADOR_SEGUNDOS
+
+    def get_cache_key(self, request, view):
+        for campo in self.campos:
+            valor = request.data.get(campo)
+            if isinstance(valor, str) and valor.strip():
+                ident = hashlib.sha1(valor.strip().lower().encode()).hexdigest()
+                return self.cache_format % {'scope': self.scope, 'ident': ident}
+        return None
+
+
+# ============================================================================
+# LÍMITES POR ENDPOINT
+# ============================================================================
+
+class LoginPorIP(LimitePorIP):
+    scope = 'login_ip'
+
+
+class LoginPorIdentificador(LimitePorIdentificador):
+    scope = 'login_identificador'
+    campos = ('username', 'email')
+
+
+class RecuperacionPorIP(LimitePorIP):
+    scope = 'recuperacion_ip'
+
+
+class RecuperacionPorEmail(LimitePorIdentificador):
+    scope = 'recuperacion_email'
+    campos = ('email',)
+
+
+LIMITES_LOGIN = [LoginPorIP, LoginPorIdentificador]
+LIMITES_RECUPERACION = [RecuperacionPorIP, RecuperacionPorEmail]
@@ -0,0 +1,209 @@
+# Backend/core/management/commands/bench.py
+# ⭐ COMANDO DE BENCHMARK: catálogo (WSGI/ASGI/async, cache frío), checkout, cambios de estado y reportes (ver core/bench.py)
+
+import json
+import os
+import subprocess
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from core.bench import ESCENARIOS, Datos, ejecutar_escenario
+
+# Sin red: emails en memoria, archivos en memoria (sin Cloudinary) y la cola
+# de trabajos sin ejecutar (los emails quedan encolados, nadie los envía)
+AJUSTES_SIN_RED = {
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'SENDGRID_API_KEY': None,
+    'TRABAJOS_SINCRONOS': False,
+    'STORAGES': {
+        **settings.STORAGES,
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    },
+}
+
+
+def _cache_aislado():
+    """
+    Cache propio de la corrida: no lee ni borra las claves del servidor.
+    Con archivos usa un directorio temporal; con Redis, un prefijo único.
+    """
+    configuracion = {**settings.CACHES['default'], 'KEY_PREFIX': f'bench-{int(time.time())}'}
+    if configuracion['BACKEND'].endswith('FileBasedCache'):
+        configuracion['LOCATION'] = tempfile.mkdtemp(prefix='bench-cache-')
+    return {'default': configuracion}
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Mide rendimiento (req/s, latencia p50/p95/p99, consultas) de los endpoints principales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escenarios',
+            nargs='+',
+            choices=sorted(ESCENARIOS),
+            default=list(ESCENARIOS),
+            help='Escenarios a ejecutar (default: todos)',
+        )
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=200,
+            help='Peticiones medidas por escenario (default: 200)',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=8,
+            help='Hilos enviando peticiones a la vez (default: 8)',
+        )
+        parser.add_argument(
+            '--calentamiento',
+            type=int,
+            default=5,
+            help='Peticiones previas sin medir por escenario (default: 5)',
+        )
+        parser.add_argument(
+            '--productos',
+            type=int,
+            default=60,
+            help='Productos por sucursal en los datos de prueba (default: 60)',
+        )
+        parser.add_argument(
+            '--pedidos',
+            type=int,
+            default=300,
+            help='Pedidos existentes en los datos de prueba (default: 300)',
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo JSON de resultados (default: bench-<fecha>.json)',
+        )
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--peticiones y --concurrencia deben ser mayores que 0')
+
+        salida = options['salida'] or f"bench-{timezone.localtime():%Y%m%d-%H%M%S}.json"
+
+        # ⭐ Base de datos de prueba desechable: nunca se tocan los datos reales.
+        if connection.vendor == 'sqlite':
+            self.preparar_sqlite()
+
+        setup_test_environment()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=_cache_aislado(), **AJUSTES_SIN_RED):
+                resultados = self.ejecutar(options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'commit': _commit_actual(),
+            'base_de_datos': connection.vendor,
+            'parametros': {
+                clave: options[clave]
+                for clave in ('peticiones', 'concurrencia', 'calentamiento', 'productos', 'pedidos')
+            },
+            'escenarios': resultados,
+        }
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, ensure_ascii=False, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Resultados guardados en {salida}'))
+
+    def preparar_sqlite(self):
+        """
+        SQLite en memoria no se comparte bien entre hilos: se usa un archivo.
+        Las transacciones toman el candado de escritura al empezar (IMMEDIATE)
+        y esperan su turno en lugar de fallar con 'database is locked'.
+        """
+        ajustes = connection.settings_dict
+        if not ajustes['TEST'].get('NAME'):
+            ajustes['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.sqlite3')
+        ajustes['OPTIONS'] = {'timeout': 30, 'transaction_mode': 'IMMEDIATE', **ajustes['OPTIONS']}
+
+    def ejecutar(self, options):
+        self.stdout.write('📦 Creando datos de prueba...')
+        datos = Datos(
+            productos=options['productos'],
+            pedidos=options['pedidos'],
+            clientes=max(options['concurrencia'] * 2, 4),
+        )
+
+        resultados = {}
+        for nombre in options['escenarios']:
+            self.stdout.write(f'⏱️  {nombre}...')
+            resultado = ejecutar_escenario(
+                ESCENARIOS[nombre](datos),
+                peticiones=options['peticiones'],
+                concurrencia=options['concurrencia'],
+                calentamiento=options['calentamiento'],
+            )
+            resultados[nombre] = resultado
+            self.imprimir(nombre, resultado)
+        return resultados
+
+    def imprimir(self, nombre, resultado):
+        latencia = resultado['latencia_ms'] or {}
+        consultas = resultado['consultas'] or {}
+        linea = (
+            f"   {nombre} ({resultado['servidor']}): {resultado['peticiones_por_segundo']} req/s | "
+            f"p50 {latencia.get('p50')} ms, p95 {latencia.get('p95')} ms, p99 {latencia.get('p99')} ms | "
+            + (f"consultas p50 {consultas.get('p50')}, max {consultas.get('max')} | " if consultas else '')
+            + f"estados {resultado['estados']}"
+        )
+        if resultado['errores'] or resultado.get('sobreventa'):
+            self.stdout.write(self.style.ERROR(linea + ' ❌'))
+        else:
+            self.stdout.write(linea)
+
+
+# ============================================================================
+# INSTRUCCIONES DE USO:
+# ============================================================================
+"""
+1. TODOS LOS ESCENARIOS (8 hilos, 200 peticiones cada uno):
+   python manage.py bench
+
+2. SOLO ALGUNOS, CON MÁS CARGA:
+   python manage.py bench --escenarios catalogo checkout --peticiones 1000 --concurrencia 16
+
+3. CATÁLOGO SYNC VS ASYNC (mismos clientes concurrentes):
+   python manage.py bench --escenarios catalogo catalogo_asgi catalogo_async --concurrencia 32
+   - catalogo:       vista sync de DRF, hilos (como gunicorn)
+   - catalogo_asgi:  la misma vista bajo ASGI (como uvicorn)
+   - catalogo_async: core/views_async.py bajo ASGI
+   En proceso, con el cache en archivos, casi todo es CPU: la ventaja de
+   async aparece cuando Redis y la base de datos tienen latencia de red.
+
+4. CACHE FRÍO VS CALIENTE:
+   python manage.py bench --escenarios catalogo catalogo_frio reportes reportes_frio
+   Los escenarios *_frio suben la versión del cache antes de cada petición:
+   miden la consulta y la serialización completas, no solo el acierto.
+
+5. COMPARAR CORRIDAS:
+   python manage.py bench --salida antes.json
+   (aplicar cambios)
+   python manage.py bench --salida despues.json
+
+Se crea una base de datos de prueba (como `manage.py test`) y se destruye
+al terminar. Emails, Cloudinary y la cola de trabajos no salen a la red, y
+el cache es propio de la corrida (no toca las claves del servidor).
+⚠️ Con SQLite las escrituras concurrentes se serializan: las cifras de
+checkout y cambiar_estado solo son representativas sobre PostgreSQL.
+"""
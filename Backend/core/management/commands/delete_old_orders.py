@@ -1,10 +1,13 @@
 # Backend/core/management/commands/delete_old_orders.py
-# ⭐ COMANDO PARA AUTO-ELIMINAR PEDIDOS DESPUÉS DE 48H
+# ⭐ COMANDO PARA AUTO-ELIMINAR PEDIDOS DESPUÉS DE 48H (purga por lotes, ver core/purga.py)
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Coalesce
+from core.archivo import archivo_configurado
+from core.purga import HORAS_PARA_ELIMINAR, TAMANO_LOTE, archivar_por_defecto, pedidos_purgables, purgar_pedidos
+
+MUESTRA_DRY_RUN = 20
 
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from core.models import Pedido
 
 class Command(BaseCommand):
     help = 'Elimina automáticamente pedidos entregados/cancelados con más de 48 horas'
@@ -15,77 +18,102 @@ class Command(BaseCommand):
             action='store_true',
             help='Muestra qué pedidos se eliminarían sin eliminarlos realmente',
         )
+        parser.add_argument(
+            '--noinput', '--no-input',
+            action='store_false',
+            dest='interactive',
+            help='No pide confirmación (para cron)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Pedidos eliminados por transacción (default: {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--max-runtime',
+            type=float,
+            help='Segundos máximos de ejecución; lo pendiente queda para la próxima vez',
+        )
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=HORAS_PARA_ELIMINAR,
+            help=f'Antigüedad mínima desde que se completó el pedido (default: {HORAS_PARA_ELIMINAR})',
+        )
+        parser.add_argument(
+            '--sin-archivo',
+            action='store_true',
+            help='Elimina sin copiar los pedidos al archivo frío (core/archivo.py)',
+        )
 
     def handle(self, *args, **options):
-        dry_run = options['dry_run']
-        
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que 0')
+        horas = options['horas']
+        archivar = archivar_por_defecto() and not options['sin_archivo']
+        if archivar and not archivo_configurado():
+            raise CommandError(
+                'ARCHIVAR_PEDIDOS está activo pero ARCHIVO_PEDIDOS_DIR no está configurado. '
+                'Apúntelo a un volumen persistente (compartido con el servicio web) '
+                'o use --sin-archivo para eliminar sin copia'
+            )
+
         print("\n" + "="*60)
         print("🗑️  AUTO-DELETE DE PEDIDOS ANTIGUOS")
         print("="*60)
-        
-        # Obtener pedidos completados/cancelados
-        pedidos_completados = Pedido.objects.filter(
-            estado__in=['entregado', 'cancelado']
-        )
-        
-        pedidos_a_eliminar = []
-        ahora = timezone.now()
-        
-        for pedido in pedidos_completados:
-            # Usar fecha_completado o fecha como fallback
-            fecha_referencia = pedido.fecha_completado or pedido.fecha
-            tiempo_transcurrido = ahora - fecha_referencia
-            
-            # Si han pasado más de 48 horas
-            if tiempo_transcurrido >= timedelta(hours=48):
-                pedidos_a_eliminar.append({
-                    'id': pedido.id,
-                    'estado': pedido.estado,
-                    'fecha': fecha_referencia,
-                    'horas': int(tiempo_transcurrido.total_seconds() // 3600),
-                    'pedido': pedido
-                })
-        
-        if not pedidos_a_eliminar:
+
+        elegibles = pedidos_purgables(horas)
+        total = elegibles.count()
+
+        if not total:
             print("✅ No hay pedidos que eliminar")
             print("="*60 + "\n")
             return
-        
-        print(f"📋 Encontrados: {len(pedidos_a_eliminar)} pedidos")
-        print()
-        
-        for item in pedidos_a_eliminar:
-            print(f"  🗑️  Pedido #{item['id']}")
-            print(f"      Estado: {item['estado']}")
-            print(f"      Completado: {item['fecha'].strftime('%Y-%m-%d %H:%M')}")
-            print(f"      Antigüedad: {item['horas']}h")
+
+        print(f"📋 Encontrados: {total} pedidos con más de {horas}h")
+        print(f"🗄️  Archivo frío: {'sí' if archivar else 'NO (se pierden al eliminar)'}")
+
+        if options['dry_run']:
+            muestra = (
+                elegibles
+                .annotate(fecha_ref=Coalesce('fecha_completado', 'fecha'))
+                .order_by('fecha_ref')
+                .values_list('id', 'estado', 'fecha_ref')[:MUESTRA_DRY_RUN]
+            )
+            print()
+            for pedido_id, estado, fecha in muestra:
+                print(f"  🗑️  Pedido #{pedido_id} ({estado}) - completado {fecha.strftime('%Y-%m-%d %H:%M')}")
+            if total > MUESTRA_DRY_RUN:
+                print(f"  ... y {total - MUESTRA_DRY_RUN} más")
             print()
-        
-        if dry_run:
             print("⚠️  DRY RUN - No se eliminó nada")
             print("="*60 + "\n")
             return
-        
+
         # Confirmar antes de eliminar (solo en modo interactivo)
-        if options.get('interactive', True):
-            confirmacion = input(f"¿Eliminar {len(pedidos_a_eliminar)} pedidos? (s/n): ")
+        if options['interactive']:
+            confirmacion = input(f"¿Eliminar {total} pedidos? (s/n): ")
             if confirmacion.lower() != 's':
                 print("❌ Operación cancelada")
                 print("="*60 + "\n")
                 return
-        
-        # Eliminar pedidos
-        eliminados = 0
-        for item in pedidos_a_eliminar:
-            try:
-                item['pedido'].delete()
-                eliminados += 1
-                print(f"✅ Eliminado: Pedido #{item['id']}")
-            except Exception as e:
-                print(f"❌ Error eliminando Pedido #{item['id']}: {e}")
-        
+
+        def progreso(lotes, eliminados):
+            print(f"  ✅ Lote {lotes}: {eliminados} eliminados")
+
+        resultado = purgar_pedidos(
+            horas=horas,
+            tamano_lote=options['batch_size'],
+            max_segundos=options['max_runtime'],
+            al_terminar_lote=progreso,
+            archivar=archivar,
+        )
+
         print()
-        print(f"✅ Total eliminados: {eliminados}/{len(pedidos_a_eliminar)}")
+        print(f"✅ Total eliminados: {resultado['eliminados']} en {resultado['lotes']} lote(s), {resultado['segundos']}s")
+        if not resultado['completo']:
+            print(f"⏱️  Se alcanzó --max-runtime: quedan pedidos para la próxima ejecución")
         print("="*60 + "\n")
 
 
@@ -102,18 +130,31 @@ class Command(BaseCommand):
 3. MODO AUTOMATICO (sin confirmación, para cron):
    python manage.py delete_old_orders --noinput
 
-4. CONFIGURAR CRON JOB (en Railway/Render):
+4. LOTES Y TIEMPO MÁXIMO (tablas grandes):
+   python manage.py delete_old_orders --noinput --batch-size 1000 --max-runtime 120
+   Cada lote es una transacción corta; si se acaba el tiempo, lo pendiente
+   se elimina en la siguiente ejecución.
+
+5. ARCHIVO FRÍO:
+   Por defecto cada lote se copia a ARCHIVO_PEDIDOS_DIR/pedidos-YYYY-MM.ndjson.gz
+   antes de eliminarse (consultas en GET /api/reportes/archivo/).
+   ARCHIVO_PEDIDOS_DIR es obligatorio y debe ser un volumen persistente que
+   también vea el servicio web (en Railway: un Volume montado, ej. /data/archivo);
+   sin él el comando no elimina nada.
+   python manage.py delete_old_orders --noinput --sin-archivo   # sin copia
+
+6. CONFIGURAR CRON JOB (en Railway/Render):
    - Ejecutar cada 6 horas:
-     0 */6 * * * cd /app && python manage.py delete_old_orders --noinput
+     0 */6 * * * cd /app && python manage.py delete_old_orders --noinput --max-runtime 300
 
-5. CONFIGURAR EN CELERY (alternativa):
+7. CONFIGURAR EN CELERY (alternativa):
    # En celery.py
    from celery.schedules import crontab
-   
+
    app.conf.beat_schedule = {
        'delete-old-orders': {
            'task': 'core.tasks.delete_old_orders',
            'schedule': crontab(hour='*/6'),  # Cada 6 horas
        },
    }
-"""
\ No newline at end of file
+"""
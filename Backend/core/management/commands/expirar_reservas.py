@@ -0,0 +1,54 @@
+# Backend/core/management/commands/expirar_reservas.py
+# ⭐ COMANDO PARA EXPIRAR RESERVAS DE STOCK VENCIDAS
+
+import time
+from django.core.management.base import BaseCommand
+from core.reservas import expirar_reservas
+
+
+class Command(BaseCommand):
+    help = 'Expira en bloque las reservas de stock vencidas y devuelve las unidades a los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Cantidad de reservas procesadas por transacción (default: 1000)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Si es > 0, se queda corriendo y expira reservas cada N segundos (modo worker)',
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        intervalo = options['intervalo']
+
+        while True:
+            expiradas = expirar_reservas(lote=lote)
+            if expiradas:
+                self.stdout.write(self.style.SUCCESS(f'⏰ Reservas expiradas: {expiradas}'))
+            elif not intervalo:
+                self.stdout.write('✅ No hay reservas vencidas')
+
+            if not intervalo:
+                return
+            time.sleep(intervalo)
+
+
+# ============================================================================
+# INSTRUCCIONES DE USO:
+# ============================================================================
+"""
+1. EJECUCIÓN ÚNICA (cron cada minuto):
+   * * * * * cd /app && python manage.py expirar_reservas
+
+2. MODO WORKER (proceso dedicado):
+   python manage.py expirar_reservas --intervalo 30
+
+Además, cada nueva reserva expira primero las reservas vencidas de su
+producto, por lo que el stock nunca queda retenido indefinidamente.
+"""
@@ -0,0 +1,78 @@
+# Backend/core/management/commands/rebuild_rollups.py
+# ⭐ COMANDO PARA RECONSTRUIR EL ACUMULADO DE VENTAS DIARIAS
+
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.purga import HORAS_PARA_ELIMINAR
+from core.rollups import reconstruir
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato YYYY-MM-DD)')
+
+
+def dia_mas_antiguo_seguro():
+    """Primer día cuyos pedidos entregados no pudo haber eliminado la purga"""
+    return timezone.localdate(timezone.now() - timedelta(hours=HORAS_PARA_ELIMINAR))
+
+
+class Command(BaseCommand):
+    help = 'Recalcula VentaDiaria y ResumenDiario de un rango a partir de los pedidos entregados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=_fecha,
+            required=True,
+            help='Primer día a reconstruir, inclusive (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=_fecha,
+            required=True,
+            help='Último día a reconstruir, inclusive (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Permite días anteriores a la purga (se pierden las ventas de pedidos ya eliminados)',
+        )
+
+    def handle(self, *args, **options):
+        desde = options['desde']
+        hasta = options['hasta']
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        seguro = dia_mas_antiguo_seguro()
+        if desde < seguro and not options['forzar']:
+            raise CommandError(
+                f'El rango empieza antes del {seguro}: la purga ya pudo eliminar pedidos de esos días '
+                f'y sus ventas se perderían del acumulado. Use --forzar si es intencional'
+            )
+
+        creadas = reconstruir(desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f'📈 VentaDiaria reconstruida ({desde} → {hasta}): {creadas} fila(s)'))
+
+
+# ============================================================================
+# INSTRUCCIONES DE USO:
+# ============================================================================
+"""
+1. RECONSTRUIR UN RANGO (después de corregir pedidos con SQL directo):
+   python manage.py rebuild_rollups --desde 2025-11-28 --hasta 2025-11-30
+
+2. DÍAS ANTERIORES A LA PURGA (48h):
+   python manage.py rebuild_rollups --desde 2025-11-01 --hasta 2025-11-30 --forzar
+   ⚠️ Los días reconstruidos pierden las ventas de pedidos ya eliminados:
+   solo usarlo si esos días no tuvieron purga (ej. datos recién cargados).
+
+El acumulado se mantiene solo (signals y acciones del admin); este comando
+es para corregirlo si se modificaron pedidos con SQL directo. Siempre exige
+un rango: reconstruir "todo" desde la tabla Pedido borraría el historial
+de los pedidos purgados.
+"""
@@ -0,0 +1,122 @@
+# Backend/core/management/commands/run_workers.py
+# ⭐ WORKER DE LA COLA DE TRABAJOS (emails y alertas, ver core/jobs.py)
+
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en cola (emails, alertas) con un pool de hilos de tamaño fijo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=4,
+            help='Número máximo de trabajos ejecutándose a la vez (default: 4)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando no hay trabajos pendientes (default: 2)',
+        )
+        parser.add_argument(
+            '--retener-dias',
+            type=int,
+            default=7,
+            help='Días que se conservan los trabajos completados (default: 7)',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos listos y termina (útil para cron o pruebas)',
+        )
+
+    def handle(self, *args, **options):
+        concurrencia = max(options['concurrencia'], 1)
+        intervalo = options['intervalo']
+        self.detener = False
+
+        def solicitar_detencion(signum, frame):
+            self.stdout.write('🛑 Señal recibida: terminando trabajos en curso...')
+            self.detener = True
+
+        signal.signal(signal.SIGTERM, solicitar_detencion)
+        signal.signal(signal.SIGINT, solicitar_detencion)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'🚀 Worker iniciado (concurrencia={concurrencia}, '
+            f'tipos={", ".join(sorted(jobs.tipos_registrados()))})'
+        ))
+
+        en_curso = set()
+        ultima_recuperacion = ultima_limpieza = 0
+
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            while not self.detener:
+                # Abandonados: seguido, para que no esperen hasta la limpieza
+                if time.monotonic() - ultima_recuperacion > jobs.INTERVALO_RECUPERACION_SEGUNDOS:
+                    recuperados, fallidos = jobs.recuperar_abandonados()
+                    if recuperados or fallidos:
+                        self.stdout.write(f'♻️ Abandonados: {recuperados} reintentados, {fallidos} fallidos')
+                    ultima_recuperacion = time.monotonic()
+
+                if time.monotonic() - ultima_limpieza > 3600:
+                    eliminados = jobs.limpiar_completados(options['retener_dias'])
+                    if eliminados:
+                        self.stdout.write(f'🧹 Completados eliminados: {eliminados}')
+                    ultima_limpieza = time.monotonic()
+
+                # Solo se reclama lo que el pool puede ejecutar ahora mismo
+                libres = concurrencia - len(en_curso)
+                trabajos = jobs.reclamar_trabajos(libres) if libres else []
+
+                for trabajo in trabajos:
+                    en_curso.add(pool.submit(self.ejecutar, trabajo))
+
+                if options['una_vez'] and not trabajos and not en_curso:
+                    break
+
+                if en_curso:
+                    terminados, _ = wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+                    en_curso -= terminados
+                elif not trabajos:
+                    time.sleep(intervalo)
+
+            wait(en_curso)
+
+        self.stdout.write(self.style.SUCCESS('✅ Worker detenido'))
+
+    def ejecutar(self, trabajo):
+        """Corre en un hilo del pool; cada hilo usa su propia conexión a la BD"""
+        close_old_connections()
+        try:
+            return jobs.ejecutar_trabajo(trabajo)
+        finally:
+            close_old_connections()
+
+
+# ============================================================================
+# INSTRUCCIONES DE USO:
+# ============================================================================
+"""
+1. PROCESO DEDICADO (Railway / Procfile):
+   worker: python manage.py run_workers --concurrencia 4
+
+2. EJECUCIÓN ÚNICA (cron o pruebas):
+   python manage.py run_workers --una-vez
+
+3. DESARROLLO SIN WORKER:
+   TRABAJOS_SINCRONOS=True en .env ejecuta cada trabajo al confirmar la
+   transacción, en el mismo proceso web.
+
+Los trabajos fallidos se reintentan con backoff exponencial (30s, 1m, 2m...)
+hasta max_intentos; luego quedan en estado 'fallido' visibles en el admin.
+Cada minuto se revisan los trabajos 'en_proceso' de workers que murieron
+(más de 10 minutos): vuelven a la cola o, sin intentos restantes, fallan.
+"""
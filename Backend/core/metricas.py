@@ -0,0 +1,322 @@
+# Backend/core/metricas.py
+# ⭐⭐⭐ Métricas por petición: consultas SQL, tiempos y tamaño de respuesta
+#
+# MetricasMiddleware mide cada petición y:
+# - Agrega el header Server-Timing (visible en la pestaña Network del navegador):
+#     sql;dur=12.3;desc="8 consultas", vista;dur=4.1, render;dur=1.2, total;dur=18.0
+#   * sql: tiempo dentro de la base de datos
+#   * vista: tiempo de Python en la vista sin SQL (serializers incluidos)
+#   * render: conversión de la respuesta a JSON/HTML
+#   Según METRICAS_SERVER_TIMING: 'todos' (default con DEBUG), 'admins'
+#   (solo staff y administrador general) o 'nadie' (default en producción).
+#   El header expone detalles internos y tiempos: no se envía a anónimos
+#   en producción
+# - Detecta N+1: la misma sentencia SQL (mismo texto, distintos parámetros)
+#   ejecutada METRICAS_UMBRAL_N1 veces o más en una sola petición
+# - Guarda las últimas METRICAS_VENTANA muestras por ruta para calcular
+#   percentiles (GET /api/metrics/, solo administrador general)
+# - Las rutas son nombres de vista, no paths: todos los 404 van a
+#   '<MÉTODO> <sin ruta>' y, pasadas METRICAS_MAX_RUTAS rutas distintas, las
+#   nuevas se juntan en '<otras rutas>' (un escáner de URLs no hace crecer
+#   la memoria)
+#
+# Funciona igual bajo WSGI y ASGI: con ASGI el middleware es async para no
+# obligar a cada petición a pasar por un hilo (core/views_async.py).
+# Las conexiones de Django son por hilo y bajo ASGI las consultas corren en
+# los hilos de sync_to_async, no en el del event loop: por eso cada conexión
+# lleva un medidor fijo (instalado al conectarse) que cuenta la consulta en
+# la Medicion de la petición actual, guardada en un contextvar (asgiref lo
+# copia a esos hilos).
+#
+# ⚠️ Las muestras viven en la memoria de cada proceso: con varios workers de
+# uvicorn cada uno reporta sus propias peticiones.
+
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def metricas_activas():
+    return getattr(settings, 'METRICAS_ACTIVAS', True)
+
+
+def umbral_n1():
+    return getattr(settings, 'METRICAS_UMBRAL_N1', 5)
+
+
+def max_rutas():
+    return getattr(settings, 'METRICAS_MAX_RUTAS', 200)
+
+
+SIN_RUTA = '<sin ruta>'
+OTRAS_RUTAS = '<otras rutas>'
+
+
+def mostrar_server_timing(request):
+    """¿La respuesta lleva Server-Timing? (ver METRICAS_SERVER_TIMING)"""
+    modo = getattr(settings, 'METRICAS_SERVER_TIMING', 'nadie')
+    if modo == 'todos':
+        return True
+    if modo != 'admins':
+        return False
+    # DRF deja en la petición de Django el usuario autenticado por JWT
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return False
+    return usuario.is_staff or getattr(usuario, 'rol', None) == 'administrador_general'
+
+
+# ============================================================================
+# MEDICIÓN DE UNA PETICIÓN
+# ============================================================================
+
+class Medicion:
+    """Acumula las consultas y tiempos de una petición"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.inicio_vista = None
+        self.fin_vista = None
+        self.consultas = 0
+        self.sql_ms = 0.0
+        self.sql_vista_ms = 0.0
+        self.sentencias = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: se ejecuta alrededor de cada consulta"""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.sql_ms += duracion
+            if self.inicio_vista is not None and self.fin_vista is None:
+                self.sql_vista_ms += duracion
+            self.sentencias[sql] += 1
+
+    def repetidas(self):
+        """Sentencias que superan el umbral de N+1: {sql: veces}"""
+        umbral = umbral_n1()
+        return {sql: veces for sql, veces in self.sentencias.items() if veces >= umbral}
+
+
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper fijo de cada conexión: mide solo dentro de una petición"""
+    medicion = medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    return medicion(execute, sql, params, many, context)
+
+
+def instalar_medidor(conexion):
+    # Al inicio de la lista: execute_wrapper() de Django quita el último al salir
+    if medir_consulta not in conexion.execute_wrappers:
+        conexion.execute_wrappers.insert(0, medir_consulta)
+
+
+@receiver(connection_created)
+def medir_conexion_nueva(sender, connection, **kwargs):
+    """Cada conexión (de cualquier hilo) queda con el medidor al abrirse"""
+    instalar_medidor(connection)
+
+
+# ============================================================================
+# COLECTOR (percentiles por ruta)
+# ============================================================================
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not valores:
+        return None
+    indice = max(math.ceil(p / 100 * len(valores)) - 1, 0)
+    return valores[indice]
+
+
+class Colector:
+    CAMPOS = ('total_ms', 'sql_ms', 'vista_ms', 'render_ms', 'consultas', 'bytes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._muestras = defaultdict(self._nueva_ventana)
+        self._n1 = Counter()
+        self._ultimo_n1 = {}
+
+    @staticmethod
+    def _nueva_ventana():
+        return deque(maxlen=getattr(settings, 'METRICAS_VENTANA', 500))
+
+    def registrar(self, ruta, muestra, repetidas):
+        with self._lock:
+            if ruta not in self._muestras and len(self._muestras) >= max_rutas():
+                ruta = OTRAS_RUTAS
+            self._muestras[ruta].append(muestra)
+            if repetidas:
+                self._n1[ruta] += 1
+                # Se guarda la sentencia más repetida para poder encontrarla
+                sql, veces = max(repetidas.items(), key=lambda item: item[1])
+                self._ultimo_n1[ruta] = {'sql': sql[:500], 'veces': veces}
+
+    def resumen(self):
+        with self._lock:
+            copia = {ruta: list(muestras) for ruta, muestras in self._muestras.items()}
+            n1 = dict(self._n1)
+            ultimo_n1 = dict(self._ultimo_n1)
+
+        rutas = {}
+        for ruta, muestras in sorted(copia.items()):
+            datos = {'peticiones': len(muestras), 'peticiones_n1': n1.get(ruta, 0)}
+            for campo in self.CAMPOS:
+                valores = sorted(m[campo] for m in muestras if m[campo] is not None)
+                datos[campo] = {
+                    'p50': percentil(valores, 50),
+                    'p95': percentil(valores, 95),
+                    'p99': percentil(valores, 99),
+                    'max': valores[-1] if valores else None,
+                }
+            if ruta in ultimo_n1:
+                datos['ultimo_n1'] = ultimo_n1[ruta]
+            rutas[ruta] = datos
+        return rutas
+
+    def reiniciar(self):
+        with self._lock:
+            self._muestras.clear()
+            self._n1.clear()
+            self._ultimo_n1.clear()
+
+
+colector = Colector()
+
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+def nombre_ruta(request):
+    """'GET pedido-list' / 'POST reportes_estadisticas'; sin ruta resuelta (404), 'GET <sin ruta>'"""
+    match = getattr(request, 'resolver_match', None)
+    nombre = match.view_name if match and match.view_name else SIN_RUTA
+    return f'{request.method} {nombre}'
+
+
+class MetricasMiddleware:
+    """Mide consultas SQL, tiempos y tamaño de cada respuesta"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+            # Django ejecutaría los hooks sync en un hilo aparte: se usan los async
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        if not metricas_activas():
+            return self.get_response(request)
+
+        medicion = Medicion()
+        request._medicion = medicion
+        # Conexiones de este hilo abiertas antes de cargar el middleware
+        for conexion in connections.all():
+            instalar_medidor(conexion)
+        token = medicion_actual.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            medicion_actual.reset(token)
+
+        self.registrar(request, response, medicion)
+        return response
+
+    async def __acall__(self, request):
+        if not metricas_activas():
+            return await self.get_response(request)
+
+        medicion = Medicion()
+        request._medicion = medicion
+        token = medicion_actual.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            medicion_actual.reset(token)
+
+        self.registrar(request, response, medicion)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = getattr(request, '_medicion', None)
+        if medicion:
+            medicion.inicio_vista = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Se llama justo antes de render(): aquí termina la vista
+        medicion = getattr(request, '_medicion', None)
+        if medicion:
+            medicion.fin_vista = time.perf_counter()
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return MetricasMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return MetricasMiddleware.process_template_response(self, request, response)
+
+    def registrar(self, request, response, medicion):
+        fin = time.perf_counter()
+        total_ms = (fin - medicion.inicio) * 1000
+        vista_ms = render_ms = None
+        if medicion.inicio_vista is not None:
+            fin_vista = medicion.fin_vista or fin
+            vista_ms = max((fin_vista - medicion.inicio_vista) * 1000 - medicion.sql_vista_ms, 0)
+            if medicion.fin_vista is not None:
+                render_ms = (fin - medicion.fin_vista) * 1000
+
+        tamano = None if response.streaming else len(response.content)
+        repetidas = medicion.repetidas()
+        ruta = nombre_ruta(request)
+
+        colector.registrar(ruta, {
+            'total_ms': round(total_ms, 2),
+            'sql_ms': round(medicion.sql_ms, 2),
+            'vista_ms': round(vista_ms, 2) if vista_ms is not None else None,
+            'render_ms': round(render_ms, 2) if render_ms is not None else None,
+            'consultas': medicion.consultas,
+            'bytes': tamano,
+        }, repetidas)
+
+        if repetidas:
+            logger.warning(
+                f"⚠️ Posible N+1 en {ruta}: "
+                + "; ".join(f"{veces}x {sql[:120]}" for sql, veces in repetidas.items())
+            )
+        if not mostrar_server_timing(request):
+            return
+
+        partes = [f'sql;dur={medicion.sql_ms:.1f};desc="{medicion.consultas} consultas"']
+        if vista_ms is not None:
+            partes.append(f'vista;dur={vista_ms:.1f}')
+        if render_ms is not None:
+            partes.append(f'render;dur={render_ms:.1f}')
+        if repetidas:
+            partes.append(f'n1;desc="{len(repetidas)} sentencia(s) repetida(s)"')
+        partes.append(f'total;dur={total_ms:.1f}')
+        response['Server-Timing'] = ', '.join(partes)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_pedido_fecha_completado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada'), ('expirada', 'Expirada')], default='activa', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('expira_en', models.DateTimeField(help_text='Momento en que la reserva deja de ser válida')),
+                ('pedido', models.ForeignKey(blank=True, help_text='Pedido que confirmó esta reserva', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas', to='core.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='core.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'expira_en'], name='reserva_estado_expira_idx')],
+            },
+        ),
+    ]
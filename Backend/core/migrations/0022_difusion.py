@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_trabajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Difusion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('nuevo_producto', 'Nuevo producto'), ('oferta', 'Nueva oferta')], max_length=30)),
+                ('objeto_id', models.PositiveIntegerField(help_text='ID del producto u oferta anunciado')),
+                ('asunto', models.CharField(max_length=255)),
+                ('html', models.TextField()),
+                ('texto', models.TextField()),
+                ('estado', models.CharField(choices=[('encolando', 'Encolando lotes'), ('enviando', 'Enviando'), ('completada', 'Completada')], default='encolando', max_length=20)),
+                ('ultimo_usuario_id', models.PositiveIntegerField(default=0, help_text='Último usuario incluido en un lote encolado (cursor para retomar)')),
+                ('total_destinatarios', models.PositiveIntegerField(default=0)),
+                ('lotes_encolados', models.PositiveIntegerField(default=0)),
+                ('lotes_enviados', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_completada', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Difusión',
+                'verbose_name_plural': 'Difusiones',
+                'ordering': ['-fecha_creacion'],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='difusion_tipo_objeto_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_difusion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaStockPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('eventos', models.PositiveIntegerField(default=1, help_text='Cambios de stock acumulados en la ventana')),
+                ('primer_evento', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_evento', models.DateTimeField(auto_now=True)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerta_pendiente', to='core.producto')),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_stock_pendientes', to='core.sucursal')),
+            ],
+            options={
+                'verbose_name': 'Alerta de Stock Pendiente',
+                'verbose_name_plural': 'Alertas de Stock Pendientes',
+                'ordering': ['sucursal', 'primer_evento'],
+            },
+        ),
+    ]
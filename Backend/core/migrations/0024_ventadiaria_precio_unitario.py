@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def poblar_ventas_diarias(apps, schema_editor):
+    """
+    Copia el precio actual a las líneas existentes y construye el acumulado
+    VentaDiaria con los pedidos ya entregados
+    """
+    DetallePedido = apps.get_model('core', 'DetallePedido')
+    Producto = apps.get_model('core', 'Producto')
+    VentaDiaria = apps.get_model('core', 'VentaDiaria')
+
+    DetallePedido.objects.filter(precio_unitario__isnull=True).update(
+        precio_unitario=Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio')[:1])
+    )
+
+    filas = (
+        DetallePedido.objects.filter(pedido__estado='entregado')
+        .annotate(dia=TruncDate('pedido__fecha', tzinfo=timezone.get_current_timezone()))
+        .values('dia', 'producto__sucursal_id', 'producto_id')
+        .annotate(
+            unidades=Sum('cantidad'),
+            ingresos=Sum(ExpressionWrapper(
+                F('cantidad') * Coalesce('precio_unitario', 'producto__precio'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ))
+        )
+        .order_by()
+    )
+    creadas = VentaDiaria.objects.bulk_create(
+        [
+            VentaDiaria(
+                fecha=fila['dia'],
+                sucursal_id=fila['producto__sucursal_id'],
+                producto_id=fila['producto_id'],
+                unidades=fila['unidades'],
+                ingresos=fila['ingresos'] or 0,
+            )
+            for fila in filas
+        ],
+        batch_size=1000,
+    )
+    print(f"✅ VentaDiaria: {len(creadas)} fila(s) creadas")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_alertastockpendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallepedido',
+            name='precio_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día local del pedido')),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='core.producto')),
+                ('sucursal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to='core.sucursal')),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['sucursal', 'fecha'], name='venta_diaria_sucursal_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'sucursal', 'producto'), name='venta_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_ventas_diarias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:13
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_ventadiaria_precio_unitario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(models.F('estado'), django.db.models.functions.comparison.Coalesce('fecha_completado', 'fecha'), name='pedido_purga_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:40
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def poblar_nombres_y_resumenes(apps, schema_editor):
+    """
+    Guarda el nombre del producto en VentaDiaria y construye ResumenDiario
+    con los pedidos entregados que siguen en la base de datos
+    """
+    DetallePedido = apps.get_model('core', 'DetallePedido')
+    Pedido = apps.get_model('core', 'Pedido')
+    Producto = apps.get_model('core', 'Producto')
+    ResumenDiario = apps.get_model('core', 'ResumenDiario')
+    VentaDiaria = apps.get_model('core', 'VentaDiaria')
+
+    VentaDiaria.objects.filter(producto__isnull=False).update(
+        producto_nombre=Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('nombre')[:1])
+    )
+
+    pedidos = Pedido.objects.filter(estado='entregado')
+    sucursales = defaultdict(set)
+    lineas = DetallePedido.objects.filter(pedido__in=pedidos).values_list('pedido_id', 'producto__sucursal_id')
+    for pedido_id, sucursal_id in lineas.distinct().order_by():
+        if sucursal_id:
+            sucursales[pedido_id].add(sucursal_id)
+
+    grupos = defaultdict(lambda: [0, 0])
+    filas = (
+        pedidos.annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        .values_list('id', 'dia', 'total')
+        .order_by()
+    )
+    for pedido_id, dia, total in filas:
+        for sucursal_id in [None, *sucursales[pedido_id]]:
+            grupos[(dia, sucursal_id)][0] += 1
+            grupos[(dia, sucursal_id)][1] += total or 0
+
+    creadas = ResumenDiario.objects.bulk_create(
+        [
+            ResumenDiario(fecha=dia, sucursal_id=sucursal_id, pedidos=cantidad, total=total)
+            for (dia, sucursal_id), (cantidad, total) in grupos.items()
+        ],
+        batch_size=1000,
+    )
+    print(f"✅ ResumenDiario: {len(creadas)} fila(s) creadas")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_pedido_purga_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventadiaria',
+            name='producto_nombre',
+            field=models.CharField(blank=True, default='', help_text='Nombre al momento de la venta', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='ventadiaria',
+            name='producto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to='core.producto'),
+        ),
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día local del pedido')),
+                ('pedidos', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sucursal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='core.sucursal')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('sucursal__isnull', False)), fields=('fecha', 'sucursal'), name='resumen_diario_sucursal_unico'), models.UniqueConstraint(condition=models.Q(('sucursal__isnull', True)), fields=('fecha',), name='resumen_diario_total_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_nombres_y_resumenes, migrations.RunPython.noop),
+    ]
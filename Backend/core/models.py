@@ -2,10 +2,13 @@
 # ⭐ ACTUALIZADO: Agregado campo fecha_completado y lógica de auto-eliminación
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from cloudinary.models import CloudinaryField
 from django.utils import timezone
 from datetime import timedelta
+from .rastreo import RastreoCambiosMixin
 
 # ============================================================================
 # SUCURSAL
@@ -29,7 +32,10 @@ class Sucursal(models.Model):
 # ============================================================================
 # USUARIO
 # ============================================================================
-class Usuario(AbstractUser):
+class Usuario(RastreoCambiosMixin, AbstractUser):
+    # ⭐ Campos que cambian los conteos de admins del catálogo de sucursales
+    CAMPOS_RASTREADOS = ('rol', 'sucursal', 'is_active')
+
     ROLES = [
         ('cliente', 'Cliente'),
         ('administrador', 'Administrador'),
@@ -64,7 +70,10 @@ class Usuario(AbstractUser):
 # ============================================================================
 # PRODUCTO
 # ============================================================================
-class Producto(models.Model):
+class Producto(RastreoCambiosMixin, models.Model):
+    # ⭐ Campos cuyo valor anterior leen los signals (ver core/rastreo.py)
+    CAMPOS_RASTREADOS = ('stock',)
+    
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
@@ -191,7 +200,9 @@ class ProductoOferta(models.Model):
 # ============================================================================
 # PEDIDO (⭐ ACTUALIZADO CON FECHA_COMPLETADO Y AUTO-DELETE)
 # ============================================================================
-class Pedido(models.Model):
+class Pedido(RastreoCambiosMixin, models.Model):
+    CAMPOS_RASTREADOS = ('estado',)
+    
     ESTADOS = [
         ('recibido', 'Recibido'),
         ('en_preparacion', 'En preparación'),
@@ -200,6 +211,9 @@ class Pedido(models.Model):
         ('cancelado', 'Cancelado'),
     ]
     
+    # Estados que registran fecha_completado y cuentan para la auto-eliminación
+    ESTADOS_FINALES = ['entregado', 'cancelado']
+    
     TIPOS_ENTREGA = [
         ('domicilio', 'Entrega a Domicilio'),
         ('recoger', 'Recoger en Sucursal'),
@@ -234,6 +248,15 @@ class Pedido(models.Model):
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
         ordering = ['-fecha']
+        indexes = [
+            # ⭐ Purga de pedidos viejos (core/purga.py):
+            #    estado IN (...) AND COALESCE(fecha_completado, fecha) <= límite
+            models.Index(
+                F('estado'),
+                Coalesce('fecha_completado', 'fecha'),
+                name='pedido_purga_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Pedido {self.id} - {self.usuario.username} ({self.get_tipo_entrega_display()})"
@@ -286,9 +309,14 @@ class Pedido(models.Model):
     # ⭐⭐⭐ NUEVO: Método para actualizar fecha_completado automáticamente
     def save(self, *args, **kwargs):
         # Si el estado cambió a 'entregado' o 'cancelado' y no tiene fecha_completado
-        if self.estado in ['entregado', 'cancelado'] and not self.fecha_completado:
+        if self.estado in self.ESTADOS_FINALES and not self.fecha_completado:
             self.fecha_completado = timezone.now()
             print(f"✅ Pedido #{self.id} marcado como {self.estado} - Auto-delete en 48h")
+            
+            # ⭐ save(update_fields=['estado']) también debe guardar la fecha
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'fecha_completado'}
         
         super().save(*args, **kwargs)
     
@@ -325,6 +353,8 @@ class DetallePedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name="detalles")
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField()
+    # ⭐ Precio al momento de la compra (el precio del producto puede cambiar después)
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     class Meta:
         verbose_name = 'Detalle de Pedido'
@@ -334,10 +364,268 @@ class DetallePedido(models.Model):
         return f"{self.cantidad} x {self.producto.nombre} (Pedido {self.pedido.id})"
 
 
+# ============================================================================
+# RESERVA DE STOCK (apartado temporal del carrito)
+# ============================================================================
+class ReservaStock(models.Model):
+    """
+    Apartado temporal de unidades de un producto.
+    El stock se descuenta al reservar; si la reserva expira o se libera,
+    las unidades vuelven al producto. El checkout solo confirma la reserva.
+    """
+    ESTADOS = [
+        ('activa', 'Activa'),
+        ('confirmada', 'Confirmada'),
+        ('liberada', 'Liberada'),
+        ('expirada', 'Expirada'),
+    ]
+    
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='activa')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField(help_text='Momento en que la reserva deja de ser válida')
+    pedido = models.ForeignKey(
+        Pedido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservas',
+        help_text='Pedido que confirmó esta reserva'
+    )
+
+    class Meta:
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'expira_en'], name='reserva_estado_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reserva {self.id}: {self.cantidad}x {self.producto.nombre} ({self.estado})"
+    
+    @property
+    def esta_vigente(self):
+        return self.estado == 'activa' and self.expira_en > timezone.now()
+
+
+# ============================================================================
+# TRABAJO EN SEGUNDO PLANO (cola persistente, ver core/jobs.py)
+# ============================================================================
+class Trabajo(models.Model):
+    """
+    Tarea pendiente (emails, alertas) que ejecuta el comando run_workers.
+    Se crea dentro de la misma transacción que el evento que la origina,
+    por lo que nunca se pierde si el proceso web se reinicia.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    tipo = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField(
+        default=timezone.now,
+        help_text='No se ejecuta antes de este momento (reintentos con backoff)'
+    )
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Trabajo'
+        verbose_name_plural = 'Trabajos'
+        ordering = ['ejecutar_despues', 'id']
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='trabajo_estado_ejecutar_idx'),
+            models.Index(fields=['tipo', 'iniciado_en'], name='trabajo_tipo_iniciado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id}: {self.tipo} ({self.estado}, intento {self.intentos}/{self.max_intentos})"
+
+
+# ============================================================================
+# DIFUSIÓN (email masivo a clientes, ver core/difusiones.py)
+# ============================================================================
+class Difusion(models.Model):
+    """
+    Email masivo (nuevo producto, nueva oferta) ya renderizado una sola vez.
+    Los destinatarios se recorren por id ascendente y se encolan en lotes;
+    ultimo_usuario_id permite retomar el despacho si el proceso se corta.
+    """
+    TIPOS = [
+        ('nuevo_producto', 'Nuevo producto'),
+        ('oferta', 'Nueva oferta'),
+    ]
+    ESTADOS = [
+        ('encolando', 'Encolando lotes'),
+        ('enviando', 'Enviando'),
+        ('completada', 'Completada'),
+    ]
+    
+    tipo = models.CharField(max_length=30, choices=TIPOS)
+    objeto_id = models.PositiveIntegerField(help_text='ID del producto u oferta anunciado')
+    asunto = models.CharField(max_length=255)
+    html = models.TextField()
+    texto = models.TextField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='encolando')
+    ultimo_usuario_id = models.PositiveIntegerField(
+        default=0,
+        help_text='Último usuario incluido en un lote encolado (cursor para retomar)'
+    )
+    total_destinatarios = models.PositiveIntegerField(default=0)
+    lotes_encolados = models.PositiveIntegerField(default=0)
+    lotes_enviados = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_completada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Difusión'
+        verbose_name_plural = 'Difusiones'
+        ordering = ['-fecha_creacion']
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='difusion_tipo_objeto_unica'),
+        ]
+
+    def __str__(self):
+        return f"Difusión {self.id}: {self.asunto} ({self.lotes_enviados}/{self.lotes_encolados} lotes)"
+
+
+# ============================================================================
+# ALERTA DE STOCK PENDIENTE (resumen por sucursal, ver core/alertas.py)
+# ============================================================================
+class AlertaStockPendiente(models.Model):
+    """
+    Producto con stock bajo que todavía no se incluyó en un resumen.
+    Varias ventas del mismo producto dentro de la ventana se acumulan en la
+    misma fila; al enviar el resumen de la sucursal las filas se eliminan.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='alerta_pendiente')
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name='alertas_stock_pendientes')
+    eventos = models.PositiveIntegerField(default=1, help_text='Cambios de stock acumulados en la ventana')
+    primer_evento = models.DateTimeField(auto_now_add=True)
+    ultimo_evento = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Alerta de Stock Pendiente'
+        verbose_name_plural = 'Alertas de Stock Pendientes'
+        ordering = ['sucursal', 'primer_evento']
+
+    def __str__(self):
+        return f"Alerta pendiente: {self.producto.nombre} ({self.eventos} evento(s))"
+
+
+# ============================================================================
+# VENTA DIARIA (acumulado de ventas entregadas, ver core/rollups.py)
+# ============================================================================
+class VentaDiaria(models.Model):
+    """
+    Unidades e ingresos vendidos por día, sucursal y producto.
+    Se actualiza al pasar un pedido a 'entregado' (o al salir de ese estado),
+    así los reportes leen pocas filas en lugar de todo el historial.
+    Eliminar un pedido ya entregado NO resta: la venta se conserva.
+    Eliminar el producto tampoco: la fila queda con producto=NULL y el
+    nombre guardado en producto_nombre.
+    """
+    fecha = models.DateField(help_text='Día local del pedido')
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ventas_diarias'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ventas_diarias'
+    )
+    producto_nombre = models.CharField(max_length=200, blank=True, default='', help_text='Nombre al momento de la venta')
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venta Diaria'
+        verbose_name_plural = 'Ventas Diarias'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'sucursal', 'producto'], name='venta_diaria_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['sucursal', 'fecha'], name='venta_diaria_sucursal_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_nombre}: {self.unidades} unidades"
+
+
+# ============================================================================
+# RESUMEN DIARIO (pedidos entregados por día, ver core/rollups.py)
+# ============================================================================
+class ResumenDiario(models.Model):
+    """
+    Pedidos entregados y su total por día y sucursal.
+    sucursal=NULL es el resumen de todas las sucursales (un pedido con
+    productos de dos sucursales cuenta una vez en cada una y una vez en el
+    total). Como VentaDiaria, se conserva al eliminar los pedidos.
+    """
+    fecha = models.DateField(help_text='Día local del pedido')
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='resumenes_diarios'
+    )
+    pedidos = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Resumen Diario'
+        verbose_name_plural = 'Resúmenes Diarios'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'sucursal'], condition=models.Q(sucursal__isnull=False),
+                name='resumen_diario_sucursal_unico',
+            ),
+            models.UniqueConstraint(
+                fields=['fecha'], condition=models.Q(sucursal__isnull=True),
+                name='resumen_diario_total_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.sucursal or 'Todas'}: {self.pedidos} pedidos"
+
+
 # ============================================================================
 # CAMBIOS REALIZADOS:
 # ============================================================================
 # 1. Pedido: Agregado campo 'fecha_completado' (DateTime, nullable)
 # 2. Pedido: Agregada propiedad 'puede_eliminarse' (validación de eliminación)
 # 3. Pedido: Override del método save() para auto-registrar fecha_completado
-# 4. Pedido: Agregada propiedad 'tiempo_hasta_auto_delete' (info para UI)
\ No newline at end of file
+# 4. Pedido: Agregada propiedad 'tiempo_hasta_auto_delete' (info para UI)
+# 5. ReservaStock: apartado temporal de stock con expiración (core/reservas.py)
+# 6. Producto/Pedido: RastreoCambiosMixin guarda el valor anterior de stock/estado
+#    para que los signals no vuelvan a consultar la BD (core/rastreo.py)
+# 7. Trabajo: cola persistente de emails/alertas (core/jobs.py + run_workers)
+# 8. Difusion: emails masivos renderizados una vez y enviados por lotes (core/difusiones.py)
+# 9. AlertaStockPendiente: alertas de stock bajo agrupadas en un resumen por sucursal
+# 10. DetallePedido.precio_unitario + VentaDiaria: acumulado diario para reportes (core/rollups.py)
+# 11. Pedido: save(update_fields=...) también guarda fecha_completado + índice sobre
+#     (estado, COALESCE(fecha_completado, fecha)) para la purga por lotes (core/purga.py)
+# 12. VentaDiaria sobrevive a la eliminación del producto (producto_nombre) +
+#     ResumenDiario: pedidos entregados por día para los reportes (core/rollups.py)
@@ -0,0 +1,35 @@
+# Backend/core/paginacion.py
+# ⭐ Paginación por cursor (keyset) OPCIONAL para los listados grandes
+#
+# - Sin parámetros el listado responde igual que siempre (lista completa),
+#   así el frontend actual no cambia
+# - Con ?limite=N (o ?cursor=...) responde por páginas:
+#     { "next": url | null, "previous": url | null, "results": [...] }
+# - El cursor usa WHERE (fecha, id) < (...) en lugar de OFFSET: pedir la
+#   página 1000 cuesta lo mismo que pedir la primera
+
+from rest_framework.pagination import CursorPagination
+
+
+class CursorOpcional(CursorPagination):
+    """Cursor por id descendente; solo se activa si se pide"""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'limite'
+    max_page_size = 200
+
+    def solicitada(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.solicitada(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CursorPedidos(CursorOpcional):
+    """Pedidos: más recientes primero; el id desempata pedidos con la misma fecha"""
+    ordering = ('-fecha', '-id')
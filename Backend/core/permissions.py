@@ -21,6 +21,32 @@ class EsAdministrador(permissions.BasePermission):
         )
 
 
+class SoloAdministradores(permissions.BasePermission):
+    """
+    Acceso solo a administradores (regulares y generales), también para
+    lecturas: reportes de ventas y estado de los caches.
+    """
+
+    def has_permission(self, request, view):
+        return (
+            request.user.is_authenticated and 
+            request.user.rol in ['administrador', 'administrador_general']
+        )
+
+
+class EsAdministradorGeneral(permissions.BasePermission):
+    """
+    Permite escribir solo al administrador general (p. ej. sucursales).
+    Los demás solo pueden realizar operaciones de lectura (GET).
+    """
+
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        
+        return request.user.is_authenticated and request.user.rol == 'administrador_general'
+
+
 class EsClienteOAdmin(permissions.BasePermission):
     """
     Los clientes pueden ver y crear pedidos propios.
@@ -0,0 +1,128 @@
+# Backend/core/purga.py
+# ⭐⭐⭐ Purga por lotes de pedidos entregados/cancelados antiguos
+#
+# - Los pedidos elegibles salen de UN predicado indexado:
+#     estado IN ('entregado', 'cancelado') AND COALESCE(fecha_completado, fecha) <= límite
+#   (índice pedido_purga_idx), sin cargar pedidos en Python
+# - Se borra en lotes de tamaño fijo, cada uno en su propia transacción
+#   corta: detalles con un DELETE y pedidos con un DELETE (las reservas
+#   confirmadas se desvinculan con un UPDATE) → los bloqueos duran poco
+# - Dentro de cada lote los pedidos se vuelven a filtrar y se bloquean: solo
+#   se borran (y archivan) los que siguen siendo purgables
+# - El número de consultas por lote es constante: el tiempo total depende de
+#   cuántos pedidos se eliminan, no del tamaño de la tabla
+# - Los signals por pedido se omiten; el cache de reportes se invalida una
+#   vez por lote (las ventas en VentaDiaria se conservan)
+# - Con ARCHIVAR_PEDIDOS (default True) cada lote se copia al archivo frío
+#   comprimido (core/archivo.py) antes de borrarse, en la misma transacción.
+#   Si el archivo no tiene un ARCHIVO_PEDIDOS_DIR persistente, la purga no
+#   borra nada
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .archivo import ArchivoNoConfigurado, archivar_pedidos, archivo_configurado
+from .cache_reportes import invalidar_reportes
+from .models import DetallePedido, Pedido
+from .rastreo import skip_signals
+
+HORAS_PARA_ELIMINAR = 48
+TAMANO_LOTE = 500
+
+
+def pedidos_purgables(horas=HORAS_PARA_ELIMINAR, ahora=None):
+    """Pedidos entregados/cancelados cuya fecha de cierre (o creación) tiene más de `horas`"""
+    limite = (ahora or timezone.now()) - timedelta(hours=horas)
+    return (
+        Pedido.objects
+        .alias(fecha_referencia=Coalesce('fecha_completado', 'fecha'))
+        .filter(estado__in=Pedido.ESTADOS_FINALES, fecha_referencia__lte=limite)
+        .order_by()
+    )
+
+
+def archivar_por_defecto():
+    return getattr(settings, 'ARCHIVAR_PEDIDOS', True)
+
+
+def eliminar_lote(ids, archivar=True, horas=HORAS_PARA_ELIMINAR, ahora=None):
+    """
+    Elimina los pedidos `ids` y sus detalles en UNA transacción corta.
+    Dentro de la transacción se vuelven a filtrar con pedidos_purgables() y
+    se bloquean: un pedido que cambió de estado desde que se eligió el lote
+    (p. ej. un cancelado que se reabrió) no se archiva ni se elimina.
+    Con archivar=True primero se agregan al archivo frío: si el archivo
+    falla, no se borra nada.
+    """
+    with transaction.atomic(), skip_signals():
+        ids = list(
+            pedidos_purgables(horas, ahora).filter(id__in=ids)
+            .select_for_update().values_list('id', flat=True)
+        )
+        if not ids:
+            return 0
+        if archivar:
+            archivar_pedidos(ids)
+
+        sucursales = set(
+            DetallePedido.objects.filter(pedido_id__in=ids)
+            .values_list('producto__sucursal_id', flat=True).distinct()
+        )
+        DetallePedido.objects.filter(pedido_id__in=ids).delete()
+        # Las reservas confirmadas quedan con pedido=NULL (on_delete=SET_NULL)
+        _, por_modelo = Pedido.objects.filter(id__in=ids).delete()
+        invalidar_reportes(sucursales)
+    return por_modelo.get(Pedido._meta.label, 0)
+
+
+def purgar_pedidos(horas=HORAS_PARA_ELIMINAR, tamano_lote=TAMANO_LOTE, max_segundos=None, al_terminar_lote=None,
+                   archivar=None):
+    """
+    Elimina por lotes los pedidos purgables. Se detiene al acabarse los
+    pedidos o, si se indica, al superar `max_segundos` (el lote en curso
+    siempre termina). archivar=None usa settings.ARCHIVAR_PEDIDOS.
+    Con archivar=True y sin ARCHIVO_PEDIDOS_DIR lanza ArchivoNoConfigurado
+    antes de eliminar.
+
+    Retorna {'eliminados', 'lotes', 'segundos', 'completo'}; completo=False
+    si se cortó por tiempo y quedan pedidos para la próxima ejecución.
+    """
+    # El límite se fija al empezar: los pedidos que "vencen" durante la
+    # purga quedan para la siguiente ejecución
+    ahora = timezone.now()
+    if archivar is None:
+        archivar = archivar_por_defecto()
+    if archivar and not archivo_configurado():
+        raise ArchivoNoConfigurado(
+            'ARCHIVAR_PEDIDOS está activo pero ARCHIVO_PEDIDOS_DIR no está configurado: '
+            'los pedidos se borrarían sin una copia persistente'
+        )
+    inicio = time.monotonic()
+    eliminados = lotes = 0
+    completo = True
+
+    while True:
+        ids = list(pedidos_purgables(horas, ahora).values_list('id', flat=True)[:tamano_lote])
+        if not ids:
+            break
+
+        eliminados += eliminar_lote(ids, archivar=archivar, horas=horas, ahora=ahora)
+        lotes += 1
+        if al_terminar_lote:
+            al_terminar_lote(lotes, eliminados)
+
+        if len(ids) < tamano_lote:
+            break
+        if max_segundos is not None and time.monotonic() - inicio >= max_segundos:
+            completo = not pedidos_purgables(horas, ahora).exists()
+            break
+
+    return {
+        'eliminados': eliminados,
+        'lotes': lotes,
+        'segundos': round(time.monotonic() - inicio, 2),
+        'completo': completo,
+    }
@@ -0,0 +1,127 @@
+# Backend/core/rastreo.py
+# ⭐ Rastreo de cambios en campos de modelos + control de signals
+#
+# Antes cada signal pre_save hacía su propio Model.objects.get(pk=...) solo
+# para leer el valor anterior de un campo. Con RastreoCambiosMixin el modelo
+# guarda una foto (snapshot) de los campos rastreados al cargarse desde la BD
+# y la actualiza después de cada save(), sin consultas extra.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+_omitir_signals = ContextVar('omitir_signals', default=False)
+
+
+@contextmanager
+def skip_signals():
+    """
+    Desactiva los receivers marcados con @omitible dentro del bloque.
+    Útil para operaciones masivas que ya resuelven stock/alertas por su cuenta.
+
+        with skip_signals():
+            pedido.save()
+    """
+    token = _omitir_signals.set(True)
+    try:
+        yield
+    finally:
+        _omitir_signals.reset(token)
+
+
+def signals_omitidos():
+    """True si el código actual corre dentro de skip_signals()"""
+    return _omitir_signals.get()
+
+
+def omitible(receptor):
+    """Decorador para receivers que deben ignorarse dentro de skip_signals()"""
+    @wraps(receptor)
+    def envoltura(*args, **kwargs):
+        if _omitir_signals.get():
+            return None
+        return receptor(*args, **kwargs)
+    return envoltura
+
+
+class RastreoCambiosMixin:
+    """
+    Mixin para modelos que necesitan comparar valores anteriores y nuevos.
+
+    Uso:
+        class Producto(RastreoCambiosMixin, models.Model):
+            CAMPOS_RASTREADOS = ('stock',)
+
+        producto.valor_anterior('stock')   # valor en la BD al cargar/guardar
+        producto.campo_cambio('stock')     # True si difiere del valor actual
+
+    Solo se guardan los campos realmente cargados (los diferidos con
+    .only()/.defer() no provocan consultas). Si no hay snapshot (instancia
+    creada a mano con pk), valor_anterior() consulta la BD una sola vez.
+    """
+    CAMPOS_RASTREADOS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._tomar_snapshot()
+        return instance
+
+    def _attname(self, campo):
+        return self._meta.get_field(campo).attname
+
+    def _tomar_snapshot(self, campos=None):
+        snapshot = self.__dict__.setdefault('_valores_originales', {})
+        for campo in (self.CAMPOS_RASTREADOS if campos is None else campos):
+            attname = self._attname(campo)
+            if attname in self.__dict__:
+                snapshot[campo] = self.__dict__[attname]
+
+    def valor_anterior(self, campo):
+        """Valor del campo según la BD antes de los cambios en memoria"""
+        snapshot = self.__dict__.setdefault('_valores_originales', {})
+        if campo in snapshot:
+            return snapshot[campo]
+
+        if self.pk is None:
+            return None
+
+        valor = (
+            type(self)._base_manager
+            .filter(pk=self.pk)
+            .values_list(self._attname(campo), flat=True)
+            .first()
+        )
+        snapshot[campo] = valor
+        return valor
+
+    def campo_cambio(self, campo):
+        """True si el valor en memoria difiere del último valor guardado"""
+        if self.pk is None:
+            return False
+        return self.valor_anterior(campo) != getattr(self, self._attname(campo))
+
+    def campos_cambiados(self):
+        """Diccionario {campo: (anterior, nuevo)} de los campos rastreados que cambiaron"""
+        return {
+            campo: (self.valor_anterior(campo), getattr(self, self._attname(campo)))
+            for campo in self.CAMPOS_RASTREADOS
+            if self.campo_cambio(campo)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._tomar_snapshot()
+        else:
+            self._tomar_snapshot([
+                campo for campo in self.CAMPOS_RASTREADOS
+                if campo in update_fields or self._attname(campo) in update_fields
+            ])
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._tomar_snapshot()
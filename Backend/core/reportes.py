@@ -0,0 +1,170 @@
+# Backend/core/reportes.py
+# ⭐⭐⭐ Motor de reportes: todas las cifras en pocas consultas fijas
+#
+# - Ingresos, unidades, serie diaria y top productos se leen del acumulado
+#   VentaDiaria y el número de pedidos y el promedio de ResumenDiario
+#   (core/rollups.py): pocas filas por día en lugar de todo el historial de
+#   Pedido/DetallePedido, y las mismas cifras antes y después de la purga
+# - Los períodos (hoy, semana, mes...) se calculan con agregación condicional
+#   (Sum/Count con filter=Q(...)) en UNA sola consulta, sin importar cuántos sean
+# - Los rangos son semiabiertos [inicio, fin) en días locales
+#
+# ⭐ Solo los pedidos con estado='entregado' se cuentan como ventas
+
+from datetime import datetime, time, timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Pedido, Producto, ResumenDiario, VentaDiaria
+
+
+def inicio_del_dia(dia):
+    """Medianoche local de `dia` como datetime con zona horaria"""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def periodos_estandar(hoy=None):
+    """
+    Rangos [inicio, fin) de hoy, semana (desde el lunes) y mes en días locales.
+    Retorna {nombre: (fecha_inicio, fecha_fin)}; fecha_fin no se incluye.
+    """
+    hoy = hoy or timezone.localdate()
+    manana = hoy + timedelta(days=1)
+    return {
+        'hoy': (hoy, manana),
+        'semana': (hoy - timedelta(days=hoy.weekday()), manana),
+        'mes': (hoy.replace(day=1), manana),
+    }
+
+
+def resumenes_diarios(sucursal_id=None):
+    """Filas de ResumenDiario de la sucursal o, sin ella, las del total (sucursal=NULL)"""
+    if sucursal_id:
+        return ResumenDiario.objects.filter(sucursal_id=sucursal_id)
+    return ResumenDiario.objects.filter(sucursal__isnull=True)
+
+
+def ventas_diarias(sucursal_id=None):
+    ventas = VentaDiaria.objects.all()
+    if sucursal_id:
+        ventas = ventas.filter(sucursal_id=sucursal_id)
+    return ventas
+
+
+def ventas_por_periodo(ventas, periodos):
+    """
+    Ingresos de cada período en UNA consulta sobre VentaDiaria.
+    Retorna {'ventas_<nombre>': Decimal}.
+    """
+    agregados = {
+        f'ventas_{nombre}': Sum('ingresos', filter=Q(fecha__gte=inicio, fecha__lt=fin))
+        for nombre, (inicio, fin) in periodos.items()
+    }
+    resultado = ventas.aggregate(**agregados)
+    return {clave: valor or 0 for clave, valor in resultado.items()}
+
+
+def pedidos_por_periodo(resumenes, periodos):
+    """
+    Número de pedidos de cada período y promedio por pedido (de todo el
+    historial) en UNA consulta sobre ResumenDiario.
+    Retorna {'pedidos_<nombre>': int, ..., 'promedio_venta': Decimal}.
+    """
+    agregados = {'pedidos_total': Sum('pedidos'), 'total': Sum('total')}
+    for nombre, (inicio, fin) in periodos.items():
+        agregados[f'pedidos_{nombre}'] = Sum('pedidos', filter=Q(fecha__gte=inicio, fecha__lt=fin))
+
+    resultado = {clave: valor or 0 for clave, valor in resumenes.aggregate(**agregados).items()}
+    pedidos_total = resultado.pop('pedidos_total')
+    total = resultado.pop('total')
+    resultado['promedio_venta'] = total / pedidos_total if pedidos_total else 0
+    return resultado
+
+
+def serie_diaria(ventas, desde, hasta):
+    """
+    Ingresos por día entre las fechas `desde` y `hasta` (inclusive) con un
+    solo GROUP BY. Los días sin ventas aparecen con total 0.
+    """
+    totales = dict(
+        ventas.filter(fecha__gte=desde, fecha__lte=hasta)
+        .values('fecha')
+        .annotate(total=Sum('ingresos'))
+        .values_list('fecha', 'total')
+        .order_by()
+    )
+
+    serie = []
+    dia = desde
+    while dia <= hasta:
+        serie.append({'fecha': dia.isoformat(), 'total': float(totales.get(dia) or 0)})
+        dia += timedelta(days=1)
+    return serie
+
+
+def top_productos(sucursal_id=None, limite=5):
+    """Productos más vendidos en pedidos entregados (una consulta sobre el acumulado)"""
+    # Productos eliminados (producto=NULL) se agrupan por el nombre guardado
+    filas = ventas_diarias(sucursal_id).values(
+        'producto_id', nombre=Coalesce('producto__nombre', 'producto_nombre')
+    ).annotate(
+        total_vendido=Sum('unidades'),
+        total_ingresos=Sum('ingresos')
+    ).filter(total_vendido__gt=0).order_by('-total_vendido', 'producto_id')[:limite]
+
+    return [
+        {
+            'id': fila['producto_id'],
+            'nombre': fila['nombre'],
+            'total_vendido': fila['total_vendido'],
+            'total_ingresos': float(fila['total_ingresos'] or 0)
+        }
+        for fila in filas
+    ]
+
+
+def conteo_por_estado():
+    """Número de pedidos por estado con un solo GROUP BY (solo para diagnóstico)"""
+    return dict(Pedido.objects.order_by().values_list('estado').annotate(total=Count('id')))
+
+
+def calcular_estadisticas(sucursal_id=None, dias_serie=7):
+    """
+    Estadísticas completas del dashboard de reportes.
+    Número de consultas fijo: ingresos por período, pedidos por período,
+    serie diaria, top productos y conteo de productos.
+    """
+    hoy = timezone.localdate()
+    periodos = periodos_estandar(hoy)
+    ventas = ventas_diarias(sucursal_id)
+
+    resumen = ventas_por_periodo(ventas, periodos)
+    resumen.update(pedidos_por_periodo(resumenes_diarios(sucursal_id), periodos))
+    ventas_por_dia = serie_diaria(ventas, hoy - timedelta(days=dias_serie - 1), hoy)
+    top = top_productos(sucursal_id)
+
+    productos = Producto.objects.all()
+    if sucursal_id:
+        productos = productos.filter(sucursal_id=sucursal_id)
+
+    producto_mas_vendido = None
+    if top:
+        producto_mas_vendido = {
+            'nombre': top[0]['nombre'],
+            'cantidad': top[0]['total_vendido'],
+            'ingresos': top[0]['total_ingresos']
+        }
+
+    return {
+        'ventas_hoy': float(resumen['ventas_hoy']),
+        'ventas_semana': float(resumen['ventas_semana']),
+        'ventas_mes': float(resumen['ventas_mes']),
+        'pedidos_hoy': resumen['pedidos_hoy'],
+        'pedidos_semana': resumen['pedidos_semana'],
+        'pedidos_mes': resumen['pedidos_mes'],
+        'promedio_venta': float(resumen['promedio_venta']),
+        'total_productos': productos.count(),
+        'ventas_por_dia': ventas_por_dia,
+        'top_productos': top,
+        'producto_mas_vendido': producto_mas_vendido
+    }
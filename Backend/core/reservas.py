@@ -0,0 +1,209 @@
+# Backend/core/reservas.py
+# ⭐⭐⭐ Reservas temporales de stock (apartado del carrito)
+#
+# FLUJO:
+# 1. reservar_stock(): descuenta las unidades del producto con un UPDATE
+#    condicional y crea una ReservaStock con vencimiento
+# 2. El checkout confirma la reserva (no vuelve a tocar el stock del producto)
+# 3. liberar_reserva() / expirar_reservas() devuelven las unidades al producto
+#
+# Cada usuario puede tener como máximo RESERVA_MAX_UNIDADES_POR_USUARIO
+# unidades activas de un mismo producto: renovar reservas no permite acaparar
+# el stock
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Producto, ReservaStock, Usuario
+from .checkout import descontar_stock, reponer_stock
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def duracion_reserva():
+    """Tiempo de vida de una reserva (configurable con RESERVA_STOCK_MINUTOS)"""
+    return timedelta(minutes=getattr(settings, 'RESERVA_STOCK_MINUTOS', 10))
+
+
+def maximo_por_usuario():
+    """Unidades activas de un producto por usuario (RESERVA_MAX_UNIDADES_POR_USUARIO)"""
+    return getattr(settings, 'RESERVA_MAX_UNIDADES_POR_USUARIO', 10)
+
+
+def reservar_stock(usuario, producto_id, cantidad):
+    """
+    Aparta `cantidad` unidades de un producto para el usuario.
+
+    Raises:
+        serializers.ValidationError si el producto no existe, no está
+        disponible, no tiene stock suficiente o el usuario superaría su
+        máximo de unidades reservadas del producto.
+    """
+    from .signals import clasificar_cambio_stock, despachar_alerta_stock
+
+    # Devolver primero las reservas vencidas de este producto
+    expirar_reservas(producto_id=producto_id)
+
+    with transaction.atomic():
+        producto = Producto.objects.filter(pk=producto_id).first()
+
+        if producto is None:
+            raise serializers.ValidationError({
+                'producto': f"El producto con ID {producto_id} no existe"
+            })
+
+        if not producto.disponible:
+            raise serializers.ValidationError({
+                'producto': f"El producto '{producto.nombre}' no está disponible"
+            })
+
+        # ⭐ Bloquea la fila del usuario: dos reservas simultáneas suyas no
+        # pueden pasar ambas el tope
+        Usuario.objects.select_for_update().filter(pk=usuario.pk).values_list('pk', flat=True).first()
+        apartadas = ReservaStock.objects.filter(
+            usuario=usuario, producto=producto, estado='activa', expira_en__gt=timezone.now()
+        ).aggregate(total=Sum('cantidad'))['total'] or 0
+        maximo = maximo_por_usuario()
+        if apartadas + cantidad > maximo:
+            raise serializers.ValidationError({
+                'cantidad': f'Máximo {maximo} unidades reservadas de {producto.nombre} por usuario. Ya tienes {apartadas}.'
+            })
+
+        # ⭐ UPDATE condicional: falla si otro cliente tomó las unidades antes
+        if producto.stock < cantidad or not descontar_stock({producto.pk: cantidad}):
+            raise serializers.ValidationError({
+                'stock': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}, Solicitado: {cantidad}'
+            })
+
+        reserva = ReservaStock.objects.create(
+            producto=producto,
+            usuario=usuario,
+            cantidad=cantidad,
+            expira_en=timezone.now() + duracion_reserva()
+        )
+
+        alerta = clasificar_cambio_stock(producto.stock, producto.stock - cantidad)
+        if alerta:
+            despachar_alerta_stock(producto.pk, alerta)
+
+    print(f"🔖 Reserva #{reserva.id}: {cantidad}x {producto.nombre} para {usuario.username} (vence {reserva.expira_en:%H:%M})")
+    return reserva
+
+
+def liberar_reserva(usuario, reserva_id, producto_id=None):
+    """
+    Libera una reserva activa del usuario y devuelve las unidades al producto.
+    Con producto_id solo la libera si es de ese producto.
+    Retorna True si la reserva se liberó.
+    """
+    reservas = ReservaStock.objects.filter(pk=reserva_id, usuario=usuario, estado='activa')
+    if producto_id is not None:
+        reservas = reservas.filter(producto_id=producto_id)
+
+    with transaction.atomic():
+        reserva = reservas.select_for_update().first()
+        if reserva is None:
+            return False
+
+        reserva.estado = 'liberada'
+        reserva.save(update_fields=['estado'])
+        reponer_stock({reserva.producto_id: reserva.cantidad})
+
+    print(f"♻️ Reserva #{reserva.id} liberada (+{reserva.cantidad} unidades)")
+    return True
+
+
+def confirmar_reservas(usuario, reservas_por_item):
+    """
+    Valida y bloquea las reservas usadas en un checkout.
+
+    Args:
+        usuario: Usuario que realiza el pedido
+        reservas_por_item: {reserva_id: (producto_id, cantidad)}
+
+    Returns:
+        Lista de ReservaStock bloqueadas (con producto cargado). El llamador
+        debe marcarlas como confirmadas con marcar_confirmadas().
+    """
+    if not reservas_por_item:
+        return []
+
+    reservas = list(
+        ReservaStock.objects.select_for_update()
+        .select_related('producto')
+        .filter(pk__in=list(reservas_por_item), usuario=usuario)
+        .order_by('pk')
+    )
+    encontradas = {r.pk: r for r in reservas}
+    ahora = timezone.now()
+
+    for reserva_id, (producto_id, cantidad) in reservas_por_item.items():
+        reserva = encontradas.get(reserva_id)
+
+        if reserva is None or reserva.estado != 'activa' or reserva.expira_en <= ahora:
+            raise serializers.ValidationError({
+                'reserva': f'La reserva #{reserva_id} no existe o ya venció'
+            })
+
+        if reserva.producto_id != producto_id or reserva.cantidad != cantidad:
+            raise serializers.ValidationError({
+                'reserva': f'La reserva #{reserva_id} no corresponde al producto o cantidad solicitados'
+            })
+
+    return reservas
+
+
+def marcar_confirmadas(reservas, pedido):
+    """Marca las reservas como confirmadas por el pedido (un solo UPDATE)"""
+    if reservas:
+        ReservaStock.objects.filter(pk__in=[r.pk for r in reservas]).update(
+            estado='confirmada',
+            pedido=pedido
+        )
+
+
+def expirar_reservas(producto_id=None, lote=1000):
+    """
+    Expira en bloque las reservas vencidas y devuelve su stock.
+
+    Procesa lotes de `lote` reservas; cada lote usa una transacción corta
+    con un UPDATE para las reservas y otro para los productos.
+    Retorna el número total de reservas expiradas.
+    """
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            vencidas = ReservaStock.objects.filter(
+                estado='activa',
+                expira_en__lte=timezone.now()
+            )
+            if producto_id is not None:
+                vencidas = vencidas.filter(producto_id=producto_id)
+
+            filas = list(
+                vencidas.select_for_update(skip_locked=True)
+                .order_by('pk')
+                .values_list('pk', 'producto_id', 'cantidad')[:lote]
+            )
+            if not filas:
+                break
+
+            ReservaStock.objects.filter(pk__in=[pk for pk, _, _ in filas]).update(estado='expirada')
+
+            cantidades = {}
+            for _, prod_id, cantidad in filas:
+                cantidades[prod_id] = cantidades.get(prod_id, 0) + cantidad
+            reponer_stock(cantidades)
+
+        total += len(filas)
+        if len(filas) < lote:
+            break
+
+    if total:
+        logger.info(f"⏰ {total} reserva(s) expirada(s)")
+    return total
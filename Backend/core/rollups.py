@@ -0,0 +1,181 @@
+# Backend/core/rollups.py
+# ⭐⭐⭐ Acumulado diario de ventas (VentaDiaria) por sucursal y producto
+#
+# - Un pedido que pasa a 'entregado' SUMA sus líneas al día local de su fecha
+# - Un pedido que sale de 'entregado' (p. ej. corrección a 'listo') las RESTA
+# - Eliminar un pedido NO resta: la venta ya ocurrió y el auto-delete de
+#   pedidos completados no debe borrar el historial de reportes. Eliminar un
+#   producto tampoco: la fila conserva producto_nombre
+# - Los ingresos usan DetallePedido.precio_unitario (precio al comprar); si no
+#   existe (pedidos antiguos) se usa el precio actual del producto
+# - ResumenDiario lleva, con las mismas reglas, el número de pedidos y su
+#   total por día y sucursal (sucursal=NULL = todas): los reportes cuentan
+#   pedidos del mismo historial del que suman ingresos
+#
+# Para corregir un rango: python manage.py rebuild_rollups --desde ... --hasta ...
+
+from collections import defaultdict
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import DetallePedido, Pedido, ResumenDiario, VentaDiaria
+from .reportes import inicio_del_dia
+from .cache_reportes import invalidar_reportes, invalidar_todos_los_reportes
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def ingreso_linea():
+    """Expresión cantidad × precio al momento de la compra"""
+    return ExpressionWrapper(
+        F('cantidad') * Coalesce('precio_unitario', 'producto__precio'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def lineas_por_producto(detalles):
+    """
+    Agrupa detalles por (día local del pedido, sucursal, producto).
+    Retorna filas {'dia', 'producto__sucursal_id', 'producto_id', 'producto__nombre',
+    'unidades', 'ingresos'}.
+    """
+    return (
+        detalles
+        .annotate(dia=TruncDate('pedido__fecha', tzinfo=timezone.get_current_timezone()))
+        .values('dia', 'producto__sucursal_id', 'producto_id', 'producto__nombre')
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum(ingreso_linea()))
+        .order_by()
+    )
+
+
+def pedidos_por_dia(pedidos):
+    """
+    Agrupa `pedidos` por (día local, sucursal) y por (día local, None) para
+    el total de todas las sucursales. Dos consultas.
+    Retorna {(dia, sucursal_id): [pedidos, total]}.
+    """
+    sucursales = defaultdict(set)
+    lineas = DetallePedido.objects.filter(pedido__in=pedidos).values_list('pedido_id', 'producto__sucursal_id')
+    for pedido_id, sucursal_id in lineas.distinct().order_by().iterator():
+        if sucursal_id:
+            sucursales[pedido_id].add(sucursal_id)
+
+    grupos = defaultdict(lambda: [0, 0])
+    filas = (
+        pedidos.annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        .values_list('id', 'dia', 'total')
+        .order_by()
+    )
+    for pedido_id, dia, total in filas.iterator():
+        for sucursal_id in [None, *sucursales[pedido_id]]:
+            grupo = grupos[(dia, sucursal_id)]
+            grupo[0] += 1
+            grupo[1] += total or 0
+    return grupos
+
+
+def _sumar_fila(modelo, filtro, valores, al_crear=None):
+    """UPDATE incremental; si la fila no existe se crea (con reintento si otro proceso la creó)"""
+    incremento = {campo: F(campo) + valor for campo, valor in valores.items()}
+
+    if modelo.objects.filter(**filtro).update(**incremento):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**valores, **filtro, **(al_crear or {}))
+    except IntegrityError:
+        modelo.objects.filter(**filtro).update(**incremento)
+
+
+def aplicar_pedidos(pedido_ids, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) los pedidos al acumulado: sus líneas a
+    VentaDiaria y el pedido a ResumenDiario. Consultas agrupadas + una
+    escritura por (día, sucursal, producto) y por (día, sucursal).
+    Retorna el conjunto de sucursales afectadas.
+    """
+    sucursales = set()
+    if not pedido_ids:
+        return sucursales
+    pedido_ids = list(pedido_ids)
+    filas = lineas_por_producto(DetallePedido.objects.filter(pedido_id__in=pedido_ids))
+    for fila in filas:
+        sucursales.add(fila['producto__sucursal_id'])
+        _sumar_fila(
+            VentaDiaria,
+            {'fecha': fila['dia'], 'sucursal_id': fila['producto__sucursal_id'], 'producto_id': fila['producto_id']},
+            {'unidades': signo * fila['unidades'], 'ingresos': signo * (fila['ingresos'] or 0)},
+            al_crear={'producto_nombre': fila['producto__nombre']},
+        )
+    for (dia, sucursal_id), (pedidos, total) in pedidos_por_dia(Pedido.objects.filter(id__in=pedido_ids)).items():
+        _sumar_fila(
+            ResumenDiario,
+            {'fecha': dia, 'sucursal_id': sucursal_id},
+            {'pedidos': signo * pedidos, 'total': signo * total},
+        )
+    return sucursales
+
+
+def registrar_transiciones(transiciones):
+    """
+    Actualiza el acumulado para cambios de estado.
+
+    Args:
+        transiciones: iterable de (pedido_id, estado_anterior, estado_nuevo)
+    """
+    entran = [pid for pid, anterior, nuevo in transiciones if anterior != 'entregado' and nuevo == 'entregado']
+    salen = [pid for pid, anterior, nuevo in transiciones if anterior == 'entregado' and nuevo != 'entregado']
+    with transaction.atomic():
+        sucursales = aplicar_pedidos(entran, 1) | aplicar_pedidos(salen, -1)
+    if entran or salen:
+        invalidar_reportes(sucursales)
+        logger.info(f"📈 VentaDiaria: +{len(entran)} / -{len(salen)} pedido(s)")
+
+
+def reconstruir(desde, hasta):
+    """
+    Recalcula VentaDiaria y ResumenDiario entre las fechas locales `desde` y
+    `hasta` (inclusive) a partir de los pedidos entregados existentes.
+    ⚠️ Las ventas de pedidos ya eliminados (purga) no se pueden recuperar:
+    el rango debe cubrir solo días cuyos pedidos siguen en la base de datos.
+    Retorna el número de filas de VentaDiaria creadas.
+    """
+    if not desde or not hasta:
+        raise ValueError('reconstruir() necesita un rango explícito (desde y hasta)')
+
+    rango = {
+        'fecha__gte': inicio_del_dia(desde),
+        'fecha__lt': inicio_del_dia(hasta + timedelta(days=1)),
+    }
+    pedidos = Pedido.objects.filter(estado='entregado', **rango)
+    detalles = DetallePedido.objects.filter(pedido__in=pedidos)
+
+    with transaction.atomic():
+        VentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        ResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        creadas = VentaDiaria.objects.bulk_create(
+            (
+                VentaDiaria(
+                    fecha=fila['dia'],
+                    sucursal_id=fila['producto__sucursal_id'],
+                    producto_id=fila['producto_id'],
+                    producto_nombre=fila['producto__nombre'],
+                    unidades=fila['unidades'],
+                    ingresos=fila['ingresos'] or 0,
+                )
+                for fila in lineas_por_producto(detalles).iterator()
+            ),
+            batch_size=1000,
+        )
+        ResumenDiario.objects.bulk_create(
+            (
+                ResumenDiario(fecha=dia, sucursal_id=sucursal_id, pedidos=cantidad, total=total)
+                for (dia, sucursal_id), (cantidad, total) in pedidos_por_dia(pedidos).items()
+            ),
+            batch_size=1000,
+        )
+        invalidar_todos_los_reportes()
+    return len(creadas)
@@ -6,7 +6,12 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.password_validation import validate_password
 from django.conf import settings
 from django.utils import timezone
-from .models import Usuario, Producto, Oferta, ProductoOferta, Pedido, DetallePedido, Sucursal
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Usuario, Producto, Oferta, ProductoOferta, Pedido, DetallePedido, Sucursal, ReservaStock
+from .checkout import procesar_checkout
+from .jobs import encolar
 import cloudinary.uploader
 
 
@@ -14,6 +19,37 @@ import cloudinary.uploader
 # SUCURSAL SERIALIZER (⭐ CORREGIDO)
 # ============================================================================
 
+def _conteo_por_sucursal(queryset):
+    """Subconsulta COUNT(*) de `queryset` para la sucursal de la fila externa (0 si no hay)"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(sucursal=OuterRef('pk'))
+            .order_by()
+            .values('sucursal')
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def sucursales_con_conteos(queryset=None):
+    """
+    ⭐ Sucursales con num_productos, num_ofertas y num_admins anotados:
+    los conteos salen en la MISMA consulta que las sucursales
+    """
+    if queryset is None:
+        queryset = Sucursal.objects.all()
+    return queryset.annotate(
+        num_productos=_conteo_por_sucursal(Producto.objects.all()),
+        num_ofertas=_conteo_por_sucursal(Oferta.objects.all()),
+        num_admins=_conteo_por_sucursal(
+            Usuario.objects.filter(rol__in=['administrador', 'administrador_general'])
+        ),
+    )
+
+
 class SucursalSerializer(serializers.ModelSerializer):
     """Serializer para sucursales con conteos correctos"""
     total_productos = serializers.SerializerMethodField()
@@ -37,21 +73,32 @@ class SucursalSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['fecha_creacion']
     
+    def _conteos(self, obj):
+        """
+        Conteos anotados por sucursales_con_conteos(). Si la instancia no los
+        trae (p. ej. recién creada), se calculan con UNA consulta y se guardan.
+        """
+        if not hasattr(obj, 'num_productos'):
+            obj.num_productos, obj.num_ofertas, obj.num_admins = (
+                sucursales_con_conteos(Sucursal.objects.filter(pk=obj.pk))
+                .values_list('num_productos', 'num_ofertas', 'num_admins')
+                .get()
+            )
+        return obj
+    
     def get_total_productos(self, obj):
         """Conteo de productos de esta sucursal"""
-        return obj.productos.count()
+        return self._conteos(obj).num_productos
     
     def get_total_ofertas(self, obj):
         """Conteo de ofertas de esta sucursal"""
-        return obj.ofertas.count()
+        return self._conteos(obj).num_ofertas
     
     def get_total_admins(self, obj):
         """Conteo de administradores asignados a esta sucursal"""
-        return obj.usuarios.filter(
-            rol__in=['administrador', 'administrador_general']
-        ).count()
+        return self._conteos(obj).num_admins
     
-    # ⭐ LEGACY: Métodos antiguos para compatibilidad
+    # ⭐ LEGACY: Reutilizan los mismos conteos (no consultan de nuevo)
     def get_productos_count(self, obj):
         return self.get_total_productos(obj)
     
@@ -134,6 +181,42 @@ class UsuarioSerializer(serializers.ModelSerializer):
 # PRODUCTO SERIALIZER
 # ============================================================================
 
+def indice_ofertas_activas(producto_ids, hoy=None):
+    """
+    ⭐ Mapa producto_id → oferta activa (o None) con UNA consulta.
+    Los listados lo pasan en el contexto ('ofertas_activas') para que
+    ProductoSerializer no consulte las ofertas producto por producto.
+    Si un producto tiene varias ofertas activas gana la más reciente.
+    """
+    hoy = hoy or timezone.now().date()
+    indice = dict.fromkeys(producto_ids)
+    relaciones = ProductoOferta.objects.filter(
+        producto_id__in=list(indice),
+        oferta__fecha_inicio__lte=hoy,
+        oferta__fecha_fin__gte=hoy
+    ).select_related('oferta').order_by('producto_id', '-oferta__fecha_inicio')
+    
+    for relacion in relaciones:
+        if indice[relacion.producto_id] is None:
+            indice[relacion.producto_id] = relacion.oferta
+    return indice
+
+
+def oferta_activa_de(producto, context):
+    """Oferta activa del producto desde el índice del contexto; sin índice, una consulta"""
+    indice = context.get('ofertas_activas')
+    if indice is not None and producto.id in indice:
+        return indice[producto.id]
+    
+    if not hasattr(producto, '_oferta_activa'):
+        hoy = timezone.now().date()
+        producto._oferta_activa = producto.ofertas.filter(
+            fecha_inicio__lte=hoy,
+            fecha_fin__gte=hoy
+        ).first()
+    return producto._oferta_activa
+
+
 class ProductoSerializer(serializers.ModelSerializer):
     imagen_url = serializers.SerializerMethodField(read_only=True)
     tiene_oferta = serializers.SerializerMethodField()
@@ -162,18 +245,10 @@ class ProductoSerializer(serializers.ModelSerializer):
         return None
     
     def get_tiene_oferta(self, obj):
-        hoy = timezone.now().date()
-        return obj.ofertas.filter(
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        ).exists()
+        return oferta_activa_de(obj, self.context) is not None
     
     def get_oferta_activa(self, obj):
-        hoy = timezone.now().date()
-        oferta = obj.ofertas.filter(
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        ).first()
+        oferta = oferta_activa_de(obj, self.context)
         
         if oferta:
             return {
@@ -226,6 +301,33 @@ class ProductoSerializer(serializers.ModelSerializer):
         return producto
 
 
+# ============================================================================
+# RESERVA DE STOCK SERIALIZER
+# ============================================================================
+
+class ReservaStockSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+    esta_vigente = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = ReservaStock
+        fields = [
+            'id', 'producto', 'producto_nombre', 'cantidad', 'estado',
+            'fecha_creacion', 'expira_en', 'esta_vigente'
+        ]
+        read_only_fields = fields
+
+
+class ReservarStockSerializer(serializers.Serializer):
+    """Body de POST /api/productos/{id}/reservar/ (JSON o formulario)"""
+    cantidad = serializers.IntegerField(min_value=1, default=1)
+
+
+class LiberarReservaSerializer(serializers.Serializer):
+    """Body de POST /api/productos/{id}/liberar-reserva/"""
+    reserva = serializers.IntegerField(min_value=1)
+
+
 # ============================================================================
 # OFERTA SERIALIZERS (SECCIÓN MODIFICADA)
 # ============================================================================
@@ -464,13 +566,13 @@ class OfertaSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         
         try:
-            productos_oferta = ProductoOferta.objects.filter(oferta=instance).select_related('producto')
+            # ⭐ Usa las relaciones ya precargadas (prefetch) en lugar de una consulta por oferta
             representation['productos_data'] = [
                 {
-                    'producto_id': po.producto.id,
+                    'producto_id': po.producto_id,
                     'cantidad': po.cantidad
                 }
-                for po in productos_oferta
+                for po in instance.productooferta_set.all()
             ]
         except AttributeError:
             representation['productos_data'] = []
@@ -521,17 +623,26 @@ class DetallePedidoSerializer(serializers.ModelSerializer):
         return obj.producto.precio * obj.cantidad
     
     def get_es_oferta(self, obj):
-        hoy = timezone.now().date()
-        return obj.producto.ofertas.filter(
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        ).exists()
+        return oferta_activa_de(obj.producto, self.context) is not None
+
+
+class UsuarioPedidoSerializer(UsuarioSerializer):
+    """
+    Usuario anidado en pedidos: se serializa UNA vez por usuario y petición
+    (un cliente con muchos pedidos no repite sucursal_data ni sus conteos)
+    """
+    
+    def to_representation(self, instance):
+        serializados = self.context.setdefault('_usuarios_serializados', {})
+        if instance.pk not in serializados:
+            serializados[instance.pk] = super().to_representation(instance)
+        return dict(serializados[instance.pk])
 
 
 class PedidoSerializer(serializers.ModelSerializer):
     """Serializer para pedidos con detalles completos (SOLO LECTURA)"""
     detalles = DetallePedidoSerializer(many=True, read_only=True)
-    usuario = UsuarioSerializer(read_only=True)
+    usuario = UsuarioPedidoSerializer(read_only=True)
     usuario_nombre = serializers.CharField(source='usuario.username', read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
     tipo_entrega_display = serializers.CharField(source='get_tipo_entrega_display', read_only=True)
@@ -580,15 +691,10 @@ class PedidoSerializer(serializers.ModelSerializer):
             return "Hace un momento"
     
     def get_es_oferta(self, obj):
-        from django.utils import timezone
-        hoy = timezone.now().date()
-        for detalle in obj.detalles.all():
-            if detalle.producto.ofertas.filter(
-                fecha_inicio__lte=hoy,
-                fecha_fin__gte=hoy
-            ).exists():
-                return True
-        return False
+        return any(
+            oferta_activa_de(detalle.producto, self.context) is not None
+            for detalle in obj.detalles.all()
+        )
 
 
 class PedidoCreateSerializer(serializers.Serializer):
@@ -605,7 +711,11 @@ class PedidoCreateSerializer(serializers.Serializer):
     )
     
     def validate_items(self, items):
-        """Valida la estructura de los items"""
+        """
+        Valida la estructura de los items.
+        La existencia, disponibilidad y stock se verifican en procesar_checkout()
+        con una sola consulta para todo el carrito.
+        """
         if not items:
             raise serializers.ValidationError("Debe incluir al menos un producto")
             
@@ -619,15 +729,20 @@ class PedidoCreateSerializer(serializers.Serializer):
                 raise serializers.ValidationError("La cantidad debe ser un entero mayor a 0")
             
             try:
-                producto = Producto.objects.get(id=item['producto'])
-                if not producto.disponible:
-                    raise serializers.ValidationError(
-                        f"El producto '{producto.nombre}' no está disponible"
-                    )
-            except Producto.DoesNotExist:
+                item['producto'] = int(item['producto'])
+            except (TypeError, ValueError):
                 raise serializers.ValidationError(
                     f"El producto con ID {item['producto']} no existe"
                 )
+            
+            # ⭐ Opcional: confirmar una reserva de stock existente
+            if item.get('reserva') is not None:
+                try:
+                    item['reserva'] = int(item['reserva'])
+                except (TypeError, ValueError):
+                    raise serializers.ValidationError(
+                        f"La reserva {item['reserva']} no es válida"
+                    )
         
         return items
     
@@ -659,87 +774,22 @@ class PedidoCreateSerializer(serializers.Serializer):
         print(f"📦 Tipo de entrega: {tipo_entrega}")
         print(f"{'='*60}")
         
-        # ⭐ CRÍTICO: Solo guardar dirección si es entrega a domicilio
-        direccion_entrega = None
-        if tipo_entrega == 'domicilio':
-            direccion_entrega = usuario.domicilio
-            print(f"📍 Domicilio: {direccion_entrega}")
-        else:
-            print(f"🏪 Cliente recogerá en sucursal (sin dirección)")
-        
-        # ⭐ Crear pedido con tipo_entrega y dirección según corresponda
-        pedido = Pedido.objects.create(
-            usuario=usuario,
-            estado='recibido',
-            total=0,
-            tipo_entrega=tipo_entrega,
-            direccion_entrega=direccion_entrega
-        )
+        with transaction.atomic():
+            # ⭐⭐⭐ Carga con bloqueo, descuento de stock y detalles en bloque
+            pedido = procesar_checkout(usuario, items_data, tipo_entrega)
+            
+            # ⭐⭐⭐ Email de confirmación encolado en la misma transacción
+            encolar('email.confirmacion_pedido', pedido_id=pedido.id)
         
         print(f"✅ Pedido #{pedido.id} creado")
         if pedido.direccion_entrega:
             print(f"📍 Dirección de entrega: {pedido.direccion_entrega}")
         else:
             print(f"🏪 Para recoger en sucursal")
-        print()
-        
-        total = 0
-        for item in items_data:
-            producto = Producto.objects.get(id=item['producto'])
-            cantidad = item['cantidad']
-            
-            # ⭐⭐⭐ CRÍTICO: REDUCIR STOCK DEL PRODUCTO
-            if producto.stock >= cantidad:
-                producto.stock -= cantidad
-                if producto.stock == 0:
-                    producto.disponible = False
-                producto.save()
-                print(f"   📦 Stock reducido: {producto.nombre} ({producto.stock + cantidad} → {producto.stock})")
-            else:
-                # Si no hay suficiente stock, revertir pedido
-                pedido.delete()
-                raise serializers.ValidationError({
-                    'stock': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}, Solicitado: {cantidad}'
-                })
-            
-            # Crear detalle del pedido
-            DetallePedido.objects.create(
-                pedido=pedido,
-                producto=producto,
-                cantidad=cantidad
-            )
-            
-            total += producto.precio * cantidad
-            print(f"   ✓ {cantidad}x {producto.nombre} - ₡{producto.precio * cantidad}")
-        
-        pedido.total = total
-        pedido.save()
-        
-        print(f"💵 TOTAL: ₡{total}")
+        print(f"💵 TOTAL: ₡{pedido.total}")
         print(f"{'='*60}\n")
         
-        # ⭐⭐⭐ NUEVO: ENVIAR EMAILS DE CONFIRMACIÓN (sin delay)
-        print(f"📧 Programando envío de correos de confirmación...")
-        try:
-            import threading
-            from .emails import enviar_confirmacion_pedido
-            
-            def enviar_email():
-                try:
-                    enviar_confirmacion_pedido(pedido.id)
-                    print(f"✅ Correos de confirmación enviados para pedido #{pedido.id}\n")
-                except Exception as e:
-                    print(f"❌ Error enviando correos: {e}\n")
-                    import traceback
-                    traceback.print_exc()
-            
-            thread = threading.Thread(target=enviar_email)
-            thread.daemon = True
-            thread.start()
-            print(f"✅ Email programado en background\n")
-        except Exception as e:
-            print(f"❌ Error programando email: {e}\n")
-        
+        print(f"📧 Correos de confirmación encolados para pedido #{pedido.id}\n")
         return pedido
     
     # ⭐ NO necesitamos to_representation() porque lo manejamos en views.py
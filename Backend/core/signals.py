@@ -1,10 +1,15 @@
 # Backend/core/signals.py
-# ⭐⭐⭐ CORREGIDO: Envía alerta SIEMPRE que stock <= 5 (sin límite de envíos)
+# ⭐⭐⭐ Stock <= 5: alerta agrupada en un resumen por sucursal (agotado = inmediato)
 
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Oferta, Pedido, Producto
-import threading
+from .models import Oferta, Pedido, Producto, ProductoOferta, Sucursal, Usuario
+from .rastreo import omitible
+from .jobs import encolar
+from .cache_reportes import invalidar_reportes
+from .cache_catalogo import invalidar_catalogo, invalidar_todo_el_catalogo
+from .emails import destinatarios
+from .autenticacion import invalidar_usuarios
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,44 +17,33 @@ logger = logging.getLogger(__name__)
 # ⭐⭐⭐ CONFIGURACIÓN: Umbral de stock bajo
 UMBRAL_STOCK_BAJO = 5  # Stock bajo = 5 o menos unidades
 
-
-def ejecutar_email_background(funcion_email, *args, **kwargs):
-    """
-    Ejecuta una función de email en un hilo separado (background)
-    """
-    def enviar():
-        try:
-            funcion_email(*args, **kwargs)
-        except Exception as e:
-            logger.error(f"❌ Error en email background: {str(e)}")
-            print(f"❌ Error en email background: {str(e)}")
-    
-    thread = threading.Thread(target=enviar)
-    thread.daemon = True
-    thread.start()
+# Los emails ya no se envían en hilos sueltos: se encolan como Trabajo en la
+# misma transacción y los ejecuta el comando run_workers (ver core/jobs.py)
 
 
 @receiver(post_save, sender=Producto)
+@omitible
 def notificar_nuevo_producto(sender, instance, created, **kwargs):
     """Envía correo a clientes cuando se crea un nuevo producto"""
     if created:
         print(f"🆕 Nuevo producto creado: {instance.nombre}")
         
-        from .emails import enviar_notificacion_nuevo_producto
-        ejecutar_email_background(enviar_notificacion_nuevo_producto, instance.id)
+        encolar('email.nuevo_producto', producto_id=instance.id)
 
 
 @receiver(pre_save, sender=Pedido)
+@omitible
 def detectar_cancelacion_pedido(sender, instance, **kwargs):
     """
     ⭐⭐⭐ Detecta cancelación Y restaura stock automáticamente
     """
     if instance.pk:  # Solo si el pedido ya existe
-        try:
-            pedido_anterior = Pedido.objects.get(pk=instance.pk)
-            
+        # ⭐ Estado anterior desde el snapshot del modelo (sin re-leer la BD)
+        estado_anterior = instance.valor_anterior('estado')
+        
+        if estado_anterior is not None:
             # Detectar si cambió a cancelado
-            if pedido_anterior.estado != 'cancelado' and instance.estado == 'cancelado':
+            if estado_anterior != 'cancelado' and instance.estado == 'cancelado':
                 instance._pedido_fue_cancelado = True
                 print(f"❌ Pedido #{instance.id} fue CANCELADO")
                 
@@ -73,12 +67,10 @@ def detectar_cancelacion_pedido(sender, instance, **kwargs):
                     producto.save(update_fields=['stock', 'disponible'])
                     
                     print(f"   ♻️ {producto.nombre}: {cantidad_anterior} → {producto.stock} (+{detalle.cantidad})")
-                
-        except Pedido.DoesNotExist:
-            pass
 
 
 @receiver(post_save, sender=Pedido)
+@omitible
 def notificar_pedido_cancelado(sender, instance, created, **kwargs):
     """
     Envía notificación a admins cuando un pedido es cancelado
@@ -86,8 +78,7 @@ def notificar_pedido_cancelado(sender, instance, created, **kwargs):
     if not created and hasattr(instance, '_pedido_fue_cancelado'):
         print(f"📧 Enviando notificación de cancelación para pedido #{instance.id}")
         
-        from .emails import enviar_notificacion_pedido_cancelado
-        ejecutar_email_background(enviar_notificacion_pedido_cancelado, instance.id)
+        encolar('email.pedido_cancelado', pedido_id=instance.id)
         
         delattr(instance, '_pedido_fue_cancelado')
 
@@ -96,7 +87,24 @@ def notificar_pedido_cancelado(sender, instance, created, **kwargs):
 # DETECCIÓN DE CAMBIOS EN STOCK (⭐⭐⭐ SIN LÍMITE DE ENVÍOS)
 # ============================================================================
 
+def clasificar_cambio_stock(stock_anterior, stock_nuevo):
+    """
+    Determina qué alerta corresponde a un cambio de stock.
+    Retorna 'sin_stock', 'stock_bajo' o None.
+    """
+    # ⭐ CASO 1: PRODUCTO SE QUEDÓ SIN STOCK (0)
+    if stock_anterior > 0 and stock_nuevo == 0:
+        return 'sin_stock'
+    
+    # ⭐ CASO 2: STOCK BAJO (1-5) - SIEMPRE ENVIAR
+    if 1 <= stock_nuevo <= UMBRAL_STOCK_BAJO:
+        return 'stock_bajo'
+    
+    return None
+
+
 @receiver(pre_save, sender=Producto)
+@omitible
 def detectar_cambio_stock(sender, instance, **kwargs):
     """
     ⭐⭐⭐ NUEVO COMPORTAMIENTO: Envía alerta SIEMPRE que stock <= 5
@@ -104,46 +112,61 @@ def detectar_cambio_stock(sender, instance, **kwargs):
     - Envía correo cada vez que el stock baja o se mantiene en 5 o menos
     """
     if instance.pk:
-        try:
-            producto_anterior = Producto.objects.get(pk=instance.pk)
-            
+        # ⭐ Stock anterior desde el snapshot del modelo (sin re-leer la BD)
+        stock_anterior = instance.valor_anterior('stock')
+        
+        if stock_anterior is not None:
             print(f"\n{'='*60}")
             print(f"🔍 DETECTANDO CAMBIO DE STOCK")
             print(f"   Producto: {instance.nombre}")
-            print(f"   Stock anterior: {producto_anterior.stock}")
+            print(f"   Stock anterior: {stock_anterior}")
             print(f"   Stock nuevo: {instance.stock}")
             print(f"   Umbral stock bajo: {UMBRAL_STOCK_BAJO}")
             print(f"{'='*60}")
             
-            # ⭐⭐⭐ CASO 1: PRODUCTO SE QUEDÓ SIN STOCK (0)
-            if producto_anterior.stock > 0 and instance.stock == 0:
+            alerta = clasificar_cambio_stock(stock_anterior, instance.stock)
+            
+            if alerta == 'sin_stock':
                 print(f"🔴 ¡PRODUCTO AGOTADO! Activando señal de SIN STOCK")
                 instance._sin_stock = True
             
-            # ⭐⭐⭐ CASO 2: STOCK BAJO (1-5) - SIEMPRE ENVIAR
-            elif 1 <= instance.stock <= UMBRAL_STOCK_BAJO:
+            elif alerta == 'stock_bajo':
                 # ⭐ CAMBIO CRÍTICO: Ya NO verifica alerta_stock_bajo_enviada
                 print(f"⚠️ ¡STOCK BAJO DETECTADO! ({instance.stock} unidades)")
-                print(f"📧 Enviando alerta (sin restricciones)")
+                print(f"📋 Se incluirá en el resumen de stock bajo de la sucursal")
                 instance._stock_bajo = True
             
-            # ⭐⭐⭐ CASO 3: STOCK SUFICIENTE (> 5)
+            # ⭐ CASO 3: STOCK SUFICIENTE (> 5)
             elif instance.stock > UMBRAL_STOCK_BAJO:
-                if producto_anterior.stock <= UMBRAL_STOCK_BAJO:
+                if stock_anterior <= UMBRAL_STOCK_BAJO:
                     print(f"✅ Stock reabastecido por encima del umbral")
             
             print(f"{'='*60}\n")
-                
-        except Producto.DoesNotExist:
-            pass
+
+
+def despachar_alerta_stock(producto_id, alerta):
+    """
+    Encola la alerta indicada por clasificar_cambio_stock().
+    Se usa desde el signal post_save y desde el checkout (que actualiza
+    stock con UPDATE masivo y no dispara signals).
+    
+    - 'sin_stock': se envía de inmediato; el trabajo marca alerta_stock_enviada = True
+    - 'stock_bajo': se acumula en el resumen de la sucursal (core/alertas.py)
+    """
+    if alerta == 'sin_stock':
+        encolar('alerta.sin_stock', producto_id=producto_id)
+    elif alerta == 'stock_bajo':
+        from .alertas import registrar_stock_bajo
+        registrar_stock_bajo(producto_id)
 
 
 @receiver(post_save, sender=Producto)
+@omitible
 def notificar_cambios_stock(sender, instance, created, **kwargs):
     """
-    ⭐⭐⭐ NUEVO: Envía alertas SIN restricciones
-    1. Producto agotado (stock = 0) - Solo primera vez
-    2. Stock bajo (1-5) - SIEMPRE (cada vez que cambia el stock)
+    ⭐⭐⭐ Alertas de stock:
+    1. Producto agotado (stock = 0) - Inmediata, solo primera vez
+    2. Stock bajo (1-5) - Se agrupa en el resumen de la sucursal
     """
     # ⭐ Alerta de producto AGOTADO (stock = 0) - Solo primera vez
     if not created and hasattr(instance, '_sin_stock'):
@@ -153,54 +176,20 @@ def notificar_cambios_stock(sender, instance, created, **kwargs):
         print(f"   Stock actual: {instance.stock}")
         print(f"{'='*60}\n")
         
-        from .emails import enviar_alerta_sin_stock
-        
-        def enviar_y_marcar():
-            try:
-                resultado = enviar_alerta_sin_stock(instance.id)
-                if resultado:
-                    # Marcar como enviada para evitar spam de agotado
-                    Producto.objects.filter(pk=instance.pk).update(alerta_stock_enviada=True)
-                    print(f"✅ Alerta de SIN STOCK enviada")
-                else:
-                    print(f"❌ Alerta de SIN STOCK falló")
-            except Exception as e:
-                logger.error(f"❌ Error enviando alerta sin stock: {e}")
-                print(f"❌ Error enviando alerta sin stock: {e}")
-        
-        thread = threading.Thread(target=enviar_y_marcar)
-        thread.daemon = True
-        thread.start()
+        despachar_alerta_stock(instance.id, 'sin_stock')
         
         delattr(instance, '_sin_stock')
     
-    # ⭐⭐⭐ Alerta de STOCK BAJO (1-5) - SIEMPRE ENVIAR
+    # ⭐⭐⭐ Alerta de STOCK BAJO (1-5) - Al resumen de la sucursal
     if not created and hasattr(instance, '_stock_bajo'):
         print(f"\n{'='*60}")
-        print(f"📧 ENVIANDO ALERTA DE STOCK BAJO (SIN RESTRICCIONES)")
+        print(f"📋 REGISTRANDO STOCK BAJO PARA EL RESUMEN")
         print(f"   Producto: {instance.nombre}")
         print(f"   Stock actual: {instance.stock}")
         print(f"   Umbral: {UMBRAL_STOCK_BAJO}")
         print(f"{'='*60}\n")
         
-        from .emails import enviar_alerta_stock_bajo
-        
-        # ⭐ CAMBIO CRÍTICO: Ya NO marca como enviada
-        # Esto permite enviar alerta cada vez que cambia el stock
-        def enviar_sin_marcar():
-            try:
-                resultado = enviar_alerta_stock_bajo(instance.id)
-                if resultado:
-                    print(f"✅ Alerta de STOCK BAJO enviada exitosamente")
-                else:
-                    print(f"❌ Alerta de STOCK BAJO falló")
-            except Exception as e:
-                logger.error(f"❌ Error enviando alerta stock bajo: {e}")
-                print(f"❌ Error enviando alerta stock bajo: {e}")
-        
-        thread = threading.Thread(target=enviar_sin_marcar)
-        thread.daemon = True
-        thread.start()
+        despachar_alerta_stock(instance.id, 'stock_bajo')
         
         delattr(instance, '_stock_bajo')
 
@@ -210,31 +199,28 @@ def notificar_cambios_stock(sender, instance, created, **kwargs):
 # ============================================================================
 
 @receiver(pre_save, sender=Producto)
+@omitible
 def resetear_alerta_agotado(sender, instance, **kwargs):
     """
     ⭐⭐⭐ Solo resetea alerta de SIN STOCK (agotado)
     Ya NO resetea alerta de stock bajo porque se envía siempre
     """
     if instance.pk:
-        try:
-            producto_anterior = Producto.objects.get(pk=instance.pk)
+        stock_anterior = instance.valor_anterior('stock')
+        
+        # ⭐ Si el stock vuelve a tener unidades desde 0, resetear alerta de agotado
+        if stock_anterior == 0 and instance.stock > 0:
+            print(f"\n{'='*60}")
+            print(f"🔄 REABASTECIMIENTO DESDE AGOTADO")
+            print(f"   Producto: {instance.nombre}")
+            print(f"   Stock: {stock_anterior} → {instance.stock}")
+            print(f"{'='*60}")
+            print(f"✅ Reseteando alerta de SIN STOCK")
+            print(f"✅ Reactivando producto")
+            print(f"{'='*60}\n")
             
-            # ⭐ Si el stock vuelve a tener unidades desde 0, resetear alerta de agotado
-            if producto_anterior.stock == 0 and instance.stock > 0:
-                print(f"\n{'='*60}")
-                print(f"🔄 REABASTECIMIENTO DESDE AGOTADO")
-                print(f"   Producto: {instance.nombre}")
-                print(f"   Stock: {producto_anterior.stock} → {instance.stock}")
-                print(f"{'='*60}")
-                print(f"✅ Reseteando alerta de SIN STOCK")
-                print(f"✅ Reactivando producto")
-                print(f"{'='*60}\n")
-                
-                instance.alerta_stock_enviada = False
-                instance.disponible = True
-                
-        except Producto.DoesNotExist:
-            pass
+            instance.alerta_stock_enviada = False
+            instance.disponible = True
 
 
 # ============================================================================
@@ -242,6 +228,7 @@ def resetear_alerta_agotado(sender, instance, **kwargs):
 # ============================================================================
 
 @receiver(post_save, sender=Oferta)
+@omitible
 def notificar_nueva_oferta(sender, instance, created, **kwargs):
     """
     NO ENVIAR AQUÍ - Los productos aún no están asociados
@@ -255,6 +242,7 @@ def notificar_nueva_oferta(sender, instance, created, **kwargs):
 # ============================================================================
 
 @receiver(post_save, sender=Pedido)
+@omitible
 def notificar_pedido(sender, instance, created, **kwargs):
     """
     SOLO envía correos cuando se ACTUALIZA un pedido (cambio de estado)
@@ -269,21 +257,135 @@ def notificar_pedido(sender, instance, created, **kwargs):
 
 
 @receiver(pre_save, sender=Pedido)
+@omitible
 def detectar_cambio_estado_pedido(sender, instance, **kwargs):
     """
     Detecta cuando cambia el estado de un pedido
     """
-    if instance.pk:
-        try:
-            pedido_anterior = Pedido.objects.get(pk=instance.pk)
-            if pedido_anterior.estado != instance.estado:
-                instance._estado_cambio = True
-                print(f"🔄 Estado del pedido #{instance.id}: {pedido_anterior.estado} → {instance.estado}")
-        except Pedido.DoesNotExist:
-            pass
+    if instance.pk and instance.campo_cambio('estado'):
+        estado_anterior = instance.valor_anterior('estado')
+        if estado_anterior is not None:
+            instance._estado_cambio = True
+            instance._estado_anterior = estado_anterior
+            print(f"🔄 Estado del pedido #{instance.id}: {estado_anterior} → {instance.estado}")
+
+
+@receiver(post_save, sender=Pedido)
+@omitible
+def actualizar_ventas_diarias(sender, instance, created, **kwargs):
+    """
+    ⭐ Mantiene el acumulado VentaDiaria cuando un pedido entra o sale de 'entregado'
+    """
+    if not created and hasattr(instance, '_estado_anterior'):
+        from .rollups import registrar_transiciones
+        registrar_transiciones([(instance.id, instance._estado_anterior, instance.estado)])
+        
+        delattr(instance, '_estado_anterior')
+
+
+@receiver(pre_delete, sender=Pedido)
+@omitible
+def recordar_sucursales_pedido(sender, instance, **kwargs):
+    """Guarda las sucursales del pedido antes de que se borren sus detalles"""
+    instance._sucursales = set(
+        instance.detalles.values_list('producto__sucursal_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Pedido)
+@omitible
+def invalidar_reportes_pedido_eliminado(sender, instance, **kwargs):
+    """⭐ Un pedido eliminado cambia los conteos del dashboard"""
+    invalidar_reportes(getattr(instance, '_sucursales', ()))
+
+
+@receiver(post_save, sender=Producto)
+@omitible
+def invalidar_reportes_producto_creado(sender, instance, created, **kwargs):
+    """⭐ total_productos del dashboard cambia al crear un producto"""
+    if created:
+        invalidar_reportes([instance.sucursal_id])
+
+
+@receiver(post_delete, sender=Producto)
+@omitible
+def invalidar_reportes_producto_eliminado(sender, instance, **kwargs):
+    invalidar_reportes([instance.sucursal_id])
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+@omitible
+def invalidar_catalogo_sucursal(sender, instance, **kwargs):
+    """⭐ Productos y ofertas: nueva versión del catálogo de su sucursal"""
+    invalidar_catalogo([instance.sucursal_id])
+
+
+@receiver(post_save, sender=ProductoOferta)
+@receiver(post_delete, sender=ProductoOferta)
+@omitible
+def invalidar_catalogo_producto_oferta(sender, instance, **kwargs):
+    invalidar_catalogo([instance.oferta.sucursal_id])
+
+
+@receiver(post_save, sender=Sucursal)
+@receiver(post_delete, sender=Sucursal)
+@omitible
+def invalidar_catalogo_completo(sender, instance, **kwargs):
+    """⭐ Nombre/estado de una sucursal aparece en todos los listados"""
+    invalidar_todo_el_catalogo()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+@omitible
+def invalidar_destinatarios(sender, instance, update_fields=None, **kwargs):
+    """⭐ Rol, sucursal, email o is_active cambian las listas de admins a notificar"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # Un login no cambia ninguna lista
+    destinatarios.invalidar()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+@omitible
+def invalidar_usuario_autenticado(sender, instance, update_fields=None, **kwargs):
+    """⭐ Rol, sucursal o is_active cambian lo que ve JWTAutenticacionCacheada"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidar_usuarios([instance.pk])
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+@omitible
+def invalidar_conteos_de_sucursal(sender, instance, created=False, **kwargs):
+    """
+    ⭐ /sucursales/ (cacheado) muestra total_admins por sucursal: un admin
+    nuevo, eliminado, con otro rol/estado o movido de sucursal invalida la
+    sucursal actual y la anterior
+    """
+    if created or kwargs['signal'] is post_delete:
+        if instance.rol != 'cliente':
+            invalidar_catalogo([instance.sucursal_id])
+        return
+
+    if any(instance.campo_cambio(campo) for campo in Usuario.CAMPOS_RASTREADOS):
+        invalidar_catalogo([instance.valor_anterior('sucursal'), instance.sucursal_id])
+
+
+@receiver(post_save, sender=Sucursal)
+@receiver(pre_delete, sender=Sucursal)
+@omitible
+def invalidar_usuarios_de_sucursal(sender, instance, **kwargs):
+    """⭐ Los usuarios autenticados llevan su sucursal en el cache (pre_delete: antes del SET_NULL)"""
+    invalidar_usuarios(list(instance.usuarios.values_list('id', flat=True)))
 
 
 @receiver(post_save, sender=Pedido)
+@omitible
 def notificar_cambio_estado_pedido(sender, instance, created, **kwargs):
     """
     Envía notificación cuando el estado del pedido cambia
@@ -291,8 +393,7 @@ def notificar_cambio_estado_pedido(sender, instance, created, **kwargs):
     if not created and hasattr(instance, '_estado_cambio'):
         print(f"📧 Enviando notificación de cambio de estado para pedido #{instance.id}")
         
-        from .emails import enviar_actualizacion_estado
-        ejecutar_email_background(enviar_actualizacion_estado, instance.id)
+        encolar('email.estado_pedido', pedido_id=instance.id)
         
         delattr(instance, '_estado_cambio')
 
@@ -306,30 +407,30 @@ def notificar_cambio_estado_pedido(sender, instance, created, **kwargs):
 
 ⭐ CONFIGURACIÓN ACTUAL: 
 - Stock bajo = 5 o menos unidades
-- Alerta se envía SIEMPRE (sin límite de envíos)
+- Stock bajo: un resumen por sucursal cada ALERTA_STOCK_VENTANA_MINUTOS
+- Agotado (0): alerta inmediata
 
 ALERTAS DE STOCK:
 
 STOCK BAJO (1-5 unidades):
 1. Signal pre_save detecta: 1 <= stock <= 5
 2. Activa flag _stock_bajo SIEMPRE (sin verificar si ya se envió)
-3. Signal post_save: envía email en background
-4. NO marca alerta_stock_bajo_enviada (para permitir futuros envíos)
-5. ⭐ SE ENVÍA CADA VEZ que el stock cambia y está en 1-5
-
-Ejemplo de envíos:
-- Stock: 10 → 5 ✉️ Envía alerta
-- Stock: 5 → 4 ✉️ Envía alerta
-- Stock: 4 → 3 ✉️ Envía alerta
-- Stock: 3 → 2 ✉️ Envía alerta
-- Stock: 2 → 1 ✉️ Envía alerta
-- Stock: 1 → 0 ✉️ Envía alerta URGENTE (sin stock)
+3. Signal post_save: registra una AlertaStockPendiente (core/alertas.py)
+4. ⭐ Un solo Trabajo 'alerta.resumen_stock' por sucursal se ejecuta al
+   cerrar la ventana (ALERTA_STOCK_VENTANA_MINUTOS, 15 por defecto)
+5. El resumen lista todos los productos afectados con su stock ACTUAL
+
+Ejemplo (misma sucursal, dentro de la ventana):
+- Pan: 10 → 5, 5 → 4, 4 → 3   ┐
+- Queque: 6 → 2               ├ ✉️ UN resumen: Pan (3), Queque (2)
+- Galletas: 3 → 1             ┘
+- Stock: 1 → 0 ✉️ Envía alerta URGENTE inmediata (sin stock)
 
 SIN STOCK (0 unidades):
 1. Signal pre_save detecta: stock_anterior > 0 y stock_nuevo == 0
 2. Activa flag _sin_stock
-3. Signal post_save: envía email URGENTE en background
-4. Marca alerta_stock_enviada = True (para evitar spam)
+3. Signal post_save: encola el email URGENTE (Trabajo 'alerta.sin_stock')
+4. Al enviarse, el trabajo marca alerta_stock_enviada = True (para evitar spam)
 5. Marca producto.disponible = False
 6. ⭐ Solo se envía UNA VEZ hasta reabastecer
 
@@ -337,29 +438,54 @@ REABASTECIMIENTO:
 - Si stock pasa de 0 a >0: resetea alerta_stock_enviada y activa disponible
 - ⭐ Ya NO resetea alerta_stock_bajo_enviada porque se envía siempre
 
-CREACIÓN DE PEDIDO:
-1. PedidoCreateSerializer.create() reduce stock de productos
-2. Si stock = 0, marca producto como no disponible
-3. Signal detecta cambio y envía alerta si stock <= 5
-4. Envía emails de confirmación en background
+CREACIÓN DE PEDIDO (core/checkout.py):
+1. procesar_checkout() bloquea todos los productos del carrito en una consulta
+2. Reduce stock con un solo UPDATE condicional (F()); si stock = 0, marca no disponible
+3. Como el UPDATE no dispara signals, el checkout llama a despachar_alerta_stock()
+   dentro de la misma transacción si stock <= 5
+4. Encola el email de confirmación en la misma transacción del pedido
 
 CANCELACIÓN DE PEDIDO:
 1. Signal pre_save detecta cambio a estado 'cancelado'
 2. Restaura stock automáticamente de todos los productos
 3. Si producto estaba agotado, lo reactiva
-4. Signal post_save envía email a admins notificando cancelación
+4. Signal post_save encola email a admins notificando cancelación
+
+ACUMULADO DE VENTAS (core/rollups.py):
+1. Signal post_save detecta pedido que entra o sale de 'entregado'
+2. Suma o resta sus líneas en VentaDiaria (día, sucursal, producto)
+3. Los reportes leen VentaDiaria en lugar de todo el historial
+4. Eliminar un pedido entregado NO resta (la venta se conserva)
+
+CACHE DE REPORTES (core/cache_reportes.py):
+1. Cambios en 'entregado', pedidos eliminados y productos creados/eliminados
+   suben la versión del cache de sus sucursales y de 'todas'
+2. El dashboard se recalcula solo cuando cambia la versión o el día
+
+CACHE DE CATÁLOGO (core/cache_catalogo.py):
+1. Productos, ofertas y sus relaciones suben la versión de su sucursal y de
+   'todas'; los cambios de stock con UPDATE (checkout, reservas) también
+2. Cambios de sucursales invalidan todo el catálogo
+3. Admins creados/eliminados o con otro rol, sucursal o is_active invalidan
+   la sucursal actual y la anterior (total_admins en /sucursales/)
+4. Los listados responden 304 si el cliente ya tiene la versión (ETag)
+
+CACHE DE DESTINATARIOS (core/emails.py):
+1. Los emails de admins por sucursal se guardan en el cache compartido
+2. Guardar o eliminar un usuario (salvo el login) invalida todas las listas
 
 VENTAJAS:
-✅ Admins reciben alerta cada vez que stock está bajo
+✅ Admins reciben un resumen por sucursal en lugar de un email por venta
 ✅ Permiten monitoreo constante del inventario
 ✅ Útil para detectar alta demanda de productos
 ✅ Stock se reduce/restaura correctamente
 ✅ Productos agotados se reactivan automáticamente
-✅ Todo en background sin bloquear requests
+✅ Todo en background sin bloquear requests (cola persistente core/jobs.py)
+✅ Si la transacción se revierte, no se envía ningún email
 ✅ Logs detallados para debugging
 
 CONSIDERACIÓN:
 ⚠️ Más emails = más notificaciones
 ⚠️ Asegúrate de que los admins estén preparados para recibir alertas frecuentes
-⚠️ Considera usar un sistema de consolidación diaria si hay demasiados emails
+⚠️ Ajusta ALERTA_STOCK_VENTANA_MINUTOS si los resúmenes llegan muy seguido
 """
\ No newline at end of file
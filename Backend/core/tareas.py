@@ -0,0 +1,100 @@
+# Backend/core/tareas.py
+# ⭐ Tipos de trabajo que ejecuta la cola (core/jobs.py)
+#
+# Cada función recibe el payload de encolar() como kwargs. Las funciones de
+# core/emails.py retornan False si el envío falla; aquí se convierte en una
+# excepción para que el trabajo se reintente con backoff.
+
+from .jobs import tarea
+from .models import Producto
+
+
+class EnvioFallido(Exception):
+    pass
+
+
+def _exigir(resultado, descripcion):
+    if not resultado:
+        raise EnvioFallido(f"No se pudo enviar: {descripcion}")
+
+
+# ============================================================================
+# EMAILS A CLIENTES
+# ============================================================================
+
+@tarea('email.nuevo_producto', max_intentos=3, por_minuto=10)
+def email_nuevo_producto(producto_id):
+    from .emails import enviar_notificacion_nuevo_producto
+    _exigir(enviar_notificacion_nuevo_producto(producto_id), f"nuevo producto #{producto_id}")
+
+
+@tarea('email.oferta', max_intentos=3, por_minuto=10)
+def email_oferta(oferta_id):
+    from .emails import enviar_notificacion_oferta
+    _exigir(enviar_notificacion_oferta(oferta_id), f"oferta #{oferta_id}")
+
+
+@tarea('difusion.lote', por_minuto=30)
+def difusion_lote(difusion_id, desde_id, hasta_id):
+    from .difusiones import enviar_lote_difusion
+    _exigir(
+        enviar_lote_difusion(difusion_id, desde_id, hasta_id),
+        f"lote {desde_id}-{hasta_id} de la difusión #{difusion_id}"
+    )
+
+
+@tarea('email.confirmacion_pedido', por_minuto=120)
+def email_confirmacion_pedido(pedido_id):
+    from .emails import enviar_confirmacion_pedido
+    _exigir(enviar_confirmacion_pedido(pedido_id), f"confirmación del pedido #{pedido_id}")
+
+
+@tarea('email.estado_pedido', por_minuto=120)
+def email_estado_pedido(pedido_id):
+    from .emails import enviar_actualizacion_estado
+    _exigir(enviar_actualizacion_estado(pedido_id), f"estado del pedido #{pedido_id}")
+
+
+@tarea('email.recuperar_password', max_intentos=3, por_minuto=60)
+def email_recuperar_password(email):
+    from .emails import enviar_recuperacion_password
+    _exigir(enviar_recuperacion_password(email), f"recuperación de contraseña de {email}")
+
+
+@tarea('email.password_actualizado', max_intentos=3, por_minuto=60)
+def email_password_actualizado(usuario_id):
+    from .emails import enviar_password_actualizado
+    _exigir(enviar_password_actualizado(usuario_id), f"contraseña actualizada del usuario #{usuario_id}")
+
+
+# ============================================================================
+# EMAILS A ADMINISTRADORES
+# ============================================================================
+
+@tarea('email.pedido_cancelado', por_minuto=60)
+def email_pedido_cancelado(pedido_id):
+    from .emails import enviar_notificacion_pedido_cancelado
+    _exigir(enviar_notificacion_pedido_cancelado(pedido_id), f"cancelación del pedido #{pedido_id}")
+
+
+@tarea('alerta.sin_stock', por_minuto=60)
+def alerta_sin_stock(producto_id):
+    from .emails import enviar_alerta_sin_stock
+    _exigir(enviar_alerta_sin_stock(producto_id), f"alerta sin stock del producto #{producto_id}")
+
+    # Marcar como enviada para evitar spam de agotado
+    Producto.objects.filter(pk=producto_id).update(alerta_stock_enviada=True)
+
+
+@tarea('alerta.resumen_stock', por_minuto=60)
+def alerta_resumen_stock(sucursal_id):
+    from .alertas import enviar_resumen_sucursal
+    _exigir(enviar_resumen_sucursal(sucursal_id), f"resumen de stock bajo de la sucursal #{sucursal_id}")
+
+
+# Alerta individual (anterior a los resúmenes). Se mantiene registrada para
+# que los trabajos que ya estaban en cola puedan terminar.
+@tarea('alerta.stock_bajo', por_minuto=60)
+def alerta_stock_bajo(producto_id):
+    from .emails import enviar_alerta_stock_bajo
+    _exigir(enviar_alerta_stock_bajo(producto_id), f"alerta stock bajo del producto #{producto_id}")
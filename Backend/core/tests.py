@@ -1,3 +1,1879 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 
-# Create your tests here.
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import email_backend, jobs
+from core.cache import ESPACIOS, EspacioCache, SinGuardar
+from core.emails import obtener_admins_por_sucursal
+from core.email_backend import SendGridBackend, SendGridError
+from core.models import (
+    DetallePedido, Oferta, Pedido, Producto, ProductoOferta, ReservaStock, Sucursal, Trabajo, Usuario,
+)
+from core.rastreo import skip_signals
+
+
+# ============================================================================
+# SERVIDOR SENDGRID FALSO
+# ============================================================================
+
+class FakeSendGridHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: permite verificar reutilización de conexiones
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers['Content-Length']))
+        payload = json.loads(cuerpo)
+        destinatarios = [p['to'][0]['email'] for p in payload['personalizations']]
+
+        with self.server.lock:
+            self.server.peticiones.append({
+                'puerto_cliente': self.client_address[1],
+                'autorizacion': self.headers.get('Authorization'),
+                'payload': payload,
+            })
+
+        status = 500 if any(email.startswith('falla') for email in destinatarios) else 202
+        respuesta = b'' if status == 202 else b'{"errors": [{"message": "error simulado"}]}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def log_message(self, *args):
+        pass
+
+
+class SendGridBackendTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), FakeSendGridHandler)
+        cls.servidor.lock = threading.Lock()
+        cls.servidor.peticiones = []
+        cls.hilo = threading.Thread(target=cls.servidor.serve_forever, daemon=True)
+        cls.hilo.start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_address[1]}/v3/mail/send'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.servidor.peticiones.clear()
+        # Sesión nueva por test para no reutilizar conexiones de otro test
+        email_backend._sesion = None
+        ajustes = override_settings(
+            SENDGRID_API_KEY='clave-prueba',
+            SENDGRID_API_URL=self.url,
+            SENDGRID_MAX_DESTINATARIOS=1000,
+            SENDGRID_CONCURRENCIA=4,
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def mensaje(self, destinatarios, asunto='Prueba'):
+        email = EmailMultiAlternatives(
+            subject=asunto,
+            body='texto',
+            from_email='Panadería <noreply@panaderia.test>',
+            to=destinatarios,
+        )
+        email.attach_alternative('<p>html</p>', 'text/html')
+        return email
+
+    def test_una_personalization_por_destinatario(self):
+        backend = SendGridBackend()
+        enviados = backend.send_messages([self.mensaje(['a@x.com', 'b@x.com'])])
+
+        self.assertEqual(enviados, 1)
+        self.assertEqual(len(self.servidor.peticiones), 1)
+        peticion = self.servidor.peticiones[0]
+        self.assertEqual(peticion['autorizacion'], 'Bearer clave-prueba')
+        self.assertEqual(
+            peticion['payload']['personalizations'],
+            [{'to': [{'email': 'a@x.com'}]}, {'to': [{'email': 'b@x.com'}]}]
+        )
+        self.assertEqual(peticion['payload']['from'], {'email': 'noreply@panaderia.test', 'name': 'Panadería'})
+        self.assertEqual([c['type'] for c in peticion['payload']['content']], ['text/plain', 'text/html'])
+
+    def test_lotes_respetan_limite_de_destinatarios(self):
+        destinatarios = [f'cliente{i}@x.com' for i in range(2500)]
+        backend = SendGridBackend()
+        enviados = backend.send_messages([self.mensaje(destinatarios)])
+
+        self.assertEqual(enviados, 1)
+        tamanos = sorted(len(p['payload']['personalizations']) for p in self.servidor.peticiones)
+        self.assertEqual(tamanos, [500, 1000, 1000])
+        recibidos = [
+            pers['to'][0]['email']
+            for p in self.servidor.peticiones
+            for pers in p['payload']['personalizations']
+        ]
+        self.assertCountEqual(recibidos, destinatarios)
+        self.assertEqual(len(backend.resultados), 3)
+        self.assertTrue(all(r.exitoso for r in backend.resultados))
+
+    @override_settings(SENDGRID_CONCURRENCIA=1, SENDGRID_MAX_DESTINATARIOS=2)
+    def test_reutiliza_la_conexion_http(self):
+        mensajes = [self.mensaje([f'{n}a@x.com', f'{n}b@x.com', f'{n}c@x.com']) for n in range(3)]
+        SendGridBackend().send_messages(mensajes[:2])
+        SendGridBackend().send_messages(mensajes[2:])
+
+        self.assertEqual(len(self.servidor.peticiones), 6)
+        puertos = {p['puerto_cliente'] for p in self.servidor.peticiones}
+        self.assertEqual(len(puertos), 1)
+
+    def test_reporta_resultado_por_lote(self):
+        backend = SendGridBackend(fail_silently=True)
+        enviados = backend.send_messages([
+            self.mensaje(['ok@x.com'], asunto='Bueno'),
+            self.mensaje(['falla@x.com'], asunto='Malo'),
+        ])
+
+        self.assertEqual(enviados, 1)
+        por_asunto = {r.mensaje.subject: r for r in backend.resultados}
+        self.assertTrue(por_asunto['Bueno'].exitoso)
+        self.assertFalse(por_asunto['Malo'].exitoso)
+        self.assertEqual(por_asunto['Malo'].status, 500)
+
+    def test_lanza_error_si_falla_un_lote(self):
+        with self.assertRaises(SendGridError) as contexto:
+            SendGridBackend().send_messages([self.mensaje(['falla@x.com', 'ok@x.com'])])
+        self.assertEqual(len(contexto.exception.resultados), 1)
+
+
+# ============================================================================
+# CONSULTAS DEL LISTADO DE PEDIDOS
+# ============================================================================
+
+class ListadoPedidosConsultasTests(TestCase):
+    """El listado de pedidos hace el mismo número de consultas sin importar cuántos haya"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.sucursales = [
+                Sucursal.objects.create(nombre=f'Sucursal {n}', direccion='Centro', telefono='2222-2222')
+                for n in range(2)
+            ]
+            cls.productos = [
+                Producto.objects.create(nombre=f'Pan {n}', precio=1000 + n, stock=50, sucursal=cls.sucursales[n % 2])
+                for n in range(6)
+            ]
+            hoy = timezone.now().date()
+            oferta = Oferta.objects.create(
+                titulo='Oferta', descripcion='2x1', precio_oferta=1500, sucursal=cls.sucursales[0],
+                fecha_inicio=hoy - timedelta(days=1), fecha_fin=hoy + timedelta(days=1),
+            )
+            ProductoOferta.objects.create(oferta=oferta, producto=cls.productos[0])
+
+            cls.admin = Usuario.objects.create_user('admin_general', 'admin@x.com', 'x', rol='administrador_general')
+            cls.clientes = [
+                Usuario.objects.create_user(f'cliente{n}', f'cliente{n}@x.com', 'x') for n in range(3)
+            ] + [
+                Usuario.objects.create_user('admin_suc', 'suc@x.com', 'x', rol='administrador', sucursal=cls.sucursales[1])
+            ]
+
+    def crear_pedidos(self, cantidad):
+        with skip_signals():
+            for n in range(cantidad):
+                pedido = Pedido.objects.create(usuario=self.clientes[n % len(self.clientes)], total=0)
+                DetallePedido.objects.bulk_create([
+                    DetallePedido(pedido=pedido, producto=producto, cantidad=1, precio_unitario=producto.precio)
+                    for producto in self.productos[n % 3:n % 3 + 3]
+                ])
+
+    def consultas_del_listado(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get('/api/pedidos/')
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.json()
+
+    def test_consultas_constantes(self):
+        # Un pedido por usuario: el usuario anidado se serializa una vez por usuario
+        self.crear_pedidos(len(self.clientes))
+        pocas, datos = self.consultas_del_listado()
+        self.assertEqual(len(datos), 4)
+
+        self.crear_pedidos(40)
+        muchas, datos = self.consultas_del_listado()
+        self.assertEqual(len(datos), 44)
+
+        self.assertEqual(pocas, muchas)
+
+    def test_ofertas_desde_el_indice(self):
+        self.crear_pedidos(3)
+        _, datos = self.consultas_del_listado()
+        for pedido in datos:
+            en_oferta = [d['es_oferta'] for d in pedido['detalles']]
+            self.assertEqual(en_oferta, [d['producto']['id'] == self.productos[0].id for d in pedido['detalles']])
+            self.assertEqual(pedido['es_oferta'], any(en_oferta))
+            self.assertTrue(all(d['sucursal_nombre'].startswith('Sucursal') for d in pedido['detalles']))
+
+
+# ============================================================================
+# PRESUPUESTO DE CONSULTAS POR ENDPOINT
+# ============================================================================
+
+# Máximo de consultas por endpoint (el peor caso entre roles, incluida la
+# consulta del usuario del token JWT con el cache vacío). Si un cambio
+# supera el presupuesto, o el número crece con los datos, hay un N+1.
+PRESUPUESTO_LECTURAS = {
+    'usuarios-list': 3,
+    'usuarios-detail': 2,
+    'usuarios-me': 2,
+    'sucursales-list': 2,
+    'sucursales-detail': 2,
+    'sucursales-activas': 2,
+    'productos-list': 3,
+    'productos-detail': 3,
+    'ofertas-list': 4,
+    'ofertas-detail': 4,
+    'pedidos-list': 4,
+    'pedidos-detail': 4,
+    'detalles-list': 3,
+    'detalles-detail': 3,
+    'reportes-estadisticas': 7,
+    'reportes-exportar': 4,
+    'reportes-ventas': 2,
+    'reportes-cache': 1,
+    'metrics': 1,
+}
+
+PRESUPUESTO_ESCRITURAS = {
+    'pedidos-create': 15,
+    'pedidos-cambiar-estado': 8,
+    'pedidos-cancelar': 13,
+    'productos-reservar': 11,
+    'productos-liberar-reserva': 6,
+    'productos-create': 5,
+    'productos-update': 4,
+    'productos-delete': 8,
+    'ofertas-create': 16,
+    'ofertas-update': 6,
+    'ofertas-delete': 5,
+    'sucursales-create': 6,
+    'sucursales-update': 5,
+    'sucursales-delete': 11,
+    'usuarios-create': 3,
+    'usuarios-update': 3,
+    'usuarios-delete': 12,
+}
+
+# Estado HTTP esperado por rol: (anonimo, cliente, administrador, administrador_general)
+ESTADOS_LECTURAS = {
+    'usuarios-list': (401, 200, 200, 200),
+    'usuarios-detail': (401, 200, 200, 200),          # el cliente pide su propio perfil
+    'usuarios-me': (401, 200, 200, 200),
+    'sucursales-list': (200, 200, 200, 200),
+    'sucursales-detail': (200, 200, 200, 200),
+    'sucursales-activas': (200, 200, 200, 200),
+    'productos-list': (200, 200, 200, 200),
+    'productos-detail': (200, 200, 200, 200),
+    'ofertas-list': (200, 200, 200, 200),
+    'ofertas-detail': (200, 200, 200, 200),
+    'pedidos-list': (401, 200, 200, 200),
+    'pedidos-detail': (401, 200, 200, 200),           # pedido del cliente en la sucursal del admin
+    'detalles-list': (401, 200, 200, 200),
+    'detalles-detail': (401, 200, 200, 200),
+    'reportes-estadisticas': (401, 403, 200, 200),
+    'reportes-exportar': (401, 403, 200, 200),
+    'reportes-ventas': (401, 403, 200, 200),
+    'reportes-cache': (401, 403, 200, 200),
+    'metrics': (401, 403, 403, 200),
+}
+
+# Las escrituras de pedidos y reservas se miden con un solo rol (estado único)
+ESTADOS_ESCRITURAS = {
+    'pedidos-create': 201,
+    'pedidos-cambiar-estado': 200,
+    'pedidos-cancelar': 200,
+    'productos-reservar': 201,
+    'productos-liberar-reserva': 200,
+    'productos-create': (401, 403, 201, 201),
+    'productos-update': (401, 403, 200, 200),
+    'productos-delete': (401, 403, 204, 204),
+    'ofertas-create': (401, 403, 201, 201),
+    'ofertas-update': (401, 403, 200, 200),
+    'ofertas-delete': (401, 403, 204, 204),
+    'sucursales-create': (401, 403, 403, 201),
+    'sucursales-update': (401, 403, 403, 200),
+    'sucursales-delete': (401, 403, 403, 204),
+    'usuarios-create': (401, 403, 403, 201),
+    'usuarios-update': (401, 403, 403, 200),
+    'usuarios-delete': (401, 404, 403, 204),          # el cliente solo ve su propio usuario
+}
+
+
+class PresupuestoConsultasTests(TestCase):
+    """
+    Cada endpoint del router y de reportes, con cada rol, hace un número fijo
+    de consultas: se mide con pocos datos, se multiplican los datos y se
+    vuelve a medir.
+    """
+
+    ROLES = ('anonimo', 'cliente', 'administrador', 'administrador_general')
+
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.sucursales = [
+                Sucursal.objects.create(nombre=f'Sucursal {n}', direccion='Centro', telefono='2222-2222')
+                for n in range(3)
+            ]
+            cls.usuarios = {
+                'cliente': Usuario.objects.create_user('cliente', 'cliente@x.com', 'x'),
+                'administrador': Usuario.objects.create_user(
+                    'admin', 'admin@x.com', 'x', rol='administrador', sucursal=cls.sucursales[0]
+                ),
+                'administrador_general': Usuario.objects.create_user(
+                    'general', 'general@x.com', 'x', rol='administrador_general'
+                ),
+            }
+            cls.lote = 0
+        cls.tokens = {rol: str(RefreshToken.for_user(usuario).access_token) for rol, usuario in cls.usuarios.items()}
+        cls.sembrar(productos_por_sucursal=3, clientes=2, pedidos=6)
+
+    @classmethod
+    def sembrar(cls, productos_por_sucursal, clientes, pedidos):
+        """Carga masiva sin signals (bulk_create): productos, ofertas, clientes y pedidos con 3 líneas"""
+        cls.lote += 1
+        lote = cls.lote
+        hoy = timezone.now().date()
+
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Pan {lote}-{n}', precio=500 + n, stock=1000, sucursal=sucursal)
+            for sucursal in cls.sucursales
+            for n in range(productos_por_sucursal)
+        ])
+        ofertas = Oferta.objects.bulk_create([
+            Oferta(
+                titulo=f'Oferta {lote}-{sucursal.id}', descripcion='2x1', precio_oferta=900, sucursal=sucursal,
+                fecha_inicio=hoy - timedelta(days=1), fecha_fin=hoy + timedelta(days=5),
+            )
+            for sucursal in cls.sucursales
+        ])
+        ProductoOferta.objects.bulk_create([
+            ProductoOferta(oferta=oferta, producto=producto)
+            for oferta in ofertas
+            for producto in productos
+            if producto.sucursal_id == oferta.sucursal_id
+        ][::2])
+
+        compradores = Usuario.objects.bulk_create([
+            Usuario(username=f'comprador{lote}-{n}', email=f'comprador{lote}-{n}@x.com', password='!')
+            for n in range(clientes)
+        ]) + [cls.usuarios['cliente']]
+        estados = [estado for estado, _ in Pedido.ESTADOS]
+        nuevos = Pedido.objects.bulk_create([
+            Pedido(usuario=compradores[n % len(compradores)], estado=estados[n % len(estados)], total=1500)
+            for n in range(pedidos)
+        ])
+        DetallePedido.objects.bulk_create([
+            DetallePedido(
+                pedido=pedido,
+                producto=productos[(n + k) % len(productos)],
+                cantidad=1 + k,
+                precio_unitario=productos[(n + k) % len(productos)].precio
+            )
+            for n, pedido in enumerate(nuevos)
+            for k in range(3)
+        ])
+
+    # ------------------------------------------------------------------------
+
+    def cliente_http(self, rol):
+        # Token JWT real: la autenticación (y su consulta con el cache vacío) entra en la cuenta
+        cliente = APIClient()
+        if rol != 'anonimo':
+            cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens[rol]}')
+        return cliente
+
+    def contar(self, rol, metodo, url, datos=None):
+        # Cache vacío: se mide el camino completo (sin aciertos de cache)
+        cache.clear()
+        cliente = self.cliente_http(rol)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = getattr(cliente, metodo)(url, datos, format='json')
+        if hasattr(respuesta, 'streaming_content'):
+            with CaptureQueriesContext(connection) as en_streaming:
+                b''.join(respuesta.streaming_content)
+            return respuesta.status_code, len(consultas) + len(en_streaming)
+        return respuesta.status_code, len(consultas)
+
+    def lecturas(self):
+        """(nombre, url) de todos los GET; los detalles apuntan a objetos de la sucursal del admin"""
+        sucursal = self.sucursales[0]
+        producto = Producto.objects.filter(sucursal=sucursal).first()
+        oferta = Oferta.objects.filter(sucursal=sucursal).first()
+        pedido = Pedido.objects.filter(usuario=self.usuarios['cliente'], detalles__producto__sucursal=sucursal).first()
+        detalle = pedido.detalles.first()
+        return [
+            ('usuarios-list', '/api/usuarios/'),
+            ('usuarios-detail', f"/api/usuarios/{self.usuarios['cliente'].id}/"),
+            ('usuarios-me', '/api/usuarios/me/'),
+            ('sucursales-list', '/api/sucursales/'),
+            ('sucursales-detail', f'/api/sucursales/{sucursal.id}/'),
+            ('sucursales-activas', '/api/sucursales/activas/'),
+            ('productos-list', '/api/productos/'),
+            ('productos-detail', f'/api/productos/{producto.id}/'),
+            ('ofertas-list', '/api/ofertas/'),
+            ('ofertas-detail', f'/api/ofertas/{oferta.id}/'),
+            ('pedidos-list', '/api/pedidos/'),
+            ('pedidos-detail', f'/api/pedidos/{pedido.id}/'),
+            ('detalles-list', '/api/detalles-pedido/'),
+            ('detalles-detail', f'/api/detalles-pedido/{detalle.id}/'),
+            ('reportes-estadisticas', '/api/reportes/estadisticas/'),
+            ('reportes-exportar', '/api/reportes/exportar/'),
+            ('reportes-ventas', '/api/reportes/ventas/'),
+            ('reportes-cache', '/api/reportes/cache/'),
+            ('metrics', '/api/metrics/'),
+        ]
+
+    def medir_lecturas(self):
+        return {
+            (rol, nombre): self.contar(rol, 'get', url)
+            for nombre, url in self.lecturas()
+            for rol in self.ROLES
+        }
+
+    def test_lecturas_con_presupuesto_fijo(self):
+        pocos = self.medir_lecturas()
+        self.sembrar(productos_por_sucursal=80, clientes=60, pedidos=1500)
+        muchos = self.medir_lecturas()
+
+        for (rol, nombre), (status, consultas) in muchos.items():
+            with self.subTest(endpoint=nombre, rol=rol):
+                self.assertEqual(status, ESTADOS_LECTURAS[nombre][self.ROLES.index(rol)])
+                self.assertEqual(consultas, pocos[(rol, nombre)][1], 'el número de consultas crece con los datos')
+                self.assertLessEqual(consultas, PRESUPUESTO_LECTURAS[nombre])
+
+    def medir_escrituras(self):
+        cliente = self.usuarios['cliente']
+        productos = list(Producto.objects.filter(sucursal=self.sucursales[0]).order_by('-id')[:3])
+        items = [{'producto': producto.id, 'cantidad': 1} for producto in productos]
+        resultados = {}
+
+        resultados['cliente', 'pedidos-create'] = self.contar(
+            'cliente', 'post', '/api/pedidos/', {'items': items, 'tipo_entrega': 'recoger'}
+        )
+        pedido = Pedido.objects.filter(usuario=cliente).latest('id')
+
+        resultados['administrador_general', 'pedidos-cambiar-estado'] = self.contar(
+            'administrador_general', 'patch', f'/api/pedidos/{pedido.id}/cambiar_estado/', {'estado': 'en_preparacion'}
+        )
+        with skip_signals():
+            Pedido.objects.filter(pk=pedido.pk).update(estado='recibido')
+        resultados['cliente', 'pedidos-cancelar'] = self.contar('cliente', 'post', f'/api/pedidos/{pedido.id}/cancelar/')
+
+        resultados['cliente', 'productos-reservar'] = self.contar(
+            'cliente', 'post', f'/api/productos/{productos[0].id}/reservar/', {'cantidad': 2}
+        )
+        reserva = cliente.reservas.latest('id')
+        resultados['cliente', 'productos-liberar-reserva'] = self.contar(
+            'cliente', 'post', f'/api/productos/{productos[0].id}/liberar-reserva/', {'reserva': reserva.id}
+        )
+
+        for rol in self.ROLES:
+            for nombre, (metodo, url, datos) in self.escrituras_del_catalogo(productos[0]).items():
+                resultados[rol, nombre] = self.contar(rol, metodo, url, datos)
+        return resultados
+
+    def escrituras_del_catalogo(self, producto):
+        """
+        (método, url, datos) de crear/editar/eliminar productos, ofertas,
+        sucursales y usuarios. Cada llamada crea sus propios objetos (de la
+        sucursal del admin) para editar y eliminar.
+        """
+        self.lote += 1
+        lote = self.lote
+        sucursal = self.sucursales[0]
+        hoy = timezone.now().date()
+        with skip_signals():
+            producto_editar, producto_eliminar = Producto.objects.bulk_create([
+                Producto(nombre=f'Editable {lote}-{n}', precio=500, stock=10, sucursal=sucursal) for n in range(2)
+            ])
+            oferta_editar, oferta_eliminar = Oferta.objects.bulk_create([
+                Oferta(
+                    titulo=f'Editable {lote}-{n}', descripcion='2x1', precio_oferta=900, sucursal=sucursal,
+                    fecha_inicio=hoy, fecha_fin=hoy + timedelta(days=5),
+                )
+                for n in range(2)
+            ])
+            sucursal_eliminar = Sucursal.objects.create(nombre=f'Vacía {lote}', direccion='Norte', telefono='3333-3333')
+            usuario_editar, usuario_eliminar = Usuario.objects.bulk_create([
+                Usuario(username=f'editable{lote}-{n}', email=f'editable{lote}-{n}@x.com', password='!') for n in range(2)
+            ])
+
+        return {
+            'productos-create': ('post', '/api/productos/', {
+                'nombre': f'Nuevo {lote}', 'precio': 700, 'stock': 20, 'sucursal': sucursal.id,
+            }),
+            'productos-update': ('patch', f'/api/productos/{producto_editar.id}/', {'precio': 650}),
+            'productos-delete': ('delete', f'/api/productos/{producto_eliminar.id}/', None),
+            'ofertas-create': ('post', '/api/ofertas/', {
+                'titulo': f'Nueva {lote}', 'descripcion': '3x2', 'precio_oferta': 1200, 'sucursal': sucursal.id,
+                'fecha_inicio': str(hoy), 'fecha_fin': str(hoy + timedelta(days=3)),
+                'productos_data': [{'producto_id': producto.id, 'cantidad': 2}],
+            }),
+            'ofertas-update': ('patch', f'/api/ofertas/{oferta_editar.id}/', {'precio_oferta': 800}),
+            'ofertas-delete': ('delete', f'/api/ofertas/{oferta_eliminar.id}/', None),
+            'sucursales-create': ('post', '/api/sucursales/', {
+                'nombre': f'Nueva {lote}', 'direccion': 'Sur', 'telefono': '4444-4444',
+            }),
+            'sucursales-update': ('patch', f'/api/sucursales/{sucursal.id}/', {'telefono': '2222-0000'}),
+            'sucursales-delete': ('delete', f'/api/sucursales/{sucursal_eliminar.id}/', None),
+            'usuarios-create': ('post', '/api/usuarios/', {
+                'username': f'nuevo{lote}', 'email': f'nuevo{lote}@x.com', 'password': 'x', 'rol': 'cliente',
+            }),
+            'usuarios-update': ('patch', f'/api/usuarios/{usuario_editar.id}/', {'first_name': 'Ana'}),
+            'usuarios-delete': ('delete', f'/api/usuarios/{usuario_eliminar.id}/', None),
+        }
+
+    def test_escrituras_con_presupuesto_fijo(self):
+        pocos = self.medir_escrituras()
+        self.sembrar(productos_por_sucursal=80, clientes=60, pedidos=1500)
+        muchos = self.medir_escrituras()
+
+        for (rol, nombre), (status, consultas) in muchos.items():
+            with self.subTest(endpoint=nombre, rol=rol):
+                esperado = ESTADOS_ESCRITURAS[nombre]
+                if isinstance(esperado, tuple):
+                    esperado = esperado[self.ROLES.index(rol)]
+                self.assertEqual(status, esperado)
+                self.assertEqual(consultas, pocos[rol, nombre][1], 'el número de consultas crece con los datos')
+                self.assertLessEqual(consultas, PRESUPUESTO_ESCRITURAS[nombre])
+
+
+# ============================================================================
+# MÉTRICAS POR PETICIÓN (Server-Timing)
+# ============================================================================
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.general = Usuario.objects.create_user('general', 'g@x.com', 'x', rol='administrador_general')
+            cls.admin = Usuario.objects.create_user(
+                'admin', 'a@x.com', 'x', rol='administrador', sucursal=cls.sucursal
+            )
+
+    def server_timing(self, usuario=None):
+
+        cliente = APIClient()
+        if usuario:
+            # JWT real: el usuario se conoce recién dentro de la vista de DRF
+            cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(usuario).access_token}')
+        return cliente.get('/api/sucursales/').get('Server-Timing')
+
+    def test_solo_se_expone_segun_la_configuracion(self):
+        with override_settings(METRICAS_SERVER_TIMING='nadie'):
+            self.assertIsNone(self.server_timing())
+            self.assertIsNone(self.server_timing(self.general))
+
+        with override_settings(METRICAS_SERVER_TIMING='admins'):
+            self.assertIsNone(self.server_timing())
+            self.assertIsNone(self.server_timing(self.admin))
+            self.assertIn('consultas', self.server_timing(self.general))
+
+        with override_settings(METRICAS_SERVER_TIMING='todos'):
+            self.assertIn('consultas', self.server_timing())
+
+    def test_las_muestras_se_registran_aunque_no_haya_header(self):
+        from core.metricas import colector
+
+        colector.reiniciar()
+        with override_settings(METRICAS_SERVER_TIMING='nadie'):
+            self.server_timing()
+        self.assertEqual(colector.resumen()['GET sucursal-list']['peticiones'], 1)
+
+    def test_rutas_desconocidas_comparten_una_sola_entrada(self):
+        from core.metricas import colector
+
+        colector.reiniciar()
+        cliente = APIClient()
+        for ruta in ('/wp-admin/', '/.env', '/api/no-existe/', '/api/../etc/passwd'):
+            self.assertEqual(cliente.get(ruta).status_code, 404)
+        cliente.post('/phpmyadmin/')
+
+        resumen = colector.resumen()
+        self.assertEqual(set(resumen), {'GET <sin ruta>', 'POST <sin ruta>'})
+        self.assertEqual(resumen['GET <sin ruta>']['peticiones'], 4)
+
+    @override_settings(METRICAS_MAX_RUTAS=2)
+    def test_las_rutas_distintas_tienen_un_limite(self):
+        from core.metricas import OTRAS_RUTAS, colector
+
+        colector.reiniciar()
+        cliente = APIClient()
+        cliente.get('/api/sucursales/')
+        cliente.get('/no-existe/')
+        cliente.get('/api/productos/')
+        cliente.get('/api/ofertas/')
+
+        resumen = colector.resumen()
+        self.assertEqual(set(resumen), {'GET sucursal-list', 'GET <sin ruta>', OTRAS_RUTAS})
+        self.assertEqual(resumen[OTRAS_RUTAS]['peticiones'], 2)
+
+
+# ============================================================================
+# CACHE DEL CATÁLOGO (ETag / 304)
+# ============================================================================
+
+class CacheCatalogoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.otra = Sucursal.objects.create(nombre='Norte', direccion='Norte', telefono='2222-2223')
+            cls.producto = Producto.objects.create(nombre='Pan', precio=500, stock=10, sucursal=cls.sucursal)
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = APIClient()
+        self.url = f'/api/productos/?sucursal={self.sucursal.id}'
+
+    def test_segunda_visita_responde_304_sin_consultas(self):
+        primera = self.cliente.get(self.url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertTrue(primera['ETag'].startswith('"'))
+
+        with self.assertNumQueries(0):
+            segunda = self.cliente.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+        with self.assertNumQueries(0):
+            sin_etag = self.cliente.get(self.url)
+        self.assertEqual(sin_etag.json(), primera.json())
+
+    def test_cambios_de_producto_y_stock_invalidan_su_sucursal(self):
+        etag = self.cliente.get(self.url)['ETag']
+        etag_otra = self.cliente.get(f'/api/productos/?sucursal={self.otra.id}')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(nombre='Queque', precio=900, stock=3, sucursal=self.sucursal)
+        respuesta = self.cliente.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()), 2)
+
+        # Otra sucursal conserva su versión
+        otra = self.cliente.get(f'/api/productos/?sucursal={self.otra.id}', HTTP_IF_NONE_MATCH=etag_otra)
+        self.assertEqual(otra.status_code, 304)
+
+        from core.checkout import descontar_stock
+        etag = respuesta['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            descontar_stock({self.producto.id: 4})
+        respuesta = self.cliente.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        stock = {p['id']: p['stock'] for p in respuesta.json()}
+        self.assertEqual(stock[self.producto.id], 6)
+
+    def test_listados_sin_sucursal_dependen_del_rol(self):
+        general = Usuario.objects.create_user('general', 'g@x.com', 'x', rol='administrador_general')
+        anonimo = self.cliente.get('/api/sucursales/')
+        self.cliente.force_authenticate(general)
+        respuesta = self.cliente.get('/api/sucursales/', HTTP_IF_NONE_MATCH=anonimo['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], anonimo['ETag'])
+
+    def test_cambios_de_administradores_invalidan_los_conteos_de_sucursales(self):
+        def admins():
+            respuesta = self.cliente.get('/api/sucursales/')
+            return respuesta['ETag'], {s['id']: s['total_admins'] for s in respuesta.json()}
+
+        etag, conteos = admins()
+        self.assertEqual(conteos, {self.sucursal.id: 0, self.otra.id: 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin = Usuario.objects.create_user('admin', 'a@x.com', 'x', rol='administrador', sucursal=self.sucursal)
+        etag, conteos = admins()
+        self.assertEqual(conteos, {self.sucursal.id: 1, self.otra.id: 0})
+
+        # Guardar sin cambiar rol/sucursal/is_active conserva la versión
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.first_name = 'Ana'
+            admin.save()
+        self.assertEqual(self.cliente.get('/api/sucursales/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Moverlo de sucursal cambia ambos conteos
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.sucursal = self.otra
+            admin.save()
+        self.assertEqual(self.cliente.get('/api/sucursales/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag, conteos = admins()
+        self.assertEqual(conteos, {self.sucursal.id: 0, self.otra.id: 1})
+
+        # Degradarlo a cliente
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.rol = 'cliente'
+            admin.save()
+        self.assertEqual(admins()[1], {self.sucursal.id: 0, self.otra.id: 0})
+
+
+# ============================================================================
+# CACHE COMPARTIDO (core/cache.py)
+# ============================================================================
+
+class EspacioCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.espacio = EspacioCache('prueba', 'PRUEBA_CACHE_SEGUNDOS', 60)
+
+    def tearDown(self):
+        # El espacio de prueba no debe aparecer en /api/reportes/cache/ de otras pruebas
+        ESPACIOS.pop('prueba', None)
+
+    def test_un_solo_proceso_recalcula_una_clave_faltante(self):
+        clave = self.espacio.clave('lento')
+        calculos = []
+        resultados = []
+
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.3)
+            return {'valor': 42}
+
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(self.espacio.obtener(clave, calcular)))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual(resultados, [{'valor': 42}] * 5)
+        # Con el cache en archivos incr() no es atómico: solo se exige que se cuenten esperas
+        estadisticas = self.espacio.estadisticas()
+        self.assertEqual(estadisticas['fallos'], 1)
+        self.assertGreater(estadisticas['esperas'], 0)
+
+    def test_invalidar_cambia_la_clave_del_alcance_y_de_todas(self):
+        de_sucursal = self.espacio.clave('x', alcance=1)
+        de_otra = self.espacio.clave('x', alcance=2)
+        general = self.espacio.clave('x')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.espacio.invalidar([1])
+
+        self.assertNotEqual(self.espacio.clave('x', alcance=1), de_sucursal)
+        self.assertNotEqual(self.espacio.clave('x'), general)
+        self.assertEqual(self.espacio.clave('x', alcance=2), de_otra)
+
+    def test_sin_guardar_no_se_guarda(self):
+        clave = self.espacio.clave('error')
+        self.assertEqual(self.espacio.obtener(clave, lambda: SinGuardar('fallo')), 'fallo')
+        self.assertEqual(self.espacio.obtener(clave, lambda: 'bien'), 'bien')
+
+    def test_destinatarios_se_invalidan_al_cambiar_usuarios(self):
+        sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+        Usuario.objects.create_user('general', 'general@x.com', 'x', rol='administrador_general')
+        self.assertEqual(obtener_admins_por_sucursal(sucursal), ['general@x.com'])
+
+        with self.assertNumQueries(0):
+            obtener_admins_por_sucursal(sucursal)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.create_user('admin', 'admin@x.com', 'x', rol='administrador', sucursal=sucursal)
+        self.assertEqual(obtener_admins_por_sucursal(sucursal), ['admin@x.com', 'general@x.com'])
+
+
+# ============================================================================
+# ACUMULADO DE VENTAS (core/rollups.py)
+# ============================================================================
+
+class AcumuladoVentasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.centro = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.norte = Sucursal.objects.create(nombre='Norte', direccion='Norte', telefono='3333-3333')
+            cls.pan = Producto.objects.create(nombre='Pan', precio=500, stock=100, sucursal=cls.centro)
+            cls.queque = Producto.objects.create(nombre='Queque', precio=2000, stock=100, sucursal=cls.norte)
+            cls.usuario = Usuario.objects.create_user('cliente', 'cliente@x.com', 'x')
+
+    def entregar(self, *lineas):
+        """Pedido con `lineas` [(producto, cantidad)] que pasa a 'entregado' (signals activos)"""
+        with skip_signals():
+            pedido = Pedido.objects.create(
+                usuario=self.usuario, total=sum(producto.precio * cantidad for producto, cantidad in lineas)
+            )
+            for producto, cantidad in lineas:
+                DetallePedido.objects.create(
+                    pedido=pedido, producto=producto, cantidad=cantidad, precio_unitario=producto.precio
+                )
+        pedido.estado = 'entregado'
+        pedido.save()
+        return pedido
+
+    def acumulado(self):
+        from core.models import ResumenDiario, VentaDiaria
+
+        ventas = {
+            producto_id: (unidades, int(ingresos))
+            for producto_id, unidades, ingresos in VentaDiaria.objects.values_list('producto_id', 'unidades', 'ingresos')
+        }
+        resumen = {
+            sucursal_id: (pedidos, int(total))
+            for sucursal_id, pedidos, total in ResumenDiario.objects.values_list('sucursal_id', 'pedidos', 'total')
+        }
+        return ventas, resumen
+
+    def test_entrar_y_salir_de_entregado_suma_y_resta(self):
+        pedido = self.entregar((self.pan, 3), (self.queque, 1))
+        self.assertEqual(self.acumulado(), (
+            {self.pan.id: (3, 1500), self.queque.id: (1, 2000)},
+            {None: (1, 3500), self.centro.id: (1, 3500), self.norte.id: (1, 3500)},
+        ))
+
+        # Corrección: el pedido vuelve a 'listo' → se resta
+        pedido.estado = 'listo'
+        pedido.save()
+        self.assertEqual(self.acumulado(), (
+            {self.pan.id: (0, 0), self.queque.id: (0, 0)},
+            {None: (0, 0), self.centro.id: (0, 0), self.norte.id: (0, 0)},
+        ))
+
+        # Cambios que no tocan 'entregado' no mueven el acumulado
+        pedido.estado = 'en_preparacion'
+        pedido.save()
+        self.assertEqual(self.acumulado()[0], {self.pan.id: (0, 0), self.queque.id: (0, 0)})
+
+        # Vuelve a entregarse → se suma una sola vez, y guardar sin cambiar el estado no duplica
+        pedido.estado = 'entregado'
+        pedido.save()
+        pedido.save()
+        self.assertEqual(self.acumulado(), (
+            {self.pan.id: (3, 1500), self.queque.id: (1, 2000)},
+            {None: (1, 3500), self.centro.id: (1, 3500), self.norte.id: (1, 3500)},
+        ))
+
+    def test_eliminar_el_producto_conserva_sus_ventas(self):
+        from core.models import VentaDiaria
+        from core.reportes import top_productos
+
+        self.entregar((self.pan, 3))
+        with skip_signals():
+            self.pan.delete()
+
+        fila = VentaDiaria.objects.get()
+        self.assertIsNone(fila.producto_id)
+        self.assertEqual((fila.producto_nombre, fila.unidades, fila.ingresos), ('Pan', 3, 1500))
+        self.assertEqual(top_productos()[0]['nombre'], 'Pan')
+
+    def test_pedidos_e_ingresos_salen_del_mismo_historial_tras_la_purga(self):
+        from core.purga import purgar_pedidos
+        from core.reportes import calcular_estadisticas
+
+        self.entregar((self.pan, 2), (self.queque, 1))  # Dos sucursales: 3000
+        self.entregar((self.pan, 2))                    # Solo Centro: 1000
+
+        antes = calcular_estadisticas()
+        self.assertEqual(purgar_pedidos(horas=0, archivar=False)['eliminados'], 2)
+        despues = calcular_estadisticas()
+
+        self.assertEqual(despues, antes)
+        self.assertEqual((despues['pedidos_mes'], despues['ventas_mes']), (2, 4000))
+        self.assertEqual(despues['promedio_venta'], 2000)
+
+        # Por sucursal: el pedido mixto cuenta en ambas
+        centro = calcular_estadisticas(self.centro.id)
+        self.assertEqual((centro['pedidos_mes'], centro['ventas_mes']), (2, 2000))
+        self.assertEqual(calcular_estadisticas(self.norte.id)['pedidos_mes'], 1)
+
+    def test_reconstruir_exige_un_rango_y_respeta_la_purga(self):
+        from django.core.management import CommandError, call_command
+        from core.models import ResumenDiario, VentaDiaria
+        from core.rollups import reconstruir
+
+        self.entregar((self.pan, 2), (self.queque, 1))
+        hoy = timezone.localdate()
+        incremental = sorted(ResumenDiario.objects.values_list('sucursal_id', 'pedidos', 'total'), key=str)
+
+        with self.assertRaises(ValueError):
+            reconstruir(None, None)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups')
+        # Días que la purga ya pudo vaciar: solo con --forzar
+        hace_una_semana = (hoy - timedelta(days=7)).isoformat()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--desde', hace_una_semana, '--hasta', hoy.isoformat())
+
+        ResumenDiario.objects.all().delete()
+        VentaDiaria.objects.all().delete()
+        self.assertEqual(reconstruir(hoy, hoy), 2)
+        self.assertEqual(sorted(ResumenDiario.objects.values_list('sucursal_id', 'pedidos', 'total'), key=str), incremental)
+
+
+# ============================================================================
+# CHECKOUT CONCURRENTE (core/checkout.py)
+# ============================================================================
+
+class CheckoutConcurrenteTests(TransactionTestCase):
+    """Cada hilo usa su propia conexión: las transacciones compiten de verdad"""
+
+    CLIENTES = 8
+    STOCK = 3
+
+    def setUp(self):
+        with skip_signals():
+            sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            self.pan = Producto.objects.create(nombre='Pan', precio=500, stock=self.STOCK, sucursal=sucursal)
+            self.clientes = [
+                Usuario.objects.create_user(f'cliente{i}', f'cliente{i}@x.com', 'x') for i in range(self.CLIENTES)
+            ]
+
+    def test_compras_simultaneas_no_sobrevenden(self):
+        from django.db import OperationalError, connections
+        from rest_framework import serializers
+        from core.checkout import procesar_checkout
+
+        barrera = threading.Barrier(self.CLIENTES)
+        resultados = []
+        lock = threading.Lock()
+
+        def comprar(cliente):
+            barrera.wait()
+            try:
+                # SQLite serializa las escrituras ("database is locked"): el cliente reintenta
+                for _ in range(50):
+                    try:
+                        procesar_checkout(cliente, [{'producto': self.pan.id, 'cantidad': 1}], 'recoger')
+                        resultado = 'ok'
+                        break
+                    except serializers.ValidationError:
+                        resultado = 'sin_stock'
+                        break
+                    except OperationalError:
+                        resultado = 'bloqueado'
+                        time.sleep(0.02)
+            finally:
+                connections.close_all()
+            with lock:
+                resultados.append(resultado)
+
+        hilos = [threading.Thread(target=comprar, args=(cliente,)) for cliente in self.clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        # Lo vendido sale de la BD: un "database is locked" después del commit
+        # (callbacks on_commit) hace que el cliente reintente y compre otra vez
+        self.pan.refresh_from_db()
+        vendidos = Pedido.objects.count()
+        self.assertEqual(len(resultados), self.CLIENTES)
+        self.assertNotIn('bloqueado', resultados)
+        # La guardia del UPDATE condicional puede rechazar a quien leyó stock viejo
+        self.assertGreater(vendidos, 0)
+        self.assertLessEqual(vendidos, self.STOCK)
+        self.assertEqual(self.pan.stock, self.STOCK - vendidos)
+        self.assertEqual(DetallePedido.objects.count(), vendidos)
+        self.assertEqual(self.pan.disponible, self.pan.stock > 0)
+
+    def test_el_stock_cambiado_entre_la_lectura_y_el_update_no_se_sobrevende(self):
+        """Motor sin SELECT FOR UPDATE: otra compra entra justo antes del UPDATE condicional"""
+        from unittest import mock
+        from rest_framework import serializers
+        from core import checkout
+
+        descontar = checkout.descontar_stock
+
+        def otra_compra_primero(cantidades):
+            Producto.objects.filter(pk=self.pan.pk).update(stock=0)
+            return descontar(cantidades)
+
+        with mock.patch('core.checkout.descontar_stock', side_effect=otra_compra_primero):
+            with self.assertRaises(serializers.ValidationError):
+                checkout.procesar_checkout(self.clientes[0], [{'producto': self.pan.id, 'cantidad': 1}], 'recoger')
+
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(DetallePedido.objects.exists())
+
+
+# ============================================================================
+# RESERVAS DE STOCK (core/reservas.py)
+# ============================================================================
+
+class ReservasStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.pan = Producto.objects.create(nombre='Pan', precio=500, stock=10, sucursal=sucursal)
+            cls.queque = Producto.objects.create(nombre='Queque', precio=900, stock=10, sucursal=sucursal)
+            cls.cliente = Usuario.objects.create_user('cliente', 'cliente@x.com', 'x')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.cliente)
+
+    def stock(self, producto):
+        return Producto.objects.values_list('stock', flat=True).get(pk=producto.pk)
+
+    def test_valida_el_producto_y_el_body(self):
+        self.assertEqual(self.api.post('/api/productos/abc/reservar/', {'cantidad': 1}, format='json').status_code, 404)
+        self.assertEqual(self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 'dos'}, format='json').status_code, 400)
+        self.assertEqual(self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 0}, format='json').status_code, 400)
+        self.assertEqual(self.api.post('/api/productos/999999/reservar/', {'cantidad': 1}, format='json').status_code, 400)
+        self.assertEqual(
+            self.api.post(f'/api/productos/{self.pan.id}/liberar-reserva/', {'reserva': 'x'}, format='json').status_code, 400
+        )
+        self.assertEqual(self.stock(self.pan), 10)
+
+    def test_acepta_formularios(self):
+        respuesta = self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': '3'})  # multipart
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['cantidad'], 3)
+        self.assertEqual(self.stock(self.pan), 7)
+
+    def test_liberar_solo_desde_el_producto_de_la_reserva(self):
+        reserva = self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 2}, format='json').data['id']
+
+        otro = self.api.post(f'/api/productos/{self.queque.id}/liberar-reserva/', {'reserva': reserva}, format='json')
+        self.assertEqual(otro.status_code, 404)
+        self.assertEqual(self.stock(self.pan), 8)
+
+        propio = self.api.post(f'/api/productos/{self.pan.id}/liberar-reserva/', {'reserva': reserva}, format='json')
+        self.assertEqual(propio.status_code, 200)
+        self.assertEqual(self.stock(self.pan), 10)
+
+    @override_settings(RESERVA_MAX_UNIDADES_POR_USUARIO=5)
+    def test_un_usuario_no_puede_acaparar_el_stock(self):
+        from core.reservas import liberar_reserva
+
+        primera = self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 3}, format='json')
+        self.assertEqual(primera.status_code, 201)
+
+        excedida = self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 3}, format='json')
+        self.assertEqual(excedida.status_code, 400)
+        self.assertIn('cantidad', excedida.data)
+        self.assertEqual(self.stock(self.pan), 7)
+
+        # El tope es por producto y por usuario
+        self.assertEqual(self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 2}, format='json').status_code, 201)
+        self.assertEqual(self.api.post(f'/api/productos/{self.queque.id}/reservar/', {'cantidad': 5}, format='json').status_code, 201)
+        otro = APIClient()
+        otro.force_authenticate(Usuario.objects.create_user('otro', 'otro@x.com', 'x'))
+        self.assertEqual(otro.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 3}, format='json').status_code, 201)
+
+        # Las reservas liberadas o vencidas dejan de contar
+        self.assertTrue(liberar_reserva(self.cliente, primera.data['id']))
+        self.assertEqual(self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 3}, format='json').status_code, 201)
+        ReservaStock.objects.filter(usuario=self.cliente, producto=self.pan).update(
+            expira_en=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.api.post(f'/api/productos/{self.pan.id}/reservar/', {'cantidad': 5}, format='json').status_code, 201)
+
+    def test_reservar_y_confirmar_en_el_checkout(self):
+        from core.checkout import procesar_checkout
+        from core.reservas import reservar_stock
+
+        reserva = reservar_stock(self.cliente, self.pan.id, 4)
+        self.assertEqual(self.stock(self.pan), 6)
+
+        pedido = procesar_checkout(self.cliente, [
+            {'producto': self.pan.id, 'cantidad': 4, 'reserva': reserva.id},
+            {'producto': self.queque.id, 'cantidad': 1},
+        ], 'recoger')
+
+        # El stock reservado no se descuenta dos veces
+        self.assertEqual(self.stock(self.pan), 6)
+        self.assertEqual(self.stock(self.queque), 9)
+        self.assertEqual(pedido.total, 4 * 500 + 900)
+        reserva.refresh_from_db()
+        self.assertEqual((reserva.estado, reserva.pedido_id), ('confirmada', pedido.id))
+
+    def test_reserva_vencida_devuelve_el_stock_y_no_se_puede_confirmar(self):
+        from django.core.management import call_command
+        from rest_framework import serializers
+        from core.checkout import procesar_checkout
+        from core.reservas import reservar_stock
+
+        vencida = reservar_stock(self.cliente, self.pan.id, 3)
+        vigente = reservar_stock(self.cliente, self.pan.id, 2)
+        self.assertEqual(self.stock(self.pan), 5)
+
+        ReservaStock.objects.filter(pk=vencida.pk).update(expira_en=timezone.now() - timedelta(seconds=1))
+        call_command('expirar_reservas', stdout=StringIO())
+
+        vencida.refresh_from_db()
+        vigente.refresh_from_db()
+        self.assertEqual((vencida.estado, vigente.estado), ('expirada', 'activa'))
+        self.assertEqual(self.stock(self.pan), 8)
+
+        with self.assertRaises(serializers.ValidationError):
+            procesar_checkout(self.cliente, [{'producto': self.pan.id, 'cantidad': 3, 'reserva': vencida.id}], 'recoger')
+        self.assertEqual(self.stock(self.pan), 8)
+        self.assertFalse(Pedido.objects.exists())
+
+        # Otro cliente no puede confirmar una reserva ajena
+        otro = Usuario.objects.create_user('otro', 'otro@x.com', 'x')
+        with self.assertRaises(serializers.ValidationError):
+            procesar_checkout(otro, [{'producto': self.pan.id, 'cantidad': 2, 'reserva': vigente.id}], 'recoger')
+
+
+# ============================================================================
+# COLA DE TRABAJOS (core/jobs.py)
+# ============================================================================
+
+class ColaTrabajosTests(TestCase):
+    def abandonado(self, intentos, max_intentos=3):
+        return Trabajo.objects.create(
+            tipo='prueba.abandonado',
+            estado='en_proceso',
+            intentos=intentos,
+            max_intentos=max_intentos,
+            iniciado_en=timezone.now() - jobs.TIEMPO_MAXIMO_EJECUCION - timedelta(minutes=1),
+        )
+
+    def test_abandonado_sin_intentos_restantes_queda_fallido(self):
+        con_intentos = self.abandonado(intentos=1)
+        agotado = self.abandonado(intentos=3)
+        reciente = Trabajo.objects.create(
+            tipo='prueba.abandonado', estado='en_proceso', intentos=3, max_intentos=3, iniciado_en=timezone.now()
+        )
+
+        self.assertEqual(jobs.recuperar_abandonados(), (1, 1))
+
+        con_intentos.refresh_from_db()
+        agotado.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual(con_intentos.estado, 'pendiente')
+        self.assertEqual(agotado.estado, 'fallido')
+        self.assertIsNotNone(agotado.finalizado_en)
+        self.assertEqual(reciente.estado, 'en_proceso')
+
+        # Un trabajo que tumba al worker no vuelve a la cola
+        self.assertEqual(jobs.recuperar_abandonados(), (0, 0))
+
+    def registrar(self, tipo, funcion, **opciones):
+        """Registra un tipo de prueba solo durante el test"""
+        jobs.tarea(tipo, **opciones)(funcion)
+        self.addCleanup(jobs._TAREAS.pop, tipo, None)
+
+    def test_fallo_se_reintenta_con_backoff_hasta_agotar_intentos(self):
+        llamadas = []
+
+        def falla(numero):
+            llamadas.append(numero)
+            raise RuntimeError('SendGrid caído')
+
+        self.registrar('prueba.falla', falla, max_intentos=2)
+        trabajo = jobs.encolar('prueba.falla', numero=7)
+
+        antes = timezone.now()
+        self.assertEqual(jobs.ejecutar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('pendiente', 1))
+        self.assertIn('SendGrid caído', trabajo.ultimo_error)
+        espera = (trabajo.ejecutar_despues - antes).total_seconds()
+        self.assertGreaterEqual(espera, jobs.BACKOFF_BASE_SEGUNDOS)
+        self.assertLessEqual(espera, jobs.BACKOFF_BASE_SEGUNDOS * 1.1 + 5)
+
+        # Durante el backoff el trabajo no se vuelve a tomar
+        self.assertEqual(jobs.ejecutar_pendientes(), 0)
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(ejecutar_despues=timezone.now())
+        self.assertEqual(jobs.ejecutar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 2))
+        self.assertIsNotNone(trabajo.finalizado_en)
+        self.assertEqual(llamadas, [7, 7])
+        self.assertEqual(jobs.ejecutar_pendientes(), 0)
+
+    def test_backoff_crece_exponencialmente_hasta_el_maximo(self):
+        for intentos, base in [(1, 30), (2, 60), (3, 120), (10, jobs.BACKOFF_MAXIMO_SEGUNDOS)]:
+            espera = jobs.calcular_backoff(intentos)
+            self.assertGreaterEqual(espera, base)
+            self.assertLessEqual(espera, base * 1.1)
+
+    def test_limite_por_minuto_reparte_los_trabajos(self):
+        ejecutados = []
+
+        def ejecutar(x):
+            ejecutados.append(x)
+
+        self.registrar('prueba.limitada', ejecutar, por_minuto=2)
+        self.registrar('prueba.libre', ejecutar)
+
+        for i in range(4):
+            jobs.encolar('prueba.limitada', x=f'limitada-{i}')
+        jobs.encolar('prueba.libre', x='libre')
+
+        # Solo 2 del tipo limitado por minuto; el tipo libre no espera
+        self.assertEqual(jobs.ejecutar_pendientes(), 3)
+        self.assertEqual(sorted(ejecutados), ['libre', 'limitada-0', 'limitada-1'])
+        self.assertEqual(jobs.ejecutar_pendientes(), 0)
+
+        # Pasado el minuto se libera el cupo
+        Trabajo.objects.filter(tipo='prueba.limitada').exclude(iniciado_en=None).update(
+            iniciado_en=timezone.now() - timedelta(minutes=2)
+        )
+        self.assertEqual(jobs.ejecutar_pendientes(), 2)
+        self.assertEqual(Trabajo.objects.filter(estado='completado').count(), 5)
+
+
+# ============================================================================
+# RESUMEN DE STOCK BAJO (core/alertas.py)
+# ============================================================================
+
+class ResumenStockBajoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from core.models import AlertaStockPendiente
+
+        with skip_signals():
+            cls.sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.agotado = Producto.objects.create(nombre='Agotado', precio=500, stock=0, sucursal=cls.sucursal)
+            cls.bajo = Producto.objects.create(nombre='Bajo', precio=500, stock=3, sucursal=cls.sucursal)
+            cls.repuesto = Producto.objects.create(nombre='Repuesto', precio=500, stock=20, sucursal=cls.sucursal)
+        for producto in (cls.agotado, cls.bajo, cls.repuesto):
+            AlertaStockPendiente.objects.create(producto=producto, sucursal=cls.sucursal, eventos=2)
+
+    def test_envia_fuera_de_la_transaccion_sin_agotados_y_reintenta_si_falla(self):
+        from unittest import mock
+        from core.alertas import enviar_resumen_sucursal
+        from core.models import AlertaStockPendiente
+
+        anidamiento = len(connection.savepoint_ids)
+        envios = []
+
+        def enviar(sucursal, productos):
+            envios.append(([p.nombre for p in productos], len(connection.savepoint_ids)))
+            return len(envios) > 1
+
+        with mock.patch('core.emails.enviar_resumen_stock_bajo', side_effect=enviar):
+            self.assertFalse(enviar_resumen_sucursal(self.sucursal.id))
+            # Solo el producto del resumen fallido vuelve a quedar pendiente
+            self.assertEqual(list(AlertaStockPendiente.objects.values_list('producto_id', 'eventos')), [(self.bajo.id, 2)])
+
+            self.assertTrue(enviar_resumen_sucursal(self.sucursal.id))
+            self.assertFalse(AlertaStockPendiente.objects.exists())
+
+        # El agotado ya recibió su alerta de sin stock; el email sale sin bloqueos abiertos
+        self.assertEqual(envios, [(['Bajo'], anidamiento), (['Bajo'], anidamiento)])
+
+
+# ============================================================================
+# PURGA DE PEDIDOS ANTIGUOS (core/purga.py)
+# ============================================================================
+
+class PurgaPedidosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.producto = Producto.objects.create(nombre='Pan', precio=500, stock=10, sucursal=sucursal)
+            cls.usuario = Usuario.objects.create_user('cliente', 'cliente@x.com', 'x')
+
+    def crear(self, estado, horas_completado=None, horas_creado=0, cantidad=1):
+        ahora = timezone.now()
+        with skip_signals():
+            pedidos = Pedido.objects.bulk_create([
+                Pedido(usuario=self.usuario, estado=estado, total=500) for _ in range(cantidad)
+            ])
+            ids = [p.id for p in pedidos]
+            Pedido.objects.filter(id__in=ids).update(
+                fecha=ahora - timedelta(hours=horas_creado),
+                fecha_completado=ahora - timedelta(hours=horas_completado) if horas_completado is not None else None,
+            )
+            DetallePedido.objects.bulk_create([
+                DetallePedido(pedido_id=pid, producto=self.producto, cantidad=1, precio_unitario=500) for pid in ids
+            ])
+        return ids
+
+    def test_elimina_solo_los_elegibles_por_lotes(self):
+        from core.purga import purgar_pedidos
+
+        viejos = self.crear('entregado', horas_completado=72, cantidad=7)
+        sin_fecha = self.crear('cancelado', horas_creado=100)        # COALESCE → fecha
+        recientes = self.crear('entregado', horas_completado=10, horas_creado=100)
+        activos = self.crear('recibido', horas_creado=100)
+
+        lotes = []
+        resultado = purgar_pedidos(tamano_lote=3, al_terminar_lote=lambda n, total: lotes.append(total))
+
+        self.assertEqual(resultado['eliminados'], 8)
+        self.assertEqual(resultado['lotes'], 3)
+        self.assertTrue(resultado['completo'])
+        self.assertFalse(Pedido.objects.filter(id__in=viejos + sin_fecha).exists())
+        self.assertFalse(DetallePedido.objects.filter(pedido_id__in=viejos + sin_fecha).exists())
+        self.assertEqual(Pedido.objects.filter(id__in=recientes + activos).count(), 2)
+
+    def test_consultas_por_lote_no_dependen_del_tamano(self):
+        from core.purga import eliminar_lote
+
+        pocos = self.crear('entregado', horas_completado=72, cantidad=2)
+        muchos = self.crear('entregado', horas_completado=72, cantidad=40)
+        with CaptureQueriesContext(connection) as con_pocos:
+            eliminar_lote(pocos)
+        with CaptureQueriesContext(connection) as con_muchos:
+            eliminar_lote(muchos)
+        self.assertEqual(len(con_pocos), len(con_muchos))
+
+    def test_lote_solo_elimina_los_que_siguen_siendo_purgables(self):
+        from core.purga import eliminar_lote
+
+        ids = self.crear('cancelado', horas_completado=72, cantidad=3)
+        # Entre elegir el lote y eliminarlo, un pedido se reabre y otro es reciente
+        Pedido.objects.filter(id=ids[0]).update(estado='recibido')
+        Pedido.objects.filter(id=ids[1]).update(fecha_completado=timezone.now())
+
+        self.assertEqual(eliminar_lote(ids, archivar=False), 1)
+        self.assertEqual(sorted(Pedido.objects.values_list('id', flat=True)), ids[:2])
+        self.assertEqual(DetallePedido.objects.filter(pedido_id__in=ids[:2]).count(), 2)
+
+    def test_cambiar_estado_con_update_fields_guarda_fecha_completado(self):
+        pedido = Pedido.objects.create(usuario=self.usuario, total=500)
+        pedido.estado = 'entregado'
+        pedido.save(update_fields=['estado'])
+        pedido.refresh_from_db()
+        self.assertIsNotNone(pedido.fecha_completado)
+
+
+# ============================================================================
+# EXPORTACIÓN DE VENTAS (core/exportaciones.py)
+# ============================================================================
+
+class ExportarVentasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.centro = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.norte = Sucursal.objects.create(nombre='Norte', direccion='Norte', telefono='3333-3333')
+            cliente = Usuario.objects.create_user('cliente', 'cliente@x.com', 'x')
+            for sucursal in (cls.centro, cls.norte):
+                producto = Producto.objects.create(nombre=f'Pan {sucursal.nombre}', precio=500, stock=10, sucursal=sucursal)
+                pedido = Pedido.objects.create(usuario=cliente, estado='entregado', total=500)
+                DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_unitario=500)
+            cls.admin = Usuario.objects.create_user('admin', 'admin@x.com', 'x', rol='administrador', sucursal=cls.centro)
+            cls.sin_sucursal = Usuario.objects.create_user('suelto', 'suelto@x.com', 'x', rol='administrador')
+            cls.general = Usuario.objects.create_user('general', 'general@x.com', 'x', rol='administrador_general')
+
+    def exportar(self, usuario, **params):
+        client = APIClient()
+        client.force_authenticate(usuario)
+        return client.get('/api/reportes/ventas/', {'formato': 'ndjson', **params})
+
+    def filas(self, response):
+        return [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_admin_solo_exporta_su_sucursal(self):
+        response = self.exportar(self.admin, sucursal=self.norte.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([fila['sucursal'] for fila in self.filas(response)], ['Centro'])
+
+        self.assertEqual(self.exportar(self.sin_sucursal).status_code, 403)
+
+    def test_sucursal_invalida_responde_400_antes_del_streaming(self):
+        response = self.exportar(self.general, sucursal='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+        self.assertEqual(len(self.filas(self.exportar(self.general))), 2)
+
+    async def test_bajo_asgi_el_streaming_es_async(self):
+        from django.test import AsyncClient
+
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.general).access_token))()
+        response = await AsyncClient().get(
+            '/api/reportes/ventas/', {'formato': 'ndjson'}, headers={'Authorization': f'Bearer {token}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        # Un iterador sync se leería completo con sync_to_async(list) antes de enviarse
+        self.assertTrue(response.is_async)
+        contenido = b''.join([bloque async for bloque in response.streaming_content])
+        self.assertEqual(sorted(json.loads(linea)['sucursal'] for linea in contenido.decode().splitlines()), ['Centro', 'Norte'])
+
+    async def test_los_bloques_async_no_leen_mas_de_lo_enviado(self):
+        from core.exportaciones import en_bloques_async
+
+        leidas = []
+        cerrado = []
+
+        def filas():
+            try:
+                for i in range(10):
+                    leidas.append(i)
+                    yield f'{i}\n'
+            finally:
+                cerrado.append(True)
+
+        bloques = en_bloques_async(filas(), tamano=3)
+        self.assertEqual(await anext(bloques), '0\n1\n2\n')
+        self.assertEqual(leidas, [0, 1, 2])
+
+        # El cliente se desconecta: el generador sync (y su cursor) se cierra
+        await bloques.aclose()
+        self.assertEqual(cerrado, [True])
+
+
+# ============================================================================
+# ARCHIVO FRÍO DE PEDIDOS
+# ============================================================================
+
+class ArchivoPedidosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.centro = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.norte = Sucursal.objects.create(nombre='Norte', direccion='Norte', telefono='3333-3333')
+            cls.pan = Producto.objects.create(nombre='Pan', precio=500, stock=10, sucursal=cls.centro)
+            cls.queque = Producto.objects.create(nombre='Queque', precio=2000, stock=10, sucursal=cls.norte)
+            cls.usuario = Usuario.objects.create_user('cliente', 'cliente@x.com', 'x')
+            cls.admin = Usuario.objects.create_user(
+                'admin', 'admin@x.com', 'x', rol='administrador', sucursal=cls.centro
+            )
+
+    def setUp(self):
+        import tempfile
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(ARCHIVO_PEDIDOS_DIR=directorio.name, ARCHIVAR_PEDIDOS=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear(self, estado, fecha, producto, cantidad=1):
+        with skip_signals():
+            pedido = Pedido.objects.create(usuario=self.usuario, estado=estado, total=producto.precio * cantidad)
+            Pedido.objects.filter(id=pedido.id).update(fecha=fecha, fecha_completado=fecha)
+            DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=cantidad, precio_unitario=producto.precio)
+        return pedido.id
+
+    def fecha(self, texto):
+        from datetime import datetime
+        return timezone.make_aware(datetime.fromisoformat(texto))
+
+    def test_purga_archiva_y_el_archivo_conserva_las_ventas(self):
+        from datetime import date
+        from core.archivo import resumen_archivo, ventas_archivadas
+        from core.purga import purgar_pedidos
+
+        self.crear('entregado', self.fecha('2024-11-03 10:00'), self.pan, cantidad=2)
+        self.crear('entregado', self.fecha('2024-11-20 10:00'), self.queque)
+        self.crear('cancelado', self.fecha('2024-11-21 10:00'), self.pan, cantidad=5)
+        self.crear('entregado', self.fecha('2024-12-01 10:00'), self.pan)
+
+        resultado = purgar_pedidos(tamano_lote=2)
+        self.assertEqual(resultado['eliminados'], 4)
+        self.assertFalse(Pedido.objects.exists())
+
+        self.assertEqual([m['mes'] for m in resumen_archivo()], ['2024-11', '2024-12'])
+        self.assertEqual(sum(m['pedidos'] for m in resumen_archivo()), 4)
+
+        self.assertEqual(ventas_archivadas(agrupar='mes'), [
+            {'grupo': '2024-11', 'pedidos': 2, 'unidades': 3, 'ingresos': '3000.00'},
+            {'grupo': '2024-12', 'pedidos': 1, 'unidades': 1, 'ingresos': '500.00'},
+        ])
+        self.assertEqual(
+            ventas_archivadas(date(2024, 11, 1), date(2024, 11, 30), sucursal_id=self.centro.id, agrupar='producto'),
+            [{'grupo': f'{self.pan.id}:Pan', 'pedidos': 1, 'unidades': 2, 'ingresos': '1000.00'}],
+        )
+
+    def test_sin_directorio_persistente_no_se_elimina_nada(self):
+        from django.core.management import CommandError, call_command
+        from core.archivo import ArchivoNoConfigurado
+        from core.purga import purgar_pedidos
+
+        self.crear('entregado', self.fecha('2024-11-03 10:00'), self.pan)
+        with override_settings(ARCHIVO_PEDIDOS_DIR=''):
+            with self.assertRaises(ArchivoNoConfigurado):
+                purgar_pedidos()
+            with self.assertRaises(CommandError):
+                call_command('delete_old_orders', '--noinput')
+            self.assertEqual(Pedido.objects.count(), 1)
+
+            # Eliminar sin copia sigue siendo posible, pero explícito
+            self.assertEqual(purgar_pedidos(archivar=False)['eliminados'], 1)
+
+    def test_lecturas_saltan_los_miembros_fuera_del_rango(self):
+        from datetime import date
+        from core.archivo import _ruta_segmento, archivar_pedidos, leer_indice, ventas_archivadas
+
+        archivar_pedidos([self.crear('entregado', self.fecha('2025-01-05 09:00'), self.pan)])
+        archivar_pedidos([self.crear('entregado', self.fecha('2025-01-25 09:00'), self.queque)])
+        # Lote repetido (purga interrumpida): no se cuenta dos veces
+        repetido = self.crear('entregado', self.fecha('2025-01-26 09:00'), self.pan)
+        archivar_pedidos([repetido])
+        archivar_pedidos([repetido])
+
+        indice = leer_indice('2025-01')
+        self.assertEqual(len(indice['miembros']), 4)
+
+        # Se daña el primer miembro: una lectura que no lo necesita no lo toca
+        primero = indice['miembros'][0]
+        with open(_ruta_segmento('2025-01'), 'r+b') as archivo:
+            archivo.seek(primero['posicion'])
+            archivo.write(b'\0' * primero['bytes'])
+
+        self.assertEqual(
+            ventas_archivadas(date(2025, 1, 20), date(2025, 1, 31), agrupar='dia'),
+            [
+                {'grupo': '2025-01-25', 'pedidos': 1, 'unidades': 1, 'ingresos': '2000.00'},
+                {'grupo': '2025-01-26', 'pedidos': 1, 'unidades': 1, 'ingresos': '500.00'},
+            ],
+        )
+
+    def test_pedidos_por_grupo_sin_repetidos_ni_ids_por_grupo(self):
+        from core.archivo import archivar_pedidos, ventas_archivadas
+
+        # Dos líneas de la misma sucursal en un pedido, archivado dos veces
+        pedido = self.crear('entregado', self.fecha('2025-03-10 09:00'), self.pan, cantidad=2)
+        with skip_signals():
+            DetallePedido.objects.create(
+                pedido_id=pedido, producto=self.pan, cantidad=1, precio_unitario=self.pan.precio
+            )
+        archivar_pedidos([pedido])
+        archivar_pedidos([pedido, self.crear('entregado', self.fecha('2025-04-01 09:00'), self.pan)])
+
+        self.assertEqual(ventas_archivadas(agrupar='sucursal'), [
+            {'grupo': f'{self.centro.id}:Centro', 'pedidos': 2, 'unidades': 4, 'ingresos': '2000.00'},
+        ])
+
+    def test_un_solo_escritor_por_segmento(self):
+        import fcntl
+        from core.archivo import _agregar_miembro, _ruta_segmento, leer_indice
+
+        registro = {'id': 1, 'fecha': '2025-05-02T10:00:00-06:00', 'estado': 'entregado', 'detalles': []}
+        _agregar_miembro('2025-05', [registro])
+
+        escritor = threading.Thread(target=_agregar_miembro, args=('2025-05', [{**registro, 'id': 2}]))
+        with open(_ruta_segmento('2025-05'), 'ab') as otro_proceso:
+            fcntl.flock(otro_proceso.fileno(), fcntl.LOCK_EX)
+            escritor.start()
+            escritor.join(timeout=0.3)
+            # Espera el bloqueo: ni el segmento ni el índice cambian
+            self.assertTrue(escritor.is_alive())
+            self.assertEqual(len(leer_indice('2025-05')['miembros']), 1)
+        escritor.join()
+
+        indice = leer_indice('2025-05')
+        self.assertEqual([m['pedidos'] for m in indice['miembros']], [1, 1])
+        segundo = indice['miembros'][1]
+        self.assertEqual(segundo['posicion'], indice['miembros'][0]['bytes'])
+        self.assertEqual(_ruta_segmento('2025-05').stat().st_size, segundo['posicion'] + segundo['bytes'])
+
+    def test_endpoint_limita_al_admin_a_su_sucursal(self):
+        from core.archivo import archivar_pedidos
+
+        archivar_pedidos([
+            self.crear('entregado', self.fecha('2024-06-10 12:00'), self.pan, cantidad=3),
+            self.crear('entregado', self.fecha('2024-06-11 12:00'), self.queque),
+        ])
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/reportes/archivo/', {'agrupar': 'sucursal', 'sucursal': self.norte.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ventas'], [
+            {'grupo': f'{self.centro.id}:Centro', 'pedidos': 1, 'unidades': 3, 'ingresos': '1500.00'},
+        ])
+
+        self.assertNotIn('segmentos', response.data)
+
+        self.assertEqual(client.get('/api/reportes/archivo/', {'agrupar': 'semana'}).status_code, 400)
+        self.assertEqual(client.get('/api/reportes/archivo/', {'desde': '2024-13-01'}).status_code, 400)
+
+        # Admin sin sucursal: no ve ninguna
+        sin_sucursal = Usuario.objects.create_user('suelto', 'suelto@x.com', 'x', rol='administrador')
+        client.force_authenticate(sin_sucursal)
+        self.assertEqual(client.get('/api/reportes/archivo/', {'sucursal': self.norte.id}).status_code, 403)
+
+        # El administrador general ve todas las sucursales y los segmentos
+        general = Usuario.objects.create_user('general', 'general@x.com', 'x', rol='administrador_general')
+        client.force_authenticate(general)
+        response = client.get('/api/reportes/archivo/', {'agrupar': 'sucursal'})
+        self.assertEqual(len(response.data['ventas']), 2)
+        self.assertEqual(response.data['segmentos'][0]['pedidos'], 2)
+
+
+# ============================================================================
+# AUTENTICACIÓN JWT CON CACHE
+# ============================================================================
+
+class AutenticacionCacheadaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with skip_signals():
+            cls.sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            cls.admin = Usuario.objects.create_user(
+                'admin', 'admin@x.com', 'x', rol='administrador', sucursal=cls.sucursal
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+
+    def consultas_de_me(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.cliente.get('/api/usuarios/me/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(consultas)
+
+    def test_con_cache_caliente_no_consulta_usuario_ni_sucursal(self):
+        _, en_frio = self.consultas_de_me()
+        response, en_caliente = self.consultas_de_me()
+        # La única consulta de la autenticación (usuario + sucursal) desaparece
+        self.assertEqual(en_frio - en_caliente, 1)
+        self.assertEqual(response.data['sucursal_nombre'], 'Centro')
+        self.assertNotIn('password', response.data)
+
+    def test_cambios_del_usuario_o_su_sucursal_invalidan(self):
+        self.consultas_de_me()
+        _, en_caliente = self.consultas_de_me()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sucursal.nombre = 'Centro Norte'
+            self.sucursal.save()
+        response, consultas = self.consultas_de_me()
+        self.assertEqual(consultas, en_caliente + 1)
+        self.assertEqual(response.data['sucursal_nombre'], 'Centro Norte')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.filter(pk=self.admin.pk).update(rol='cliente')
+            usuario = Usuario.objects.get(pk=self.admin.pk)
+            usuario.is_active = False
+            usuario.save()
+        self.assertEqual(self.cliente.get('/api/usuarios/me/').status_code, 401)
+
+    def test_guardar_el_usuario_cacheado_no_borra_la_contrasena(self):
+        self.consultas_de_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.cliente.patch('/api/usuarios/me/', {'domicilio': 'Calle 1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        usuario = Usuario.objects.get(pk=self.admin.pk)
+        self.assertEqual(usuario.domicilio, 'Calle 1')
+        self.assertTrue(usuario.check_password('x'))
+
+
+# ============================================================================
+# LÍMITES DE LOGIN Y RECUPERACIÓN
+# ============================================================================
+
+# Hasher rápido: cada login malo corre el hasher completo
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LimitesLoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('ana', 'ana@x.com', 'clave-correcta', first_name='Ana')
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = APIClient()
+
+    def login(self, username, password='mala'):
+        return self.cliente.post('/api/auth/login/', {'username': username, 'password': password}, format='json')
+
+    def test_bloquea_por_identificador_con_espera_creciente_y_tope_menor(self):
+        import hashlib
+        from core.limites import BLOQUEO_MAXIMO_IDENTIFICADOR_SEGUNDOS, LoginPorIdentificador
+
+        limite = int(LoginPorIdentificador().num_requests)
+        ident = hashlib.sha1(b'ana').hexdigest()
+
+        def desde_ips_rotativas(ronda):
+            for i in range(limite):
+                respuesta = self.cliente.post(
+                    '/api/auth/login/', {'username': 'ana', 'password': 'mala'}, format='json',
+                    HTTP_X_FORWARDED_FOR=f'203.0.{ronda}.{i}',
+                )
+                self.assertEqual(respuesta.status_code, 401)
+            return self.login('ANA ')  # Mismo identificador normalizado
+
+        bloqueado = desde_ips_rotativas(1)
+        self.assertEqual(bloqueado.status_code, 429)
+        primera_espera = int(bloqueado['Retry-After'])
+        # Otra cuenta desde la misma IP no queda bloqueada
+        self.assertEqual(self.login('otra').status_code, 401)
+
+        # Cambiar de IP no evita que la cuenta escale
+        cache.delete(f'throttle_login_identificador_{ident}:bloqueo')  # Termina el bloqueo
+        self.assertEqual(int(desde_ips_rotativas(2)['Retry-After']), primera_espera * 2)
+
+        # Pero un tercero no puede bloquear una cuenta ajena más que el tope
+        cache.set(f'throttle_login_identificador_{ident}:bloqueos', 20)
+        cache.delete(f'throttle_login_identificador_{ident}:bloqueo')
+        self.assertEqual(int(desde_ips_rotativas(3)['Retry-After']), BLOQUEO_MAXIMO_IDENTIFICADOR_SEGUNDOS)
+
+        cache.delete(f'throttle_login_identificador_{ident}:bloqueo')
+        self.assertEqual(self.login('ana', 'clave-correcta').status_code, 200)
+
+    def test_bloquea_por_ip_con_espera_creciente(self):
+        from core.limites import LoginPorIP
+
+        limite = int(LoginPorIP().num_requests)
+        # Cada petición usa otra cuenta: solo cuenta la llave por IP
+        for i in range(limite):
+            self.assertEqual(self.login(f'cuenta{i}').status_code, 401)
+        bloqueado = self.login('otra')
+        self.assertEqual(bloqueado.status_code, 429)
+        primera_espera = int(bloqueado['Retry-After'])
+
+        cache.delete('throttle_login_ip_127.0.0.1:bloqueo')  # Termina el bloqueo
+        for i in range(limite):
+            self.assertEqual(self.login(f'nueva{i}').status_code, 401)
+        self.assertEqual(int(self.login('otra')['Retry-After']), primera_espera * 2)
+
+    def test_rotar_x_forwarded_for_no_abre_llaves_nuevas(self):
+        from core.limites import LoginPorIP
+
+        limite = int(LoginPorIP().num_requests)
+        # El cliente inventa una IP distinta en cada petición; el proxy
+        # (NUM_PROXIES=1) agrega la IP real al final
+        for i in range(limite):
+            respuesta = self.cliente.post(
+                '/api/auth/login/', {'username': f'cuenta{i}', 'password': 'mala'}, format='json',
+                HTTP_X_FORWARDED_FOR=f'10.0.{i}.1, 203.0.113.9',
+            )
+            self.assertEqual(respuesta.status_code, 401)
+
+        respuesta = self.cliente.post(
+            '/api/auth/login/', {'username': 'otra', 'password': 'mala'}, format='json',
+            HTTP_X_FORWARDED_FOR='10.9.9.9, 203.0.113.9',
+        )
+        self.assertEqual(respuesta.status_code, 429)
+        # Otra IP real sigue pudiendo intentar
+        respuesta = self.cliente.post(
+            '/api/auth/login/', {'username': 'otra', 'password': 'mala'}, format='json',
+            HTTP_X_FORWARDED_FOR='10.9.9.9, 203.0.113.10',
+        )
+        self.assertEqual(respuesta.status_code, 401)
+
+    def test_recuperacion_responde_sin_enviar_y_el_envio_va_en_la_cola(self):
+        from django.core import mail
+        from core.jobs import ejecutar_pendientes
+
+        with self.captureOnCommitCallbacks(execute=True):
+            existe = self.cliente.post('/api/password/solicitar-recuperacion/', {'email': 'Ana@x.com'}, format='json')
+            no_existe = self.cliente.post('/api/password/solicitar-recuperacion/', {'email': 'nadie@x.com'}, format='json')
+
+        self.assertEqual(existe.status_code, 200)
+        self.assertEqual(existe.data, no_existe.data)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Trabajo.objects.filter(tipo='email.recuperar_password').count(), 2)
+
+        ejecutar_pendientes()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ana@x.com'])
+        self.assertIn('/recuperar-password/', mail.outbox[0].body)
+
+    def test_la_ruta_de_dj_rest_auth_usa_la_recuperacion_con_limites(self):
+        from django.core import mail
+        from core.limites import RecuperacionPorEmail
+
+        limite = int(RecuperacionPorEmail().num_requests)
+        for _ in range(limite):
+            respuesta = self.cliente.post('/api/auth/password/reset/', {'email': 'ana@x.com'}, format='json')
+            self.assertEqual(respuesta.status_code, 200)
+        # El email no se envía en la petición: va a la cola
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Trabajo.objects.filter(tipo='email.recuperar_password').count(), limite)
+
+        # El límite por email es el mismo que el de /api/password/solicitar-recuperacion/
+        otra_ruta = self.cliente.post('/api/password/solicitar-recuperacion/', {'email': 'ana@x.com'}, format='json')
+        self.assertEqual(otra_ruta.status_code, 429)
+        self.assertEqual(
+            self.cliente.post('/api/auth/password/reset/', {'email': 'ana@x.com'}, format='json').status_code, 429
+        )
+
+
+# ============================================================================
+# CATÁLOGO ASYNC
+# ============================================================================
+
+class CatalogoAsyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        with skip_signals():
+            cls.sucursal = Sucursal.objects.create(nombre='Centro', direccion='Centro', telefono='2222-2222')
+            Sucursal.objects.create(nombre='Cerrada', direccion='Sur', telefono='2222-2224', activa=False)
+            cls.pan = Producto.objects.create(nombre='Pan', precio=500, stock=10, sucursal=cls.sucursal)
+            Producto.objects.create(nombre='Queque', precio=900, stock=0, sucursal=cls.sucursal)
+            oferta = Oferta.objects.create(
+                titulo='2x1', descripcion='Pan', precio_oferta=400, sucursal=cls.sucursal,
+                fecha_inicio=hoy - timedelta(days=1), fecha_fin=hoy + timedelta(days=3),
+            )
+            ProductoOferta.objects.create(oferta=oferta, producto=cls.pan)
+            cls.general = Usuario.objects.create_user('general', 'g@x.com', 'x', rol='administrador_general')
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_mismo_resultado_que_la_vista_sync(self):
+        from django.test import AsyncClient
+
+        cliente = AsyncClient()
+        pares = [
+            ('/api/async/productos/', '/api/productos/'),
+            (f'/api/async/productos/?sucursal={self.sucursal.id}', f'/api/productos/?sucursal={self.sucursal.id}'),
+            ('/api/async/ofertas/', '/api/ofertas/'),
+            ('/api/async/sucursales/activas/', '/api/sucursales/activas/'),
+        ]
+        for ruta_async, ruta_sync in pares:
+            respuesta_async = await cliente.get(ruta_async)
+            self.assertEqual(respuesta_async.status_code, 200, ruta_async)
+            await cache.aclear()  # La vista sync calcula el listado por su cuenta
+            respuesta_sync = await cliente.get(ruta_sync)
+            self.assertEqual(respuesta_async.json(), respuesta_sync.json(), ruta_async)
+
+    async def test_comparte_cache_y_etag_con_la_vista_sync(self):
+        from django.test import AsyncClient
+
+        cliente = AsyncClient()
+        sync = await cliente.get('/api/productos/')
+        no_modificado = await cliente.get('/api/async/productos/', headers={'If-None-Match': sync['ETag']})
+        self.assertEqual(no_modificado.status_code, 304)
+
+    async def test_autenticados_y_paginacion_usan_la_vista_sync(self):
+        from django.test import AsyncClient
+
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.general).access_token))()
+        cliente = AsyncClient(headers={'Authorization': f'Bearer {token}'})
+        # Con token responde la vista sync con la lógica del rol
+        productos = await cliente.get('/api/async/productos/')
+        self.assertEqual(productos.json(), (await cliente.get('/api/productos/')).json())
+
+        paginado = await AsyncClient().get('/api/async/productos/?limite=1')
+        self.assertEqual(len(paginado.json()['results']), 1)
+
+        self.assertEqual((await AsyncClient().post('/api/async/productos/')).status_code, 405)
+
+    @override_settings(METRICAS_SERVER_TIMING='todos')
+    async def test_las_metricas_cuentan_las_consultas_bajo_asgi(self):
+        from django.test import AsyncClient
+
+        # Las consultas corren en hilos de sync_to_async, no en el del event loop
+        for ruta in ('/api/async/productos/', '/api/sucursales/'):
+            await cache.aclear()
+            sync = await sync_to_async(lambda: APIClient().get(ruta))()
+            await cache.aclear()
+            asgi = await AsyncClient().get(ruta)
+            self.assertNotIn('"0 consultas"', asgi['Server-Timing'], ruta)
+            self.assertIn(sync['Server-Timing'].split(',')[0].split('desc=')[1], asgi['Server-Timing'], ruta)
@@ -6,7 +6,7 @@ from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
 from django.shortcuts import redirect
 from django.views.generic import View
-from . import views
+from . import views, views_async
 from .views_auth import LoginView
 from .views_password import (
     solicitar_recuperacion_password,
@@ -15,12 +15,14 @@ from .views_password import (
     cambiar_password
 )
 from .serializers import CustomTokenObtainPairSerializer
-from .views_reportes import estadisticas, exportar_reporte
+from .limites import LIMITES_LOGIN
+from .views_reportes import estadisticas, exportar_reporte, exportar_ventas, estado_cache_reportes, metricas, ventas_archivo
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Vista personalizada para login con serializer customizado"""
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = LIMITES_LOGIN
 
 
 class LoginCancelledView(View):
@@ -53,6 +55,11 @@ urlpatterns = [
     # Router
     path('', include(router.urls)),
     
+    # ⭐ Catálogo público async (servidor ASGI, ver core/views_async.py)
+    path('async/productos/', views_async.productos, name='async_productos'),
+    path('async/ofertas/', views_async.ofertas, name='async_ofertas'),
+    path('async/sucursales/activas/', views_async.sucursales_activas, name='async_sucursales_activas'),
+    
     # Auth endpoints
     path('auth/login/', LoginView.as_view(), name='custom_login'),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -76,8 +83,16 @@ urlpatterns = [
     # Reportes
     path('reportes/estadisticas/', estadisticas, name='reportes_estadisticas'),
     path('reportes/exportar/', exportar_reporte, name='reportes_exportar'),
+    path('reportes/ventas/', exportar_ventas, name='reportes_ventas'),
+    path('reportes/archivo/', ventas_archivo, name='reportes_archivo'),
+    path('reportes/cache/', estado_cache_reportes, name='reportes_cache'),
+    path('metrics/', metricas, name='metricas'),
     
     # dj-rest-auth
+    # ⭐ Su PasswordResetView no tiene límites y envía el email en la petición:
+    # la ruta se atiende con la recuperación propia (límites + cola). Va antes
+    # del include y también cubre /api/auth/password/reset/ de panaderia/urls.py
+    path('auth/password/reset/', solicitar_recuperacion_password, name='rest_password_reset'),
     path('auth/', include('dj_rest_auth.urls')),
     path('auth/registration/', include('dj_rest_auth.registration.urls')),
 ]
\ No newline at end of file
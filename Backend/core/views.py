@@ -8,7 +8,6 @@ from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from django.db.models import Q, Prefetch
 from django.db import transaction
-from django.core.cache import cache
 from .emails import enviar_alerta_stock_bajo
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from .models import Usuario, Producto, Oferta, ProductoOferta, Pedido, DetallePedido, Sucursal
@@ -20,9 +19,62 @@ from .serializers import (
     PedidoSerializer,
     PedidoCreateSerializer,
     DetallePedidoSerializer,
-    SucursalSerializer
+    SucursalSerializer,
+    ReservaStockSerializer,
+    ReservarStockSerializer,
+    LiberarReservaSerializer,
+    indice_ofertas_activas,
+    sucursales_con_conteos
 )
-from .permissions import EsAdministrador, EsClienteOAdmin
+from .permissions import EsAdministrador, EsAdministradorGeneral, EsClienteOAdmin
+from .paginacion import CursorOpcional, CursorPedidos
+from .jobs import encolar
+from .cache_catalogo import alcance_de, responder_con_cache
+
+
+class CacheCatalogoMixin:
+    """
+    ⭐ list() servido desde el cache versionado del catálogo, con ETag/304
+    (core/cache_catalogo.py). Cada ViewSet indica su recurso_catalogo.
+    """
+    recurso_catalogo = None
+    
+    def alcance_catalogo(self, request):
+        return alcance_de(request)
+    
+    def list(self, request, *args, **kwargs):
+        alcance, sucursal_id = self.alcance_catalogo(request)
+        return responder_con_cache(
+            request, self.recurso_catalogo, alcance, sucursal_id,
+            lambda: super(CacheCatalogoMixin, self).list(request, *args, **kwargs)
+        )
+
+
+class IndiceOfertasMixin:
+    """
+    ⭐ Al serializar instancias (listados many=True o un solo objeto) arma el
+    índice producto → oferta activa con UNA consulta y lo pasa en el contexto
+    del serializer. Por defecto las instancias son productos o tienen
+    producto_id (detalles); los ViewSets con otra forma (ofertas, pedidos)
+    sobrescriben productos_del_listado().
+    """
+    
+    def productos_del_listado(self, instancias):
+        return {getattr(instancia, 'producto_id', instancia.pk) for instancia in instancias}
+    
+    def contexto_con_ofertas(self, instancias):
+        return {
+            **self.get_serializer_context(),
+            'ofertas_activas': indice_ofertas_activas(self.productos_del_listado(instancias))
+        }
+    
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None:
+            instancias = list(args[0]) if kwargs.get('many') else [args[0]]
+            kwargs['context'] = self.contexto_con_ofertas(instancias)
+            if kwargs.get('many'):
+                args = (instancias, *args[1:])
+        return super().get_serializer(*args, **kwargs)
 
 
 @api_view(['POST'])
@@ -78,6 +130,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorOpcional  # ⭐ Opcional: ?limite=N
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -86,18 +139,22 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        # ⭐ sucursal_data: todas las sucursales con sus conteos en UNA consulta
+        base_queryset = Usuario.objects.prefetch_related(
+            Prefetch('sucursal', queryset=sucursales_con_conteos())
+        )
         
         if user.rol == 'administrador_general':
             print(f"🔓 Admin General - Mostrando TODOS los usuarios")
-            return Usuario.objects.all().order_by('-date_joined')
+            return base_queryset.order_by('-date_joined')
         
         elif user.rol == 'administrador':
             print(f"👁️ Admin Regular - Solo puede VER usuarios")
-            return Usuario.objects.all().order_by('-date_joined')
+            return base_queryset.order_by('-date_joined')
         
         elif user.rol == 'cliente':
             print(f"🔒 Cliente - Solo su perfil")
-            return Usuario.objects.filter(id=user.id)
+            return base_queryset.filter(id=user.id)
         
         return Usuario.objects.none()
     
@@ -189,41 +246,76 @@ class UsuarioViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
 
 
+# ============================================================================
+# CATÁLOGO (consultas compartidas con core/views_async.py)
+# ============================================================================
+
+def productos_del_catalogo():
+    """Base de los listados de productos (también la usan las vistas async)"""
+    return Producto.objects.select_related('sucursal')
+
+
+def ofertas_del_catalogo():
+    """Base de los listados de ofertas (también la usan las vistas async)"""
+    return Oferta.objects.select_related('sucursal').prefetch_related(
+        Prefetch('productooferta_set', queryset=ProductoOferta.objects.select_related('producto__sucursal'))
+    )
+
+
+def productos_de_ofertas(ofertas):
+    """Productos que aparecen en las ofertas (para el índice de ofertas activas)"""
+    return {
+        relacion.producto_id
+        for oferta in ofertas
+        for relacion in oferta.productooferta_set.all()
+    }
+
+
 # ============================================================================
 # SUCURSAL VIEWSET
 # ============================================================================
 
-class SucursalViewSet(viewsets.ModelViewSet):
+class SucursalViewSet(CacheCatalogoMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar sucursales"""
     queryset = Sucursal.objects.all()
     serializer_class = SucursalSerializer
     permission_classes = [AllowAny]
+    recurso_catalogo = 'sucursales'
+    
+    def alcance_catalogo(self, request):
+        # Los conteos de cada sucursal cambian con cualquier producto/oferta
+        user = request.user
+        if user.is_authenticated and user.rol == 'administrador_general':
+            return 'todas', None
+        return 'activas', None
     
     def get_permissions(self):
-        """Solo admins pueden crear/editar/eliminar sucursales"""
+        """Solo el administrador general puede crear/editar/eliminar sucursales"""
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
-            return [IsAuthenticated()]
+            return [IsAuthenticated(), EsAdministradorGeneral()]
         return [AllowAny()]
     
     def get_queryset(self):
         """Filtrar sucursales según el rol del usuario"""
         user = self.request.user
+        # ⭐ Conteos anotados: una sola consulta para todas las sucursales
+        sucursales = sucursales_con_conteos()
         
         if not user.is_authenticated:
             print(f"🏪 Usuario no autenticado - Mostrando sucursales activas")
-            return Sucursal.objects.filter(activa=True).order_by('nombre')
+            return sucursales.filter(activa=True).order_by('nombre')
         
         if user.rol == 'administrador_general':
             print(f"🏪 Admin General - Mostrando TODAS las sucursales")
-            return Sucursal.objects.all().order_by('nombre')
+            return sucursales.order_by('nombre')
         
         elif user.rol == 'administrador':
             print(f"🏪 Admin Regular - Mostrando sucursales activas")
-            return Sucursal.objects.filter(activa=True).order_by('nombre')
+            return sucursales.filter(activa=True).order_by('nombre')
         
         elif user.rol == 'cliente':
             print(f"🏪 Cliente - Mostrando sucursales activas")
-            return Sucursal.objects.filter(activa=True).order_by('nombre')
+            return sucursales.filter(activa=True).order_by('nombre')
         
         return Sucursal.objects.none()
     
@@ -233,13 +325,18 @@ class SucursalViewSet(viewsets.ModelViewSet):
         Retorna solo sucursales activas.
         Endpoint: /api/sucursales/activas/
         """
+        return responder_con_cache(
+            request, 'sucursales', 'activas', None, lambda: self.listar_activas(request)
+        )
+    
+    def listar_activas(self, request):
         print(f"\n{'='*60}")
         print(f"🏪 GET /api/sucursales/activas/")
         print(f"{'='*60}")
         
-        sucursales = Sucursal.objects.filter(activa=True).order_by('nombre')
+        sucursales = list(sucursales_con_conteos().filter(activa=True).order_by('nombre'))
         
-        print(f"✅ Sucursales activas encontradas: {sucursales.count()}")
+        print(f"✅ Sucursales activas encontradas: {len(sucursales)}")
         for s in sucursales:
             print(f"   - {s.nombre} (ID: {s.id})")
         print(f"{'='*60}\n")
@@ -252,15 +349,18 @@ class SucursalViewSet(viewsets.ModelViewSet):
 # PRODUCTO VIEWSET
 # ============================================================================
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CacheCatalogoMixin, IndiceOfertasMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar productos con filtro de sucursal"""
     serializer_class = ProductoSerializer
+    recurso_catalogo = 'productos'
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = CursorOpcional  # ⭐ Opcional: ?limite=N
+    lookup_value_regex = r'\d+'  # /productos/abc/... → 404 (no llega a las vistas)
     
     def get_queryset(self):
         """⭐ CORREGIDO: Filtrar productos por sucursal correctamente"""
         user = self.request.user
-        queryset = Producto.objects.all()
+        queryset = productos_del_catalogo()
         
         # ⭐ CRÍTICO: Filtrar por parámetro 'sucursal' en query params
         sucursal_id = self.request.query_params.get('sucursal', None)
@@ -276,7 +376,6 @@ class ProductoViewSet(viewsets.ModelViewSet):
         if sucursal_id:
             queryset = queryset.filter(sucursal_id=sucursal_id)
             print(f"✅ Filtrando por sucursal_id={sucursal_id}")
-            print(f"📊 Productos encontrados: {queryset.count()}")
             return queryset.order_by('-id')
         
         # Si no hay parámetro, aplicar lógica por rol
@@ -292,16 +391,53 @@ class ProductoViewSet(viewsets.ModelViewSet):
             queryset = Producto.objects.none()
             print(f"⚠️ Sin permisos - No hay productos")
         
-        print(f"📊 Total productos: {queryset.count()}")
         print(f"{'='*60}\n")
         
         return queryset.order_by('-id')
     
     def get_permissions(self):
+        if self.action in ('reservar', 'liberar_reserva'):
+            return [IsAuthenticated()]
         if self.request.method in ('GET', 'HEAD', 'OPTIONS'):
             return [AllowAny()]
         return [EsAdministrador()]
     
+    @action(detail=True, methods=['post'])
+    def reservar(self, request, pk=None):
+        """
+        Aparta stock del producto por unos minutos (reserva del carrito).
+        POST /api/productos/{id}/reservar/  Body: { "cantidad": 2 }
+        El checkout confirma la reserva enviando 'reserva' en el item.
+        """
+        from .reservas import reservar_stock
+        
+        datos = ReservarStockSerializer(data=request.data)
+        datos.is_valid(raise_exception=True)
+        
+        reserva = reservar_stock(request.user, int(pk), datos.validated_data['cantidad'])
+        return Response(
+            ReservaStockSerializer(reserva).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=True, methods=['post'], url_path='liberar-reserva')
+    def liberar_reserva(self, request, pk=None):
+        """
+        Libera una reserva activa del producto y devuelve las unidades.
+        POST /api/productos/{id}/liberar-reserva/  Body: { "reserva": 15 }
+        """
+        from .reservas import liberar_reserva
+        
+        datos = LiberarReservaSerializer(data=request.data)
+        datos.is_valid(raise_exception=True)
+        
+        if not liberar_reserva(request.user, datos.validated_data['reserva'], producto_id=int(pk)):
+            return Response({
+                'error': 'La reserva no existe, es de otro producto o ya no está activa'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({'message': 'Reserva liberada'})
+    
     def perform_create(self, serializer):
         """Auto-asignar sucursal del admin regular al crear"""
         user = self.request.user
@@ -315,27 +451,23 @@ class ProductoViewSet(viewsets.ModelViewSet):
             print(f"✅ Producto creado en sucursal: {user.sucursal.nombre}")
             print(f"   ID: {producto.id}, Nombre: {producto.nombre}")
         else:
-            cache.delete('productos_list')
             producto = serializer.save()
             print(f"✅ Producto creado: {producto.nombre} (ID: {producto.id})")
             if producto.sucursal:
                 print(f"   Sucursal: {producto.sucursal.nombre}")
         
         print(f"{'='*60}\n")
-        
-        try:
-            from .emails import enviar_notificacion_nuevo_producto
-            enviar_notificacion_nuevo_producto(producto.id)
-        except Exception as e:
-            print(f"⚠️ Error enviando notificación: {e}")
+        # 📧 El email a clientes lo encola el signal post_save (notificar_nuevo_producto)
 
 
 # ============================================================================
 # OFERTA VIEWSET
 # ============================================================================
 
-class OfertaViewSet(viewsets.ModelViewSet):
+class OfertaViewSet(CacheCatalogoMixin, IndiceOfertasMixin, viewsets.ModelViewSet):
     serializer_class = OfertaSerializer
+    recurso_catalogo = 'ofertas'
+    pagination_class = CursorOpcional  # ⭐ Opcional: ?limite=N
     
     def get_permissions(self):
         if self.request.method in ('GET', 'HEAD', 'OPTIONS'):
@@ -346,9 +478,7 @@ class OfertaViewSet(viewsets.ModelViewSet):
         """⭐ CORREGIDO: Filtrar ofertas por sucursal correctamente"""
         user = self.request.user
         
-        base_queryset = Oferta.objects.prefetch_related(
-            Prefetch('productooferta_set', queryset=ProductoOferta.objects.select_related('producto'))
-        )
+        base_queryset = ofertas_del_catalogo()
         
         # ⭐ CRÍTICO: Filtrar por parámetro 'sucursal' en query params
         sucursal_id = self.request.query_params.get('sucursal', None)
@@ -364,7 +494,6 @@ class OfertaViewSet(viewsets.ModelViewSet):
         if sucursal_id:
             queryset = base_queryset.filter(sucursal_id=sucursal_id)
             print(f"✅ Filtrando por sucursal_id={sucursal_id}")
-            print(f"📊 Ofertas encontradas: {queryset.count()}")
             return queryset.all()
         
         # Si no hay parámetro, aplicar lógica por rol
@@ -381,64 +510,51 @@ class OfertaViewSet(viewsets.ModelViewSet):
             queryset = Oferta.objects.none()
             print(f"⚠️ Sin permisos - No hay ofertas")
         
-        print(f"📊 Total ofertas: {queryset.count()}")
         print(f"{'='*60}\n")
         
         return queryset.all()
     
+    def productos_del_listado(self, ofertas):
+        return productos_de_ofertas(ofertas)
+    
     def perform_create(self, serializer):
         """Auto-asignar sucursal del admin regular al crear"""
         user = self.request.user
         
         print("\n🎉 Creando oferta...")
         
-        if user.rol == 'administrador' and user.sucursal:
-            oferta = serializer.save(sucursal=user.sucursal)
-            print(f"✅ Oferta creada en sucursal: {user.sucursal.nombre}")
-        else:
-            oferta = serializer.save()
-            print(f"✅ Oferta creada: {oferta.titulo} (ID: {oferta.id})")
-        
-        productos_count = ProductoOferta.objects.filter(oferta=oferta).count()
-        print(f"📦 Productos asociados: {productos_count}")
-    
-        if productos_count > 0:
-            print(f"📧 Programando notificación en background...")
-            try:
-                import threading
-                from .emails import enviar_notificacion_oferta
-            
-                def enviar_email():
-                    try:
-                        enviar_notificacion_oferta(oferta.id)
-                        print(f"✅ Notificación enviada\n")
-                    except Exception as e:
-                        print(f"❌ Error: {e}\n")
+        with transaction.atomic():
+            if user.rol == 'administrador' and user.sucursal:
+                oferta = serializer.save(sucursal=user.sucursal)
+                print(f"✅ Oferta creada en sucursal: {user.sucursal.nombre}")
+            else:
+                oferta = serializer.save()
+                print(f"✅ Oferta creada: {oferta.titulo} (ID: {oferta.id})")
             
-                thread = threading.Thread(target=enviar_email)
-                thread.daemon = True
-                thread.start()
-                print(f"✅ Email programado\n")
-            except Exception as e:
-                print(f"❌ Error programando email: {e}\n")
+            productos_count = ProductoOferta.objects.filter(oferta=oferta).count()
+            print(f"📦 Productos asociados: {productos_count}")
+        
+            if productos_count > 0:
+                # ⭐ Encolado en la misma transacción que la oferta
+                encolar('email.oferta', oferta_id=oferta.id)
+                print(f"📧 Notificación encolada\n")
 
 
 # ============================================================================
 # PEDIDO VIEWSET (⭐⭐⭐ CORREGIDO - FILTRO POR SUCURSAL)
 # ============================================================================
 
-class PedidoViewSet(viewsets.ModelViewSet):
+class PedidoViewSet(IndiceOfertasMixin, viewsets.ModelViewSet):
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated, EsClienteOAdmin]
+    pagination_class = CursorPedidos  # ⭐ Opcional: ?limite=N
 
     def get_queryset(self):
         """⭐⭐⭐ CORREGIDO: Filtrar pedidos por sucursal correctamente"""
         try:
             user = self.request.user
             
-            base_queryset = Pedido.objects.select_related('usuario').prefetch_related(
-                Prefetch('detalles', queryset=DetallePedido.objects.select_related('producto'))
-            )
+            base_queryset = self.pedidos_precargados()
             
             # ⭐⭐⭐ CRÍTICO: Filtrar por parámetro 'sucursal' en query params
             sucursal_id = self.request.query_params.get('sucursal', None)
@@ -457,7 +573,6 @@ class PedidoViewSet(viewsets.ModelViewSet):
                     detalles__producto__sucursal_id=sucursal_id
                 ).distinct()
                 print(f"✅ Filtrando por sucursal_id={sucursal_id}")
-                print(f"📊 Pedidos encontrados: {queryset.count()}")
                 return queryset.order_by('-fecha')
             
             # Si no hay parámetro, aplicar lógica por rol
@@ -476,7 +591,6 @@ class PedidoViewSet(viewsets.ModelViewSet):
                 queryset = Pedido.objects.none()
                 print(f"⚠️ Sin permisos - No hay pedidos")
             
-            print(f"📊 Total pedidos: {queryset.count()}")
             print(f"{'='*60}\n")
             
             return queryset.order_by('-fecha')
@@ -489,6 +603,15 @@ class PedidoViewSet(viewsets.ModelViewSet):
         if self.action == 'create':
             return PedidoCreateSerializer
         return PedidoSerializer
+    
+    def pedidos_precargados(self):
+        return Pedido.objects.select_related('usuario').prefetch_related(
+            Prefetch('usuario__sucursal', queryset=sucursales_con_conteos()),
+            Prefetch('detalles', queryset=DetallePedido.objects.select_related('producto__sucursal'))
+        )
+    
+    def productos_del_listado(self, pedidos):
+        return {detalle.producto_id for pedido in pedidos for detalle in pedido.detalles.all()}
 
     # ⭐⭐⭐ CRÍTICO: Sobrescribir create() para evitar el problema con to_representation()
     @transaction.atomic
@@ -504,7 +627,9 @@ class PedidoViewSet(viewsets.ModelViewSet):
         pedido = serializer.save()
         
         # ⭐ CRÍTICO: Usar PedidoSerializer para la respuesta
-        output_serializer = PedidoSerializer(pedido, context={'request': request})
+        # (releído con sus relaciones precargadas: consultas fijas sin importar las líneas)
+        pedido = self.pedidos_precargados().get(pk=pedido.pk)
+        output_serializer = PedidoSerializer(pedido, context=self.contexto_con_ofertas([pedido]))
         
         headers = self.get_success_headers(output_serializer.data)
         return Response(
@@ -586,10 +711,11 @@ class PedidoViewSet(viewsets.ModelViewSet):
 # DETALLE PEDIDO VIEWSET
 # ============================================================================
      
-class DetallePedidoViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DetallePedido.objects.select_related('producto', 'pedido').all()
+class DetallePedidoViewSet(IndiceOfertasMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = DetallePedido.objects.select_related('producto__sucursal').order_by('-id')
     serializer_class = DetallePedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CursorOpcional  # ⭐ Opcional: ?limite=N
 
 
 # ============================================================================
@@ -0,0 +1,144 @@
+# Backend/core/views_async.py
+# ⭐⭐⭐ Lectura async del catálogo público (servidor ASGI: uvicorn)
+#
+#   GET /api/async/productos/            ← mismo resultado que /api/productos/
+#   GET /api/async/ofertas/              ← mismo resultado que /api/ofertas/
+#   GET /api/async/sucursales/activas/   ← mismo resultado que /api/sucursales/activas/
+#
+# - Visitantes anónimos (sin Authorization ni sesión): cache async
+#   (aresponder_con_cache) y, si falta, ORM async. Mientras una petición
+#   espera a Redis o a la base de datos el worker atiende otras
+# - Usan las MISMAS claves de cache y ETags que las vistas sync: una entrada
+#   calculada por cualquiera de las dos sirve a ambas
+# - Usuarios autenticados, ?limite=/?cursor= (paginación) o parámetros
+#   inválidos → se delega a la vista sync de DRF (mismo comportamiento)
+#
+# Bajo WSGI (gunicorn) estas rutas también funcionan, pero sin beneficio:
+# Django ejecuta cada vista async en su propio event loop.
+# Comparación: python manage.py bench --escenarios catalogo catalogo_asgi catalogo_async
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from .cache_catalogo import aresponder_con_cache
+from .serializers import (
+    OfertaSerializer,
+    ProductoSerializer,
+    SucursalSerializer,
+    indice_ofertas_activas,
+    sucursales_con_conteos,
+)
+from .views import (
+    OfertaViewSet,
+    ProductoViewSet,
+    SucursalViewSet,
+    ofertas_del_catalogo,
+    productos_de_ofertas,
+    productos_del_catalogo,
+)
+
+PARAMETROS_PAGINACION = ('cursor', 'limite')
+
+_productos_sync = ProductoViewSet.as_view({'get': 'list'})
+_ofertas_sync = OfertaViewSet.as_view({'get': 'list'})
+_sucursales_activas_sync = SucursalViewSet.as_view({'get': 'activas'})
+
+
+def _es_anonima(request):
+    return (
+        'HTTP_AUTHORIZATION' not in request.META
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _sucursal_de(request):
+    """(alcance, sucursal_id) como alcance_de() para un anónimo; None si ?sucursal= es inválido"""
+    sucursal_id = request.GET.get('sucursal')
+    if not sucursal_id:
+        return 'activas', None
+    if not sucursal_id.isdigit():
+        return None
+    return f'sucursal-{sucursal_id}', sucursal_id
+
+
+async def _delegar(vista, request):
+    """Atiende la petición con la vista sync de DRF (en un hilo)"""
+    def responder():
+        response = vista(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    return await sync_to_async(responder)()
+
+
+async def _listado_de_productos(request, instancias, serializer_class, producto_ids):
+    """Serializa con el índice de ofertas activas (una consulta, como IndiceOfertasMixin)"""
+    ofertas_activas = await sync_to_async(indice_ofertas_activas)(producto_ids(instancias))
+    contexto = {'request': request, 'ofertas_activas': ofertas_activas}
+    return serializer_class(instancias, many=True, context=contexto).data
+
+
+# ============================================================================
+# VISTAS
+# ============================================================================
+
+@require_safe
+async def productos(request):
+    alcance = _sucursal_de(request)
+    if not _es_anonima(request) or alcance is None or any(p in request.GET for p in PARAMETROS_PAGINACION):
+        return await _delegar(_productos_sync, request)
+
+    alcance, sucursal_id = alcance
+
+    async def calcular():
+        queryset = productos_del_catalogo()
+        if sucursal_id:
+            queryset = queryset.filter(sucursal_id=sucursal_id)
+        else:
+            queryset = queryset.filter(sucursal__activa=True)
+        lista = [producto async for producto in queryset.order_by('-id')]
+        return await _listado_de_productos(
+            request, lista, ProductoSerializer, lambda productos: [producto.id for producto in productos]
+        )
+
+    return await aresponder_con_cache(
+        request, 'productos', alcance, sucursal_id, calcular, reverse('producto-list')
+    )
+
+
+@require_safe
+async def ofertas(request):
+    alcance = _sucursal_de(request)
+    if not _es_anonima(request) or alcance is None or any(p in request.GET for p in PARAMETROS_PAGINACION):
+        return await _delegar(_ofertas_sync, request)
+
+    alcance, sucursal_id = alcance
+
+    async def calcular():
+        queryset = ofertas_del_catalogo()
+        if sucursal_id:
+            queryset = queryset.filter(sucursal_id=sucursal_id)
+        else:
+            queryset = queryset.filter(sucursal__activa=True)
+        lista = [oferta async for oferta in queryset]
+        return await _listado_de_productos(request, lista, OfertaSerializer, productos_de_ofertas)
+
+    return await aresponder_con_cache(
+        request, 'ofertas', alcance, sucursal_id, calcular, reverse('oferta-list')
+    )
+
+
+@require_safe
+async def sucursales_activas(request):
+    if not _es_anonima(request):
+        return await _delegar(_sucursales_activas_sync, request)
+
+    async def calcular():
+        queryset = sucursales_con_conteos().filter(activa=True).order_by('nombre')
+        lista = [sucursal async for sucursal in queryset]
+        return SucursalSerializer(lista, many=True, context={'request': request}).data
+
+    return await aresponder_con_cache(
+        request, 'sucursales', 'activas', None, calcular, reverse('sucursal-activas')
+    )
@@ -5,14 +5,17 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import AllowAny
+from .limites import LIMITES_LOGIN
 
 class LoginView(APIView):
     """
     Endpoint personalizado para login con usuario y contraseña.
     POST /core/auth/login/
+    ⭐ Límite por IP y por usuario antes de calcular el hash (core/limites.py)
     """
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = LIMITES_LOGIN
 
     def post(self, request):
         username = request.data.get('username')
@@ -2,16 +2,15 @@
 # 🔐 Vistas para recuperación y cambio de contraseña
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
-from django.conf import settings
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str
+from .jobs import encolar
+from .limites import LIMITES_RECUPERACION
 from .models import Usuario
-from .serializers import UsuarioSerializer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,10 +22,14 @@ logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(LIMITES_RECUPERACION)
 def solicitar_recuperacion_password(request):
     """
     Envía un email con el link de recuperación de contraseña
     Body: { "email": "user@example.com" }
+    
+    ⭐ La búsqueda del usuario y el envío corren en la cola (core/tareas.py):
+    la respuesta tarda lo mismo exista o no el email y no espera al SMTP
     """
     email = request.data.get('email', '').strip().lower()
     
@@ -40,73 +43,13 @@ def solicitar_recuperacion_password(request):
     print(f"   Email: {email}")
     print(f"{'='*60}\n")
     
-    try:
-        usuario = Usuario.objects.get(email=email)
-        print(f"✅ Usuario encontrado: {usuario.username}")
-        
-        # Generar token
-        token = default_token_generator.make_token(usuario)
-        uid = urlsafe_base64_encode(force_bytes(usuario.pk))
-        
-        # Construir URL de recuperación
-        frontend_url = settings.FRONTEND_URL
-        reset_url = f"{frontend_url}/recuperar-password/{uid}/{token}/"
-        
-        print(f"🔗 URL de recuperación generada:")
-        print(f"   {reset_url}")
-        
-        # Preparar email
-        subject = '🔐 Recuperación de Contraseña - Panadería Santa Clara'
-        message = f"""
-Hola {usuario.first_name or usuario.username},
-
-Recibimos una solicitud para restablecer tu contraseña.
-
-Para crear una nueva contraseña, haz clic en el siguiente enlace:
-{reset_url}
-
-Este enlace es válido por 24 horas.
-
-Si no solicitaste este cambio, puedes ignorar este correo.
-
-Saludos,
-Equipo de Panadería Santa Clara 🥐
-        """
-        
-        # Enviar email
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[email],
-                fail_silently=False,
-            )
-            print(f"✅ Email enviado exitosamente a {email}")
-        except Exception as e:
-            print(f"❌ Error enviando email: {e}")
-            # No revelar que el email existe
-            pass
-        
-        # Siempre retornar éxito (no revelar si el email existe)
-        return Response({
-            'message': 'Si el email existe, recibirás un correo con instrucciones para recuperar tu contraseña.',
-            'detail': 'Revisa tu bandeja de entrada y spam.'
-        }, status=status.HTTP_200_OK)
-        
-    except Usuario.DoesNotExist:
-        print(f"⚠️ Email no encontrado: {email}")
-        # No revelar que el email no existe (seguridad)
-        return Response({
-            'message': 'Si el email existe, recibirás un correo con instrucciones para recuperar tu contraseña.',
-            'detail': 'Revisa tu bandeja de entrada y spam.'
-        }, status=status.HTTP_200_OK)
+    encolar('email.recuperar_password', email=email)
     
-    except Exception as e:
-        print(f"❌ Error en recuperación: {e}")
-        return Response({
-            'error': 'Error procesando la solicitud'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Siempre la misma respuesta (no revelar si el email existe)
+    return Response({
+        'message': 'Si el email existe, recibirás un correo con instrucciones para recuperar tu contraseña.',
+        'detail': 'Revisa tu bandeja de entrada y spam.'
+    }, status=status.HTTP_200_OK)
 
 
 # ============================================================================
@@ -197,26 +140,8 @@ def restablecer_password(request):
         
         print(f"✅ Contraseña restablecida para {usuario.username}")
         
-        # Enviar email de confirmación
-        try:
-            send_mail(
-                subject='🔐 Contraseña Actualizada - Panadería Santa Clara',
-                message=f"""
-Hola {usuario.first_name or usuario.username},
-
-Tu contraseña ha sido actualizada exitosamente.
-
-Si no realizaste este cambio, contacta inmediatamente con soporte.
-
-Saludos,
-Equipo de Panadería Santa Clara 🥐
-                """,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[usuario.email],
-                fail_silently=True,
-            )
-        except:
-            pass
+        # Email de confirmación (en la cola)
+        encolar('email.password_actualizado', usuario_id=usuario.id)
         
         return Response({
             'message': 'Contraseña actualizada exitosamente',
@@ -276,26 +201,8 @@ def cambiar_password(request):
     
     print(f"✅ Contraseña cambiada para {usuario.username}")
     
-    # Enviar email de confirmación
-    try:
-        send_mail(
-            subject='🔐 Contraseña Actualizada - Panadería Santa Clara',
-            message=f"""
-Hola {usuario.first_name or usuario.username},
-
-Tu contraseña ha sido actualizada exitosamente.
-
-Si no realizaste este cambio, contacta inmediatamente con soporte.
-
-Saludos,
-Equipo de Panadería Santa Clara 🥐
-            """,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[usuario.email],
-            fail_silently=True,
-        )
-    except:
-        pass
+    # Email de confirmación (en la cola)
+    encolar('email.password_actualizado', usuario_id=usuario.id)
     
     return Response({
         'message': 'Contraseña actualizada exitosamente',
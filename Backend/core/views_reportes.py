@@ -4,16 +4,34 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, F, Q
 from django.utils import timezone
-from django.http import HttpResponse
-from datetime import timedelta
-from .models import Pedido, DetallePedido, Producto
-from .permissions import EsAdministrador
+from datetime import date
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from .models import Pedido, Sucursal
+from .permissions import SoloAdministradores
+from .cache_reportes import estadisticas_cache, obtener_reporte, version
+from . import cache_catalogo
+from .archivo import AGRUPACIONES, resumen_archivo, ventas_archivadas
+from .autenticacion import usuarios
+from .cache import backend_cache
+from .emails import destinatarios
+from .exportaciones import FORMATOS, en_bloques_async, generar_exportacion, lineas_de_venta
+from .metricas import colector
+from .reportes import (
+    calcular_estadisticas,
+    conteo_por_estado,
+    pedidos_por_periodo,
+    periodos_estandar,
+    resumenes_diarios,
+    top_productos,
+    ventas_diarias,
+    ventas_por_periodo,
+)
 
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated, EsAdministrador])
+@permission_classes([IsAuthenticated, SoloAdministradores])
 def estadisticas(request):
     """
     Endpoint para obtener estadísticas de ventas y productos.
@@ -30,160 +48,42 @@ def estadisticas(request):
     user = request.user
     sucursal_id = request.query_params.get('sucursal')
     
-    # ⭐⭐⭐ CRÍTICO: Solo pedidos ENTREGADOS se cuentan como ventas
-    pedidos_queryset = Pedido.objects.filter(estado='entregado')
-    detalles_queryset = DetallePedido.objects.filter(pedido__estado='entregado')
-    productos_queryset = Producto.objects.all()
-    
-    # ⭐ DEBUG: Ver estado de pedidos en BD
-    todos_pedidos = Pedido.objects.all().order_by('-fecha')
-    print(f"\n📦 TOTAL PEDIDOS EN BD: {todos_pedidos.count()}")
-    print(f"✅ Pedidos ENTREGADOS (contados como ventas): {pedidos_queryset.count()}")
-    
-    # Contar por estado para debug
-    pedidos_por_estado = {}
-    for estado_code, estado_label in Pedido.ESTADOS:
-        count = Pedido.objects.filter(estado=estado_code).count()
-        if count > 0:
-            pedidos_por_estado[estado_label] = count
-    
-    print(f"\n📊 Pedidos por estado:")
-    for estado, cantidad in pedidos_por_estado.items():
-        print(f"   {estado}: {cantidad} pedidos")
-    print(f"\n⚠️ IMPORTANTE: Solo pedidos 'Entregado' se cuentan como ventas en reportes")
-    
     # Aplicar filtro de sucursal si corresponde
     if sucursal_id:
         print(f"\n🔍 Filtrando por sucursal: {sucursal_id}")
-        pedidos_queryset = pedidos_queryset.filter(
-            detalles__producto__sucursal_id=sucursal_id
-        ).distinct()
-        detalles_queryset = detalles_queryset.filter(
-            producto__sucursal_id=sucursal_id
-        )
-        productos_queryset = productos_queryset.filter(sucursal_id=sucursal_id)
     elif user.rol == 'administrador' and user.sucursal:
         # Admin regular: solo su sucursal
-        print(f"\n🔒 Admin regular - Sucursal: {user.sucursal.id}")
-        pedidos_queryset = pedidos_queryset.filter(
-            detalles__producto__sucursal=user.sucursal
-        ).distinct()
-        detalles_queryset = detalles_queryset.filter(
-            producto__sucursal=user.sucursal
-        )
-        productos_queryset = productos_queryset.filter(sucursal=user.sucursal)
-    
-    print(f"\n📊 Pedidos 'entregado' después de filtros: {pedidos_queryset.count()}")
-    
-    # Fechas
-    hoy = timezone.now().date()
-    hace_7_dias = hoy - timedelta(days=7)
-    inicio_semana = hoy - timedelta(days=hoy.weekday())
-    inicio_mes = hoy.replace(day=1)
-    
-    print(f"\n📅 Fechas de análisis:")
-    print(f"   Hoy: {hoy}")
-    print(f"   Inicio semana: {inicio_semana}")
-    print(f"   Inicio mes: {inicio_mes}")
-    
-    # ⭐⭐⭐ Ventas por período (SOLO PEDIDOS ENTREGADOS)
-    ventas_hoy = pedidos_queryset.filter(fecha__date=hoy).aggregate(
-        total=Sum('total')
-    )['total'] or 0
-    
-    ventas_semana = pedidos_queryset.filter(fecha__date__gte=inicio_semana).aggregate(
-        total=Sum('total')
-    )['total'] or 0
-    
-    ventas_mes = pedidos_queryset.filter(fecha__date__gte=inicio_mes).aggregate(
-        total=Sum('total')
-    )['total'] or 0
-    
-    # ⭐⭐⭐ Pedidos por período (SOLO ENTREGADOS)
-    pedidos_hoy = pedidos_queryset.filter(fecha__date=hoy).count()
-    pedidos_semana = pedidos_queryset.filter(fecha__date__gte=inicio_semana).count()
-    pedidos_mes = pedidos_queryset.filter(fecha__date__gte=inicio_mes).count()
-    
-    print(f"\n💰 Ventas calculadas (SOLO ENTREGADOS):")
-    print(f"   Hoy: ₡{ventas_hoy:,.2f} ({pedidos_hoy} pedidos entregados)")
-    print(f"   Semana: ₡{ventas_semana:,.2f} ({pedidos_semana} pedidos entregados)")
-    print(f"   Mes: ₡{ventas_mes:,.2f} ({pedidos_mes} pedidos entregados)")
-    print(f"\n⚠️ Pedidos en otros estados (recibido, en_preparacion, listo, cancelado) NO se cuentan")
-    
-    # Promedio por venta (solo entregados)
-    promedio_venta = pedidos_queryset.aggregate(
-        promedio=Avg('total')
-    )['promedio'] or 0
-    
-    # Total productos
-    total_productos = productos_queryset.count()
-    
-    # ⭐ Ventas por día (últimos 7 días - solo entregados)
-    ventas_por_dia = []
-    for i in range(7):
-        dia = hoy - timedelta(days=6-i)
-        total_dia = pedidos_queryset.filter(fecha__date=dia).aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        ventas_por_dia.append({
-            'fecha': dia.isoformat(),
-            'total': float(total_dia)
-        })
-    
-    # ⭐ Top 5 productos más vendidos (solo en pedidos entregados)
-    top_productos = detalles_queryset.values(
-        'producto__id',
-        'producto__nombre'
-    ).annotate(
-        total_vendido=Sum('cantidad'),
-        total_ingresos=Sum(F('cantidad') * F('producto__precio'))
-    ).order_by('-total_vendido')[:5]
-    
-    top_productos_list = [
-        {
-            'id': p['producto__id'],
-            'nombre': p['producto__nombre'],
-            'total_vendido': p['total_vendido'],
-            'total_ingresos': float(p['total_ingresos'] or 0)
-        }
-        for p in top_productos
-    ]
-    
-    # ⭐ Producto más vendido del mes (solo entregados)
-    producto_mas_vendido = None
-    if top_productos_list:
-        mas_vendido = top_productos_list[0]
-        producto_mas_vendido = {
-            'nombre': mas_vendido['nombre'],
-            'cantidad': mas_vendido['total_vendido'],
-            'ingresos': mas_vendido['total_ingresos']
-        }
-    
-    data = {
-        'ventas_hoy': float(ventas_hoy),
-        'ventas_semana': float(ventas_semana),
-        'ventas_mes': float(ventas_mes),
-        'pedidos_hoy': pedidos_hoy,
-        'pedidos_semana': pedidos_semana,
-        'pedidos_mes': pedidos_mes,
-        'promedio_venta': float(promedio_venta),
-        'total_productos': total_productos,
-        'ventas_por_dia': ventas_por_dia,
-        'top_productos': top_productos_list,
-        'producto_mas_vendido': producto_mas_vendido
-    }
+        sucursal_id = user.sucursal_id
+        print(f"\n🔒 Admin regular - Sucursal: {sucursal_id}")
+    
+    def calcular():
+        # ⭐ DEBUG: Pedidos por estado (un solo GROUP BY)
+        pedidos_por_estado = conteo_por_estado()
+        etiquetas = dict(Pedido.ESTADOS)
+        print(f"\n📦 TOTAL PEDIDOS EN BD: {sum(pedidos_por_estado.values())}")
+        print(f"\n📊 Pedidos por estado:")
+        for estado, cantidad in pedidos_por_estado.items():
+            print(f"   {etiquetas.get(estado, estado)}: {cantidad} pedidos")
+        print(f"\n⚠️ IMPORTANTE: Solo pedidos 'Entregado' se cuentan como ventas en reportes")
+        
+        # ⭐⭐⭐ Períodos, serie diaria y top productos en un número fijo de consultas
+        return calcular_estadisticas(sucursal_id)
+    
+    # ⭐ Cache versionado: solo se recalcula si hubo entregas/eliminaciones o cambió el día
+    data = obtener_reporte('estadisticas', sucursal_id, calcular)
     
     print(f"\n✅ Estadísticas calculadas (SOLO ENTREGADOS):")
-    print(f"   Ventas mes: ₡{ventas_mes:,.2f}")
-    print(f"   Pedidos mes: {pedidos_mes}")
-    print(f"   Productos: {total_productos}")
+    print(f"   Ventas hoy: ₡{data['ventas_hoy']:,.2f} ({data['pedidos_hoy']} pedidos entregados)")
+    print(f"   Ventas semana: ₡{data['ventas_semana']:,.2f} ({data['pedidos_semana']} pedidos entregados)")
+    print(f"   Ventas mes: ₡{data['ventas_mes']:,.2f} ({data['pedidos_mes']} pedidos entregados)")
+    print(f"   Productos: {data['total_productos']}")
     print("="*60 + "\n")
     
     return Response(data)
 
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated, EsAdministrador])
+@permission_classes([IsAuthenticated, SoloAdministradores])
 def exportar_reporte(request):
     """
     Endpoint para exportar reportes en HTML.
@@ -198,45 +98,22 @@ def exportar_reporte(request):
     print(f"\n📥 Exportando reporte en formato: {formato}")
     print(f"⚠️ Solo pedidos ENTREGADOS se cuentan como ventas")
     
-    # ⭐⭐⭐ CRÍTICO: Solo pedidos ENTREGADOS
-    pedidos_queryset = Pedido.objects.filter(estado='entregado')
-    
     if sucursal_id:
-        pedidos_queryset = pedidos_queryset.filter(
-            detalles__producto__sucursal_id=sucursal_id
-        ).distinct()
-        sucursal_nombre = Producto.objects.filter(sucursal_id=sucursal_id).first().sucursal.nombre if Producto.objects.filter(sucursal_id=sucursal_id).exists() else "Todas"
+        sucursal_nombre = Sucursal.objects.filter(pk=sucursal_id).values_list('nombre', flat=True).first() or "Todas"
     elif user.rol == 'administrador' and user.sucursal:
-        pedidos_queryset = pedidos_queryset.filter(
-            detalles__producto__sucursal=user.sucursal
-        ).distinct()
+        sucursal_id = user.sucursal_id
         sucursal_nombre = user.sucursal.nombre
     else:
         sucursal_nombre = "Todas las Sucursales"
     
-    # Calcular estadísticas (solo entregados)
-    hoy = timezone.now().date()
-    inicio_mes = hoy.replace(day=1)
-    
-    ventas_mes = pedidos_queryset.filter(fecha__date__gte=inicio_mes).aggregate(
-        total=Sum('total')
-    )['total'] or 0
-    
-    pedidos_mes = pedidos_queryset.filter(fecha__date__gte=inicio_mes).count()
+    # ⭐⭐⭐ CRÍTICO: Solo pedidos ENTREGADOS (ingresos desde el acumulado VentaDiaria)
+    hoy = timezone.localdate()
+    mes = {'mes': periodos_estandar(hoy)['mes']}
+    ventas_mes = ventas_por_periodo(ventas_diarias(sucursal_id), mes)['ventas_mes']
+    pedidos_mes = pedidos_por_periodo(resumenes_diarios(sucursal_id), mes)['pedidos_mes']
     
     # Top productos (solo de pedidos entregados)
-    detalles_queryset = DetallePedido.objects.filter(pedido__estado='entregado')
-    if sucursal_id:
-        detalles_queryset = detalles_queryset.filter(producto__sucursal_id=sucursal_id)
-    elif user.rol == 'administrador' and user.sucursal:
-        detalles_queryset = detalles_queryset.filter(producto__sucursal=user.sucursal)
-    
-    top_productos = detalles_queryset.values(
-        'producto__nombre'
-    ).annotate(
-        total_vendido=Sum('cantidad'),
-        total_ingresos=Sum(F('cantidad') * F('producto__precio'))
-    ).order_by('-total_vendido')[:5]
+    top = top_productos(sucursal_id)
     
     # Generar HTML
     html_content = f"""
@@ -398,14 +275,14 @@ def exportar_reporte(request):
                     <tbody>
     """
     
-    for idx, producto in enumerate(top_productos, 1):
+    for idx, producto in enumerate(top, 1):
         medalla = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else "🏅"
         html_content += f"""
                         <tr>
                             <td>{medalla}</td>
-                            <td><strong>{producto['producto__nombre']}</strong></td>
+                            <td><strong>{producto['nombre']}</strong></td>
                             <td>{producto['total_vendido']}</td>
-                            <td>₡{float(producto['total_ingresos'] or 0):,.0f}</td>
+                            <td>₡{producto['total_ingresos']:,.0f}</td>
                         </tr>
         """
     
@@ -428,4 +305,150 @@ def exportar_reporte(request):
     
     response = HttpResponse(html_content, content_type='text/html')
     response['Content-Disposition'] = f'attachment; filename="reporte_{hoy}.html"'
-    return response
\ No newline at end of file
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, SoloAdministradores])
+def exportar_ventas(request):
+    """
+    Exporta las líneas de venta en streaming (CSV o NDJSON).
+    GET /api/reportes/ventas/?formato=csv&desde=2025-01-01&hasta=2025-03-31&sucursal=1
+    
+    - desde/hasta: fechas locales inclusivas (por defecto, el mes actual)
+    - Solo pedidos ENTREGADOS
+    - Las filas se envían a medida que se leen: la memoria no depende del rango
+      (también bajo ASGI, por bloques)
+    """
+    user = request.user
+    if user.rol not in ['administrador', 'administrador_general']:
+        return Response({'error': 'Solo administradores pueden exportar ventas'}, status=403)
+    
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return Response({'error': f"Formato inválido. Opciones: {', '.join(FORMATOS)}"}, status=400)
+    
+    hoy = timezone.localdate()
+    try:
+        desde = date.fromisoformat(request.query_params.get('desde') or hoy.replace(day=1).isoformat())
+        hasta = date.fromisoformat(request.query_params.get('hasta') or hoy.isoformat())
+    except ValueError:
+        return Response({'error': 'Fechas inválidas (formato YYYY-MM-DD)'}, status=400)
+    if desde > hasta:
+        return Response({'error': "'desde' no puede ser posterior a 'hasta'"}, status=400)
+    
+    sucursal_id = request.query_params.get('sucursal')
+    if user.rol == 'administrador':
+        # Admin regular: solo su sucursal
+        if not user.sucursal_id:
+            return Response({'error': 'No tienes una sucursal asignada'}, status=403)
+        sucursal_id = user.sucursal_id
+    # Se valida antes de empezar el streaming: después ya no se puede responder 400
+    try:
+        sucursal_id = int(sucursal_id) if sucursal_id else None
+    except ValueError:
+        return Response({'error': 'Sucursal inválida'}, status=400)
+    
+    print(f"\n📥 Exportando ventas {desde} → {hasta} ({formato}, sucursal: {sucursal_id or 'todas'})")
+    
+    contenido, content_type = generar_exportacion(formato, lineas_de_venta(desde, hasta, sucursal_id))
+    if isinstance(request._request, ASGIRequest):
+        # ⭐ Bajo ASGI un iterador sync se leería completo antes de enviarse
+        contenido = en_bloques_async(contenido)
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="ventas_{desde}_{hasta}.{formato}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, SoloAdministradores])
+def ventas_archivo(request):
+    """
+    Ventas de pedidos ya purgados (archivo frío, ver core/archivo.py).
+    GET /api/reportes/archivo/?desde=2024-01-01&hasta=2024-12-31&agrupar=mes&sucursal=1
+    
+    - desde/hasta: fechas locales inclusivas (opcionales)
+    - agrupar: dia, mes (default), anio, producto o sucursal
+    - Solo pedidos ENTREGADOS; solo se descomprimen los segmentos del rango
+    """
+    user = request.user
+    if user.rol not in ['administrador', 'administrador_general']:
+        return Response({'error': 'Solo administradores pueden ver el archivo'}, status=403)
+    
+    agrupar = request.query_params.get('agrupar', 'mes')
+    if agrupar not in AGRUPACIONES:
+        return Response({'error': f"Agrupación inválida. Opciones: {', '.join(AGRUPACIONES)}"}, status=400)
+    
+    try:
+        desde = date.fromisoformat(request.query_params['desde']) if request.query_params.get('desde') else None
+        hasta = date.fromisoformat(request.query_params['hasta']) if request.query_params.get('hasta') else None
+    except ValueError:
+        return Response({'error': 'Fechas inválidas (formato YYYY-MM-DD)'}, status=400)
+    if desde and hasta and desde > hasta:
+        return Response({'error': "'desde' no puede ser posterior a 'hasta'"}, status=400)
+    
+    sucursal_id = request.query_params.get('sucursal')
+    if user.rol == 'administrador':
+        # Admin regular: solo su sucursal
+        if not user.sucursal_id:
+            return Response({'error': 'No tienes una sucursal asignada'}, status=403)
+        sucursal_id = user.sucursal_id
+    try:
+        sucursal_id = int(sucursal_id) if sucursal_id else None
+    except ValueError:
+        return Response({'error': 'Sucursal inválida'}, status=400)
+    
+    datos = {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar': agrupar,
+        'sucursal': sucursal_id,
+        'ventas': ventas_archivadas(desde, hasta, sucursal_id, agrupar),
+    }
+    if user.rol == 'administrador_general':
+        # Totales de toda la empresa: solo el administrador general
+        datos['segmentos'] = resumen_archivo()
+    return Response(datos)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, SoloAdministradores])
+def estado_cache_reportes(request):
+    """
+    Aciertos/fallos del cache de reportes y versión actual del alcance.
+    En 'catalogo', lo mismo para el cache de productos/ofertas/sucursales y
+    en 'destinatarios' para las listas de admins a notificar y en 'usuarios'
+    para los usuarios de las peticiones JWT.
+    GET /api/reportes/cache/?sucursal=1
+    """
+    sucursal_id = request.query_params.get('sucursal')
+    datos = estadisticas_cache()
+    datos['alcance'] = sucursal_id or 'todas'
+    datos['version'] = version(sucursal_id)
+    datos['catalogo'] = {
+        **cache_catalogo.estadisticas_cache(),
+        'version': cache_catalogo.version(sucursal_id),
+    }
+    datos['destinatarios'] = destinatarios.estadisticas()
+    datos['usuarios'] = usuarios.estadisticas()
+    datos['backend'] = backend_cache()
+    return Response(datos)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def metricas(request):
+    """
+    Percentiles por ruta de las últimas peticiones (de este proceso).
+    GET /api/metrics/     → métricas
+    DELETE /api/metrics/  → reiniciar muestras
+    Solo administrador general.
+    """
+    if request.user.rol != 'administrador_general':
+        return Response({'error': 'Solo el administrador general puede ver las métricas'}, status=403)
+    
+    if request.method == 'DELETE':
+        colector.reiniciar()
+        return Response(status=204)
+    
+    return Response({'rutas': colector.resumen()})
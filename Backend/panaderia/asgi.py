@@ -5,12 +5,65 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+⭐ Servidor (Procfile): uvicorn panaderia.asgi:application --workers 4
+Las vistas async del catálogo (core/views_async.py) atienden muchas
+peticiones concurrentes por worker; el resto de la API (vistas sync de DRF)
+corre en el pool de hilos de Django.
 """
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'panaderia.settings')
+# Quita WhiteNoise (solo sync) del MIDDLEWARE, ver settings.py
+os.environ.setdefault('SERVIDOR_ASGI', 'True')
+
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402  (después de configurar Django)
+from whitenoise.base import WhiteNoise  # noqa: E402
+from whitenoise.middleware import WhiteNoiseMiddleware  # noqa: E402
+
+
+class EstaticosWhiteNoise(WhiteNoiseMiddleware):
+    """
+    La configuración de WhiteNoiseMiddleware (STATIC_ROOT, manifest,
+    compresión, cache inmutable) como aplicación WSGI independiente
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.application = self.no_encontrado
+
+    @staticmethod
+    def no_encontrado(environ, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+        return [b'Not Found']
+
+    # Los métodos WSGI de WhiteNoise (el middleware los cambia por los de Django)
+    __call__ = WhiteNoise.__call__
+    serve = staticmethod(WhiteNoise.serve)
+
+
+class ServidorEstaticos:
+    """
+    Solo las rutas de STATIC_URL pasan por WhiteNoise (en un hilo, es WSGI);
+    el resto de las peticiones van directo a Django sin salir del event loop
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.estaticos = EstaticosWhiteNoise()
+        self.prefijo = self.estaticos.static_prefix
+        self.servir = WsgiToAsgi(self.estaticos)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(self.prefijo):
+            return await self.servir(scope, receive, send)
+        return await self.application(scope, receive, send)
+
 
-application = get_asgi_application()
+application = ServidorEstaticos(django_application) if settings.STATIC_ROOT else django_application